@@ -0,0 +1,215 @@
+"""
+按队列深度调整Celery worker进程池大小
+定时采样Redis中Celery队列和公平调度子队列的长度、各GPU节点的排队数（/lane_stats）、利用率（/nvidia_info）和近期延迟：
+Celery有积压且GPU节点未饱和时扩容，GPU节点排队过多或延迟过高时缩容，队列为空且GPU空闲时缩容。
+扩容和缩容的条件之间留有间隔，并需连续多次采样结果一致、距上次调整超过冷却时间才执行；
+因GPU节点饱和而缩容后，一段时间内不再扩容到饱和时的进程数，避免在容量附近来回抖动。
+批量任务先在公平调度的子队列中排队，合计投递到Celery的批次数上限随进程数调整，扩容后的进程才能取到批次。
+单独运行：python Autoscaler.py
+"""
+import time
+
+from Common import Config
+from GpuClient import GpuClient, GpuNodeError
+
+GROW = 1
+HOLD = 0
+SHRINK = -1
+
+
+class BrokerProbe:
+    """Redis broker中各Celery队列的消息数，加上公平调度子队列中尚未投递的批次数"""
+
+    def __init__(self, client, queues=None, fair=None):
+        self.client = client
+        self.queues = queues or Config.AUTOSCALE_QUEUES
+        self.fair = fair
+
+    def __call__(self):
+        backlog = sum(self.client.llen(queue) for queue in self.queues)
+        if self.fair is not None:
+            backlog += self.fair.backlog()
+        return backlog
+
+
+class GpuProbe:
+    """
+    各GPU节点的排队数、平均利用率和近期延迟
+    不可达的节点不计入，所有节点都不可达时返回None
+    """
+
+    def __init__(self, nodes=None, timeout=None):
+        nodes = nodes or Config.GPU_Node
+        self.timeout = timeout or Config.GPU_STATUS_TIMEOUT
+        self.clients = {name: GpuClient(base_url=url, retries=0) for name, url in nodes.items()}
+
+    def __call__(self):
+        queued = 0
+        utilization = []
+        latency_ms = 0.0
+        for name, client in self.clients.items():
+            try:
+                lanes = client.get('/lane_stats', timeout=self.timeout)['lanes']
+                info = client.get('/nvidia_info', timeout=self.timeout)
+            except GpuNodeError as e:
+                print(f"autoscaler: {name} unavailable: {e}")
+                continue
+            queued += sum(lane['queued'] for lane in lanes.values())
+            latency_ms = max([latency_ms] + [lane['latency_p95_ms'] or 0.0 for lane in lanes.values()])
+            gpus = info.get('window', {}).get('gpu_usage_percent') or [g['gpu_usage_percent'] for g in info.get('gpus', [])]
+            if gpus:
+                utilization.append(sum(gpus) / len(gpus))
+        if not utilization:
+            return None
+        return {'gpu_queued': queued, 'utilization': sum(utilization) / len(utilization), 'latency_ms': latency_ms}
+
+
+class CeleryPool:
+    """通过Celery远程控制命令查询和调整各worker的进程池大小"""
+
+    def __init__(self, app, timeout=1.0):
+        self.app = app
+        self.timeout = timeout
+        # 最近一次查询到的在线worker数
+        self.workers = 0
+
+    def concurrency(self):
+        """各worker中最小的进程池大小，没有在线worker时返回None"""
+        stats = self.app.control.inspect(timeout=self.timeout).stats() or {}
+        sizes = [worker['pool']['max-concurrency'] for worker in stats.values()]
+        self.workers = len(sizes)
+        return min(sizes) if sizes else None
+
+    def resize(self, delta):
+        # 广播到所有worker，每个worker各增减delta个进程
+        if delta > 0:
+            self.app.control.pool_grow(delta)
+        elif delta < 0:
+            self.app.control.pool_shrink(-delta)
+
+
+class Autoscaler:
+    """进程池大小的调整策略，采样和执行分别由broker、gpu和pool提供，测试时可替换为模拟对象"""
+
+    def __init__(self, pool, broker, gpu, min_concurrency=None, max_concurrency=None, step=None,
+                 grow_samples=None, shrink_samples=None, cooldown=None, ceiling_ttl=None, fair=None,
+                 clock=time.time):
+        """
+        :param pool: 提供concurrency()、resize(delta)和在线worker数workers
+        :param broker: 返回Celery队列中的消息数
+        :param gpu: 返回{'gpu_queued', 'utilization', 'latency_ms'}，GPU节点不可达时返回None
+        :param fair: 可选的FairQueue，每次采样后把合计投递上限设为所有worker的进程数
+        """
+        self.pool = pool
+        self.broker = broker
+        self.gpu = gpu
+        self.fair = fair
+        self.min_concurrency = min_concurrency or Config.AUTOSCALE_MIN_CONCURRENCY
+        self.max_concurrency = max_concurrency or Config.AUTOSCALE_MAX_CONCURRENCY
+        self.step = step or Config.AUTOSCALE_STEP
+        self.grow_samples = grow_samples or Config.AUTOSCALE_GROW_SAMPLES
+        self.shrink_samples = shrink_samples or Config.AUTOSCALE_SHRINK_SAMPLES
+        self.cooldown = Config.AUTOSCALE_COOLDOWN if cooldown is None else cooldown
+        self.ceiling_ttl = ceiling_ttl or Config.AUTOSCALE_CEILING_TTL
+        self.clock = clock
+        self.concurrency = None
+        self._direction = HOLD
+        self._streak = 0
+        self._changed_at = None
+        # 曾使GPU节点饱和的进程数及其有效期
+        self._ceiling = None
+        self._ceiling_until = 0
+
+    @staticmethod
+    def saturated(gpu_queued, latency_ms):
+        return gpu_queued >= Config.AUTOSCALE_GPU_QUEUE_HIGH or latency_ms >= Config.AUTOSCALE_LATENCY_HIGH_MS
+
+    def decide(self, backlog, gpu_queued, utilization, latency_ms):
+        """
+        根据一次采样判断调整方向
+        :return: GROW、HOLD或SHRINK
+        """
+        # GPU节点已经积压，再增加并发只会让请求在GPU节点排队直至超时
+        if self.saturated(gpu_queued, latency_ms):
+            return SHRINK
+        if backlog > self.concurrency * Config.AUTOSCALE_BACKLOG_PER_WORKER:
+            return GROW if utilization < Config.AUTOSCALE_GPU_UTIL_HIGH else HOLD
+        if backlog == 0 and utilization < Config.AUTOSCALE_GPU_UTIL_LOW:
+            return SHRINK
+        return HOLD
+
+    def observe(self, backlog, gpu):
+        """
+        记录一次采样
+        :return: 调整后的目标进程池大小
+        """
+        if gpu is None:
+            # GPU节点状态未知时不调整
+            direction = HOLD
+        else:
+            direction = self.decide(backlog, **gpu)
+        if direction != self._direction:
+            self._direction = direction
+            self._streak = 0
+        self._streak += 1
+
+        if direction == HOLD:
+            return self.concurrency
+        if self._streak < (self.grow_samples if direction == GROW else self.shrink_samples):
+            return self.concurrency
+        now = self.clock()
+        if self._changed_at is not None and now - self._changed_at < self.cooldown:
+            return self.concurrency
+
+        upper = self.max_concurrency
+        if direction == GROW and self._ceiling is not None and now < self._ceiling_until:
+            # 有效期内不再扩容到曾使GPU节点饱和的进程数
+            upper = min(upper, self._ceiling - 1)
+        if direction == SHRINK and self.saturated(gpu['gpu_queued'], gpu['latency_ms']):
+            self._ceiling = self.concurrency
+            self._ceiling_until = now + self.ceiling_ttl
+        target = min(upper, max(self.min_concurrency, self.concurrency + direction * self.step))
+        if (target - self.concurrency) * direction <= 0:
+            return self.concurrency
+        self._changed_at = now
+        self._streak = 0
+        return target
+
+    def tick(self):
+        """
+        采样一次并按需调整进程池
+        :return: 本次采样和调整结果，没有在线worker时返回None
+        """
+        current = self.pool.concurrency()
+        if current is None:
+            return None
+        self.concurrency = current
+        backlog = self.broker()
+        gpu = self.gpu()
+        target = self.observe(backlog, gpu)
+        # 调整到配置的上下限内
+        target = min(self.max_concurrency, max(self.min_concurrency, target))
+        if target != current:
+            print(f"autoscaler: concurrency {current} -> {target}, backlog {backlog}, gpu {gpu}")
+            self.pool.resize(target - current)
+            self.concurrency = target
+        if self.fair is not None:
+            # 自动调整停止运行（有效期过后）时恢复为配置的上限
+            self.fair.set_inflight_limit(self.concurrency * self.pool.workers, Config.AUTOSCALE_INTERVAL * 3)
+        return {'concurrency': self.concurrency, 'backlog': backlog, 'gpu': gpu}
+
+    def run(self, interval=None):
+        interval = interval or Config.AUTOSCALE_INTERVAL
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                # 采样、Celery远程控制或调整失败都只跳过本次，不能结束循环
+                print(f"autoscaler: tick failed: {type(e).__name__}: {e}")
+            time.sleep(interval)
+
+
+if __name__ == "__main__":
+    from BgTasks import app, fair, redis_client
+
+    Autoscaler(CeleryPool(app), BrokerProbe(redis_client, fair=fair), GpuProbe(), fair=fair).run()
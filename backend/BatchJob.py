@@ -0,0 +1,104 @@
+"""
+批量任务进度
+一次压缩包上传对应一条batch_job记录，文档状态变化时在一条UPDATE中原子地更新各状态计数，
+查询进度时只读这一行，无需扫描summary_history
+"""
+import time
+from datetime import datetime
+
+import Dbconn
+
+
+def create(user_id, name):
+    """
+    创建批量任务
+    :return: 任务id
+    """
+    return Dbconn.dbSet(
+        "INSERT INTO batch_job(user_id, name, create_datetime, created_at) VALUES(?,?,?,?)",
+        [user_id, name, datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S"), time.time()]
+    )
+
+
+def advance(job_id, queued=0, running=0, done=0, failed=0):
+    """
+    按增量更新各状态的文档数，如投递时queued=n，开始处理时queued=-n, running=n
+    多个worker并发更新时由SQLite保证每条UPDATE的原子性，计数不会丢失
+    job_id为None（不属于批量任务的文档）时不做任何操作
+    """
+    if job_id is None:
+        return
+    now = time.time()
+    Dbconn.dbSet(
+        """
+        UPDATE batch_job SET queued=queued+?, running=running+?, done=done+?, failed=failed+?,
+            started_at=CASE WHEN ?>0 THEN COALESCE(started_at, ?) ELSE started_at END,
+            finished_at=CASE WHEN sealed=1 AND queued+?=0 AND running+?=0 THEN ? ELSE finished_at END
+        WHERE id=?
+        """,
+        [queued, running, done, failed, running, now, queued, running, now, job_id]
+    )
+
+
+def seal(job_id, error=None):
+    """
+    标记所有文档已投递，此后文档总数不再变化
+    :param error: 读取压缩包失败的原因
+    """
+    if job_id is None:
+        return
+    now = time.time()
+    Dbconn.dbSet(
+        """
+        UPDATE batch_job SET sealed=1, error=?,
+            finished_at=CASE WHEN queued=0 AND running=0 THEN ? ELSE finished_at END
+        WHERE id=?
+        """,
+        [error, now, job_id]
+    )
+
+
+def progress(job_id):
+    """
+    任务进度、吞吐量和预计剩余时间
+    :return: 进度dict，任务不存在时返回None
+    """
+    ret = Dbconn.dbGet(
+        "SELECT user_id, name, queued, running, done, failed, sealed, error, create_datetime, started_at, finished_at "
+        "FROM batch_job WHERE id=?", [job_id])
+    if not ret:
+        return None
+    user_id, name, queued, running, done, failed, sealed, error, create_datetime, started_at, finished_at = ret[0]
+
+    if error:
+        state = 'error'
+    elif finished_at:
+        state = 'finished'
+    elif not sealed:
+        state = 'ingesting'
+    else:
+        state = 'running' if started_at else 'queued'
+
+    # 吞吐量按第一篇文档开始处理到现在（或完成时）计算
+    elapsed = (finished_at or time.time()) - started_at if started_at else 0
+    throughput = (done + failed) / elapsed if elapsed > 0 else 0.0
+    remaining = queued + running
+    # 仍在读取压缩包时总数未定，预计时间只计算已投递的文档
+    eta = round(remaining / throughput, 1) if throughput and remaining else None
+
+    return {
+        'job_id': int(job_id),
+        'user_id': user_id,
+        'name': name,
+        'state': state,
+        'error': error,
+        'total': queued + running + done + failed,
+        'queued': queued,
+        'running': running,
+        'done': done,
+        'failed': failed,
+        'create_datetime': create_datetime,
+        'elapsed': round(elapsed, 1),
+        'throughput': round(throughput, 3),
+        'eta': eta,
+    }
@@ -1,13 +1,28 @@
+import BatchJob
+import ContentStore
 import Dbconn
+import GpuClient
+import Ingest
+import NearDup
 import Summary
+from Common import Config
+from FairQueue import FairQueue
+from ResultCache import ResultCache
+from SingleFlight import RedisSingleFlight, make_key
 
 import redis
 from celery import Celery
+from celery.signals import worker_init
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
-from docx import Document
-
 import json
+import os
+import threading
+import time
+import uuid
+import zipfile
 
 redis_client = redis.Redis(host='localhost', port=6379, db=0)
 app = Celery('BgTasks', 
@@ -19,33 +34,204 @@ app.conf.update(
     result_serializer='json',
     timezone='Asia/Shanghai',
     enable_utc=True,
+    # 回收卡住的记录时区分任务仍在排队还是已开始执行
+    task_track_started=True,
+    beat_schedule={
+        'reap-stuck': {'task': 'BgTasks.reap_stuck', 'schedule': Config.REAPER_INTERVAL},
+    },
 )
 
+
+@worker_init.connect
+def migrate(**kwargs):
+    # worker可能先于接口服务启动
+    Dbconn.init()
+
+# 合并多个worker中同时处理的相同文档
+flight = RedisSingleFlight(redis_client)
+
+# 相同文本的处理结果缓存，跨用户、跨压缩包复用
+cache = ResultCache(redis_client)
+
+# 标题与摘要互不依赖，标题提交到线程池与摘要并行请求GPU节点；线程在首次提交时才创建，不会被prefork子进程继承
+fanout = ThreadPoolExecutor(max_workers=Config.GPU_FANOUT_WORKERS, thread_name_prefix="gpu-fanout")
+
+
+
+def _send_batch(user_id, payload, slot):
+    # 以占用作为任务id，回收卡住的批次时可以据此释放占用
+    get_batch_summary.apply_async((payload['items'],), {'user_id': user_id, 'job_id': payload.get('job_id'),
+                                                        'slot': slot}, task_id=slot)
+
+
+# 批量任务先进入各用户的子队列，轮转投递到Celery
+fair = FairQueue(redis_client, _send_batch)
+
+# 标题生成失败时的占位标题，摘要仍然保留
+TITLE_FALLBACK = {'ret0': '标题生成失败', 'ret1': '标题生成失败', 'ret2': '标题生成失败'}
+
+
+def _timed(fn):
+    """执行fn并返回 (结果, 异常, 耗时秒数)"""
+    start = time.perf_counter()
+    try:
+        return fn(), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
 @app.task
 def test():
     print("celery ready!")
 
 
+def _generate(sid, content, max_len, priority, cache_key):
+    """
+    请求GPU节点生成摘要和标题，完整结果写入缓存
+    :return: (摘要json, 标题json, 各调用耗时)
+    """
+    start = time.perf_counter()
+    # 两次GPU调用共用一个截止时间并行执行；交互请求超时时接受部分解码的标题
+    deadline = Summary.make_deadline()
+    # 合并键包含优先级（对应不同的截止时间）和是否接受部分结果，批量请求不会拿到交互请求的部分结果或超时错误
+    allow_partial = priority == Summary.INTERACTIVE
+    title_future = fanout.submit(_timed, lambda: flight.do(
+        make_key('title', content, priority=priority, partial=allow_partial),
+        lambda: Summary.title(content, priority=priority, deadline=deadline, allow_partial=allow_partial)))
+    # 摘要在当前线程中执行，少占用一个线程
+    summary, summary_error, summary_time = _timed(lambda: flight.do(
+        make_key('summary', content, max_len=max_len, priority=priority),
+        lambda: Summary.summary(content, max_len, priority=priority, deadline=deadline)))
+    title, title_error, title_time = title_future.result()
+    timings = {"summary": round(summary_time, 3), "title": round(title_time, 3)}
+    print(f"summary {sid}: {timings}")
+
+    if summary_error is not None:
+        raise summary_error
+    summary = json.dumps(summary, ensure_ascii=False)
+    if title_error is not None:
+        # 标题失败不影响已生成的摘要，但不缓存
+        print(f"title failed for summary {sid}: {title_error}")
+        return summary, json.dumps(TITLE_FALLBACK, ensure_ascii=False), timings
+
+    # GPU节点超时返回的标题只解码了一部分，不缓存
+    partial = isinstance(title, dict) and title.pop('partial', False)
+    title = json.dumps(title, ensure_ascii=False)
+    if not partial:
+        time_use = round(time.perf_counter() - start, 3)
+        cache.set(cache_key, {'summary': summary, 'title': title, 'time_use': time_use})
+        ContentStore.save_result(ContentStore.fingerprint(content), max_len, summary, title, time_use)
+    return summary, title, timings
+
+
+def create_history(content, max_len, filename=None, user_id=0):
+    """
+    插入一条待处理的记录，内容保存到content_store，记录只引用内容并关联近似重复的已有内容
+    :return: 记录id
+    """
+    canonical_id, content_hash = ContentStore.store(content)
+    near_id, _, near_distance = NearDup.check(canonical_id, content) or (None, None, None)
+    return Dbconn.dbSet(
+        "INSERT INTO summary_history(status, contents, words_limit, create_datetime, file_name, user_id, content_hash, canonical_id, near_id, near_distance, lease_until) VALUES(?,?,?,?,?,?,?,?,?,?,?)",
+        [0, None, max_len, datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S"),
+         filename, user_id, content_hash, canonical_id, near_id, near_distance, time.time() + Config.TASK_QUEUE_LEASE]
+    )
+
+
+def _claim(sid):
+    """
+    开始处理时认领记录并续租
+    :return: 记录已完成或已由回收任务重新投递给其他任务时返回False
+    """
+    task_id = get_one_summary.request.id
+    now = time.time()
+    return Dbconn.dbSet(
+        "UPDATE summary_history SET task_id=?, started_at=?, lease_until=? "
+        "WHERE id=? AND status=0 AND (task_id IS NULL OR task_id=?)",
+        [task_id, now, now + Config.TASK_LEASE_SECONDS, sid, task_id]
+    ) != 0
+
+
+def _near_result(content, max_len):
+    """近似重复的已有内容中最相近且有结果的一篇，未开启复用时返回None"""
+    if not Config.NEAR_DUPLICATE_REUSE or len(content) < Config.NEAR_DUPLICATE_MIN_CHARS:
+        return None
+    matches = NearDup.find(NearDup.simhash(content))
+    saved = ContentStore.results((content_hash, max_len) for _, content_hash, _ in matches)
+    for _, content_hash, _ in matches:
+        if (content_hash, max_len) in saved:
+            return saved[(content_hash, max_len)]
+    return None
+
+
+@contextmanager
+def _heartbeat(task_id):
+    """
+    处理期间每Config.TASK_HEARTBEAT_INTERVAL秒为本任务认领的记录续租，处理较慢的任务不会被回收；
+    worker退出后不再续租，任务开始超过Config.TASK_MAX_RUNTIME秒后也停止续租，卡死的任务仍会被回收
+    """
+    if task_id is None:
+        yield
+        return
+    stop = threading.Event()
+    end = time.time() + Config.TASK_MAX_RUNTIME
+
+    def renew():
+        while not stop.wait(Config.TASK_HEARTBEAT_INTERVAL) and time.time() < end:
+            try:
+                Dbconn.dbSet("UPDATE summary_history SET lease_until=MAX(lease_until, ?) WHERE task_id=? AND status=0",
+                             [time.time() + Config.TASK_LEASE_SECONDS, task_id])
+            except Exception as e:
+                print(f"failed to renew lease of task {task_id}: {e}")
+
+    threading.Thread(target=renew, name="lease-heartbeat", daemon=True).start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+
 @app.task
-def get_one_summary(content, max_len, filename=None, user_id=0):
+def get_one_summary(content, max_len, filename=None, user_id=0, priority=Summary.INTERACTIVE, sid=None,
+                    job_id=None, content_hash=None):
     """
     获取单条摘要
-    :return: 响应dict
+    :param content: 文档内容，投递任务时传None，只在消息中带content_hash，由worker从content_store读取
+    :param priority: GPU节点调度优先级，单篇交互请求为interactive，批量文件为batch
+    :param sid: 已由接口插入的记录id，为None时在此插入
+    :param job_id: 所属批量任务id，完成时更新任务进度
+    :return: 响应dict，记录已由其他任务处理时返回None
     """
+    if sid is not None and not _claim(sid):
+        print(f"summary {sid} already finished or requeued, skipping")
+        return None
+    with _heartbeat(get_one_summary.request.id):
+        return _one_summary(content, max_len, filename, user_id, priority, sid, job_id, content_hash)
+
+
+def _one_summary(content, max_len, filename, user_id, priority, sid, job_id, content_hash):
+    BatchJob.advance(job_id, queued=-1, running=1)
     try:
         start_time = datetime.now()
 
-        sid = Dbconn.dbSet(
-            "INSERT INTO summary_history(status, contents, words_limit, create_datetime, file_name, user_id) VALUES(?,?,?,?,?,?)",
-            [0, content, max_len, datetime.strftime(start_time, "%Y-%m-%d %H:%M:%S"),
-             filename, user_id]
-        )
+        if content is None:
+            content = ContentStore.load(content_hash)
+        if sid is None:
+            sid = create_history(content, max_len, filename, user_id)
 
-        summary = Summary.summary(content, max_len)
-        title = Summary.title(content)
-
-        summary = json.dumps(summary, ensure_ascii=False)
-        title = json.dumps(title, ensure_ascii=False)
+        cache_key = cache.key(content, max_len=max_len)
+        cached = cache.get(cache_key, record=False)
+        if cached is None:
+            # 相同内容此前已生成过结果
+            cached = ContentStore.result(ContentStore.fingerprint(content), max_len) or _near_result(content, max_len)
+        # 查到此前保存的结果也计为命中
+        cache.record(cached)
+        if cached is not None:
+            # 命中缓存时仍写入本次处理记录
+            summary, title = cached['summary'], cached['title']
+            timings = None
+        else:
+            summary, title, timings = _generate(sid, content, max_len, priority, cache_key)
 
         end_time = datetime.now()
         time_use = (end_time - start_time).seconds + (end_time - start_time).microseconds / 1000000
@@ -55,16 +241,20 @@ def get_one_summary(content, max_len, filename=None, user_id=0):
             "UPDATE summary_history SET status=? WHERE id=?",
             [-1, sid]
         )
+        BatchJob.advance(job_id, running=-1, failed=1)
     else:
         Dbconn.dbSet(
             "UPDATE summary_history SET title=?, summary=?, time_use=?, status=1 WHERE id=?",
             [title, summary, time_use, sid]
         )
+        BatchJob.advance(job_id, running=-1, done=1)
 
         return {
             "summary": summary,
             "title": title,
             "time_use": time_use,
+            "timings": timings,
+            "cached": cached is not None,
             "sid": sid,
         }
 
@@ -75,6 +265,14 @@ def get_one_summary(content, max_len, filename=None, user_id=0):
     }
 
 
+def read_file(fileName):
+    """
+    读取txt或docx文件内容
+    :return: (内容, 记录中显示的文件名)
+    """
+    return Ingest.read_file(fileName), "/".join(fileName.split('/')[1:])
+
+
 @app.task
 def get_file_summary(fileName, user_id=0):
     """
@@ -83,21 +281,291 @@ def get_file_summary(fileName, user_id=0):
     :return:
     """
     print(fileName)
-    extName = fileName.split('.')[1]
-    if extName == 'txt':
-        with open(fileName, 'r') as f:
-            content = ""
-            for line in f.readlines():
-                content += line
-    else:
-        content = ""
-        document = Document(fileName)
-        for paragraph in document.paragraphs:
-            content += paragraph.text
-
-    content = content.encode('gbk', errors='ignore').decode('gbk').encode('utf-8').decode('utf-8')
-    print("/".join(fileName.split('/')[1:]))
-    get_one_summary.delay(content, 150, "/".join(fileName.split('/')[1:]), user_id=user_id)
+    content, filename = read_file(fileName)
+    print(filename)
+    # 读取时即计算内容哈希并保存内容，重复的文件复用已有结果
+    sid = create_history(content, 150, filename, user_id)
+    get_one_summary.delay(None, 150, filename, user_id=user_id, priority=Summary.BATCH, sid=sid,
+                          content_hash=ContentStore.fingerprint(content))
+
+
+# 插入记录前worker退出时消息重新投递，不会丢失整批文档
+@app.task(acks_late=True, reject_on_worker_lost=True)
+def get_batch_summary(items, user_id=0, priority=Summary.BATCH, job_id=None, slot=None):
+    """
+    批量获取摘要
+    一批文档的记录在一个事务中插入和更新，未命中缓存的文档一次请求GPU节点；
+    失败的文档保留各自的记录，单独投递get_one_summary重试。
+    重新投递时已插入记录的批次直接跳过，这些记录由reap_stuck回收
+    :param items: [{'content_hash': 内容哈希, 'max_len': 字数限制, 'filename': 文件名}]，内容投递前已保存
+    :param job_id: 所属批量任务id
+    :param slot: 公平调度分配的占用，完成后释放并投递下一批
+    :return: {'sids': 记录id列表, 'done': 完成数, 'retried': 重试数}
+    """
+    try:
+        with _heartbeat(get_batch_summary.request.id):
+            return _batch_summary(items, user_id, priority, job_id)
+    finally:
+        if slot is not None:
+            fair.release(user_id, slot)
+
+
+def _batch_summary(items, user_id, priority, job_id):
+    start = time.perf_counter()
+    # 记录插入时即由本任务认领，租约覆盖整批的GPU请求
+    task_id = get_batch_summary.request.id
+    if task_id is not None:
+        inserted = Dbconn.dbGet("SELECT id FROM summary_history WHERE batch_id=? ORDER BY id", [task_id])
+        if inserted:
+            print(f"batch {task_id} redelivered after its rows were inserted, skipping")
+            return {'sids': [row[0] for row in inserted], 'done': 0, 'retried': 0}
+    loaded = ContentStore.load_many([item['content_hash'] for item in items])
+    stored = [(loaded[item['content_hash']][0], item['content_hash']) for item in items]
+    items = [dict(item, content=loaded[item['content_hash']][1]) for item in items]
+    keys = [(content_hash, item['max_len']) for (_, content_hash), item in zip(stored, items)]
+    # 逐篇检测并加入索引，同一批中后面的文档也能匹配到前面的文档
+    near = [NearDup.check(canonical_id, item['content']) or (None, None, None)
+            for (canonical_id, _), item in zip(stored, items)]
+    create_datetime = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S")
+    now = time.time()
+    lease_until = now + Config.GPU_BATCH_DEADLINE + Config.TASK_LEASE_SECONDS
+    sids = Dbconn.dbInsertMany(
+        "INSERT INTO summary_history(status, contents, words_limit, create_datetime, file_name, user_id, job_id, content_hash, canonical_id, near_id, near_distance, task_id, started_at, lease_until, batch_id) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+        [[0, None, item['max_len'], create_datetime, item.get('filename'), user_id, job_id, content_hash, canonical_id,
+          near_id, near_distance, task_id, now, lease_until, task_id]
+         for (canonical_id, content_hash), item, (near_id, _, near_distance) in zip(stored, items, near)]
+    )
+    # 记录插入后才计为处理中，重新投递的批次不会重复扣减排队数
+    BatchJob.advance(job_id, queued=-len(items), running=len(items))
+
+    results = {}
+    missed = []
+    for i, item in enumerate(items):
+        cached = cache.get(cache.key(item['content'], max_len=item['max_len']), record=False)
+        if cached is not None:
+            cache.record(cached)
+            results[i] = (cached['summary'], cached['title'])
+        else:
+            missed.append(i)
+
+    # 缓存未命中时查询此前保存的结果；同一批中内容相同的文档只请求一次GPU节点
+    # 开启复用时也查询最相近的近似重复内容的结果
+    near_keys = {i: (near[i][1], items[i]['max_len']) for i in missed
+                 if Config.NEAR_DUPLICATE_REUSE and near[i][1] is not None}
+    saved = ContentStore.results([keys[i] for i in missed] + list(near_keys.values()))
+    pending = {}
+    for i in missed:
+        found = saved.get(keys[i]) or saved.get(near_keys.get(i))
+        # 查到此前保存的结果也计为命中
+        cache.record(found)
+        if found is not None:
+            results[i] = (found['summary'], found['title'])
+        else:
+            pending.setdefault(keys[i], []).append(i)
+
+    failed = []
+    if pending:
+        first = [indexes[0] for indexes in pending.values()]
+        try:
+            generated = Summary.batch([items[i]['content'] for i in first], priority=priority,
+                                      deadline=Summary.make_deadline(Config.GPU_BATCH_DEADLINE))
+        except Exception as e:
+            print(f"batch request failed, retrying {len(first)} documents individually: {e}")
+            generated = [e] * len(first)
+        if len(generated) != len(first):
+            # 结果数与请求的文档数不符时无法对应到文档，全部单独重试
+            print(f"batch request returned {len(generated)} results for {len(first)} documents, retrying individually")
+            generated = [GpuClient.GpuNodeError("GPU节点返回的结果数不符")] * len(first)
+        per_item = round((time.perf_counter() - start) / len(first), 3)
+        rows = []
+        for (key, indexes), result in zip(pending.items(), generated):
+            if isinstance(result, Exception):
+                failed.extend(indexes)
+                continue
+            summary, title = (json.dumps(r, ensure_ascii=False) for r in result)
+            for i in indexes:
+                results[i] = (summary, title)
+            cache.set(cache.key(items[indexes[0]]['content'], max_len=key[1]),
+                      {'summary': summary, 'title': title, 'time_use': per_item})
+            rows.append((*key, summary, title, per_item))
+        ContentStore.save_results(rows)
+
+    # 耗时按文档数均摊
+    time_use = round((time.perf_counter() - start) / len(items), 3)
+    Dbconn.dbSetMany(
+        "UPDATE summary_history SET title=?, summary=?, time_use=?, status=1 WHERE id=?",
+        [[title, summary, time_use, sids[i]] for i, (summary, title) in results.items()]
+    )
+    # 重试的文档回到排队状态，由get_one_summary重新认领并完成计数
+    Dbconn.dbSetMany(
+        "UPDATE summary_history SET task_id=NULL, started_at=NULL, lease_until=? WHERE id=?",
+        [[time.time() + Config.TASK_QUEUE_LEASE, sids[i]] for i in failed]
+    )
+    BatchJob.advance(job_id, running=-len(items), done=len(results), queued=len(failed))
+    for i in failed:
+        get_one_summary.delay(None, items[i]['max_len'], items[i].get('filename'), user_id=user_id,
+                              priority=priority, sid=sids[i], job_id=job_id, content_hash=items[i]['content_hash'])
+
+    return {'sids': sids, 'done': len(results), 'retried': len(failed)}
+
+
+def _task_state(task_id):
+    """Celery中记录的任务状态，没有任务id或结果后端不可用时返回None"""
+    if task_id is None:
+        return None
+    try:
+        return app.AsyncResult(task_id).state
+    except Exception as e:
+        print(f"failed to get state of task {task_id}: {e}")
+        return None
+
+
+@app.task
+def reap_stuck():
+    """
+    回收租约到期仍未完成的记录，由celery beat按Config.REAPER_INTERVAL定时执行
+    原任务仍在排队或执行中（worker卡住）时先撤销，再以新的任务id重新投递，原任务开始执行时发现记录已转给
+    新任务即跳过；已尝试Config.TASK_MAX_ATTEMPTS次的记录标记为失败。
+    批量任务的id即公平调度的占用，回收时释放占用，不必等到Config.FAIR_LEASE_SECONDS到期。
+    更新时比较租约，多个回收任务同时执行时每条记录只处理一次
+    :return: {'requeued': 重新投递数, 'failed': 标记失败数}
+    """
+    now = time.time()
+    rows = Dbconn.dbGet(
+        "SELECT id, task_id, started_at, lease_until, attempts, contents, content_hash, words_limit, file_name, user_id, job_id "
+        "FROM summary_history WHERE status=0 AND lease_until<? ORDER BY lease_until LIMIT ?",
+        [now, Config.REAPER_BATCH])
+    requeued = failed = 0
+    # 同一批次的多条记录只撤销和释放一次
+    reaped = set()
+    for sid, task_id, started_at, lease_until, attempts, contents, content_hash, max_len, filename, user_id, job_id in rows:
+        # 已开始处理的记录在批量任务中计为处理中，否则计为排队
+        stage = 'running' if started_at is not None else 'queued'
+        state = None
+        if task_id is not None and task_id not in reaped:
+            reaped.add(task_id)
+            state = _task_state(task_id)
+            if state in ('PENDING', 'STARTED', 'RETRY'):
+                app.control.revoke(task_id, terminate=state != 'PENDING')
+            # 不是批量任务时没有对应的占用，释放不影响其他批次
+            fair.release(user_id, task_id)
+        print(f"summary {sid} stuck, task {task_id} {state}, attempts {attempts}")
+
+        if attempts + 1 >= Config.TASK_MAX_ATTEMPTS:
+            if Dbconn.dbSet("UPDATE summary_history SET status=-1 WHERE id=? AND status=0 AND lease_until=?",
+                            [sid, lease_until]):
+                BatchJob.advance(job_id, **{stage: -1}, failed=1)
+                failed += 1
+            continue
+
+        new_task_id = uuid.uuid4().hex
+        if not Dbconn.dbSet(
+                "UPDATE summary_history SET task_id=?, started_at=NULL, lease_until=?, attempts=attempts+1 "
+                "WHERE id=? AND status=0 AND lease_until=?",
+                [new_task_id, now + Config.TASK_QUEUE_LEASE, sid, lease_until]):
+            continue
+        if stage == 'running':
+            BatchJob.advance(job_id, running=-1, queued=1)
+        # 迁移前的记录内容保存在contents中，没有内容哈希
+        get_one_summary.apply_async(
+            (contents, max_len, filename),
+            {'user_id': user_id, 'sid': sid, 'job_id': job_id, 'content_hash': content_hash,
+             'priority': Summary.BATCH if filename else Summary.INTERACTIVE},
+            task_id=new_task_id)
+        requeued += 1
+
+    return {'requeued': requeued, 'failed': failed}
+
+
+def enqueue_batches(items, user_id=0, job_id=None):
+    """
+    按Config.BATCH_SIZE分批加入用户的公平调度队列
+    内容先保存到content_store，队列和任务消息中只有内容哈希，消息大小与文档长度无关
+    :param items: 文档dict的可迭代对象，逐个读取，不需要全部放入内存
+    :param job_id: 所属批量任务id，投递前计入排队数
+    :return: 投递的文档数
+    """
+    def send(batch):
+        stored = ContentStore.store_many([item['content'] for item in batch])
+        refs = [{'content_hash': content_hash, 'max_len': item['max_len'], 'filename': item.get('filename')}
+                for (_, content_hash), item in zip(stored, batch)]
+        BatchJob.advance(job_id, queued=len(batch))
+        fair.push(user_id, {'items': refs, 'job_id': job_id})
+
+    batch = []
+    count = 0
+    for item in items:
+        batch.append(item)
+        if len(batch) >= Config.BATCH_SIZE:
+            send(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        send(batch)
+        count += len(batch)
+    return count
+
+
+def _zip_members(zFile, prefix, skipped):
+    """
+    逐个读取压缩包中的txt和docx成员，不解压到磁盘
+    超过单文件大小上限的成员被跳过，累计解压大小超过上限时停止
+    """
+    total = 0
+    for info in zFile.infolist():
+        name = info.filename
+        extName = name.split('.')[-1].lower()
+        if info.is_dir() or name.startswith('__MACOSX/') or extName not in ('txt', 'docx'):
+            continue
+        if info.file_size > Config.ZIP_MAX_MEMBER_BYTES:
+            skipped.append(f"{name}: 文件过大")
+            continue
+        if total + info.file_size > Config.ZIP_MAX_TOTAL_BYTES:
+            skipped.append(f"{name}: 超过压缩包总大小上限，停止处理")
+            return
+        # 按声明的大小读取，防止大小字段被篡改的压缩炸弹
+        with zFile.open(info) as f:
+            data = f.read(Config.ZIP_MAX_MEMBER_BYTES + 1)
+        if len(data) > Config.ZIP_MAX_MEMBER_BYTES:
+            skipped.append(f"{name}: 文件过大")
+            continue
+        total += len(data)
+        try:
+            content = Ingest.extract_text(data, extName)
+        except Exception as e:
+            skipped.append(f"{name}: {e}")
+            continue
+        yield {'content': content, 'max_len': 150, 'filename': f"{prefix}/{name}"}
+
+
+@app.task
+def ingest_zip(zip_path, user_id=0, job_id=None):
+    """
+    后台读取压缩包并分批投递摘要任务
+    :param job_id: 接口创建的批量任务id，全部投递后标记文档总数已确定
+    :return: {'queued': 投递的文档数, 'skipped': 跳过的成员及原因, 'error': 整体错误}
+    """
+    skipped = []
+    queued = 0
+    error = None
+    prefix = os.path.splitext(os.path.basename(zip_path))[0]
+    try:
+        with zipfile.ZipFile(zip_path) as zFile:
+            members = len(zFile.infolist())
+            if members > Config.ZIP_MAX_MEMBERS:
+                error = f"压缩包文件数{members}超过上限{Config.ZIP_MAX_MEMBERS}"
+            else:
+                queued = enqueue_batches(_zip_members(zFile, prefix, skipped), user_id=user_id, job_id=job_id)
+    except zipfile.BadZipFile as e:
+        error = f"压缩包格式错误: {e}"
+    except Exception as e:
+        error = f"读取压缩包出错: {e}"
+        raise
+    finally:
+        BatchJob.seal(job_id, error=error)
+
+    print(f"{zip_path}: 投递{queued}个文档，跳过{len(skipped)}个")
+    return {'queued': queued, 'skipped': skipped, 'error': error}
 
 
 if __name__ == "__main__":
@@ -1,3 +1,5 @@
+import os
+
 from flask import jsonify
 
 
@@ -33,6 +35,113 @@ class Config:
     REDIS_PASSWORD = None
     REDIS_DB = 0
 
+    # 相同请求合并：锁的最长持有时间和结果槽保留时间（秒）
+    SINGLE_FLIGHT_LOCK_TTL = 120
+    SINGLE_FLIGHT_RESULT_TTL = 30
+
+    # 批量任务：每个任务包含的文档数和GPU节点批量请求的截止时间（秒）
+    BATCH_SIZE = 32
+    GPU_BATCH_DEADLINE = 600
+
+    # 批量任务按用户公平调度：其他用户有待投递的批次时，每个用户同时在Celery中（排队或执行）的批次数上限，可按用户id单独设置；
+    # 所有用户合计的上限应不小于worker并发数以保持吞吐量，运行自动调整时随worker进程数提高；
+    # 批次的占用超过该时间（秒）未释放视为worker已退出
+    FAIR_USER_CONCURRENCY = 2
+    FAIR_USER_CONCURRENCY_OVERRIDES = {}
+    FAIR_MAX_INFLIGHT = 8
+    FAIR_LEASE_SECONDS = GPU_BATCH_DEADLINE + 300
+
+    # 近似重复检测：SimHash汉明距离阈值（按4段索引，不能超过3），短于该字数的文本不检测；
+    # 开启复用时近似重复的文档直接使用已有结果，不再生成
+    NEAR_DUPLICATE_DISTANCE = 3
+    NEAR_DUPLICATE_MIN_CHARS = 50
+    NEAR_DUPLICATE_REUSE = False
+
+    # 卡住的记录回收：记录排队和处理中的租约（秒），批量处理中的记录另加GPU_BATCH_DEADLINE；
+    # 处理期间每TASK_HEARTBEAT_INTERVAL秒续租一次，任务开始TASK_MAX_RUNTIME秒后不再续租；
+    # 租约到期仍未完成的记录由定时任务重新投递，共尝试TASK_MAX_ATTEMPTS次后标记为失败；
+    # 定时任务的执行间隔（秒）和每次最多处理的记录数
+    TASK_QUEUE_LEASE = 1800
+    TASK_LEASE_SECONDS = 300
+    TASK_HEARTBEAT_INTERVAL = 60
+    TASK_MAX_RUNTIME = GPU_BATCH_DEADLINE * 2
+    TASK_MAX_ATTEMPTS = 3
+    REAPER_INTERVAL = 60
+    REAPER_BATCH = 100
+
+    # worker进程池自动调整：每个worker的进程数上下限、每次调整的进程数和采样间隔（秒）；
+    # 连续多少次采样需要扩容/缩容才执行，两次调整之间的最短间隔（秒）；
+    # Celery队列中每个进程积压超过该消息数且GPU利用率（%）低于上限时扩容，
+    # GPU节点排队数或近期p95延迟（毫秒）达到上限时缩容，队列为空且利用率低于下限时缩容；
+    # 因GPU节点饱和缩容后，该时间（秒）内不再扩容到饱和时的进程数
+    AUTOSCALE_MIN_CONCURRENCY = 2
+    AUTOSCALE_MAX_CONCURRENCY = 16
+    AUTOSCALE_STEP = 2
+    AUTOSCALE_INTERVAL = 10
+    AUTOSCALE_GROW_SAMPLES = 3
+    AUTOSCALE_SHRINK_SAMPLES = 6
+    AUTOSCALE_COOLDOWN = 60
+    AUTOSCALE_QUEUES = ('celery',)
+    AUTOSCALE_BACKLOG_PER_WORKER = 2
+    AUTOSCALE_GPU_UTIL_HIGH = 90
+    AUTOSCALE_GPU_UTIL_LOW = 30
+    AUTOSCALE_GPU_QUEUE_HIGH = 64
+    AUTOSCALE_LATENCY_HIGH_MS = 30000
+    AUTOSCALE_CEILING_TTL = 600
+
+    # 上传文件读取：单个文件的字节数上限；提取的文本超过该字数时截断，不再继续解码。
+    # 标题模型只读取前480个token左右，摘要为抽取式，耗时随句子数平方增长，更长的内容对结果影响很小
+    INGEST_MAX_BYTES = 20 * 1024 * 1024
+    INGEST_MAX_CHARS = 20000
+
+    # 压缩包限制：成员数、单个文件和累计解压后的字节数
+    ZIP_MAX_MEMBERS = 10000
+    ZIP_MAX_MEMBER_BYTES = 20 * 1024 * 1024
+    ZIP_MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+
+    # 标题/摘要结果缓存：保留时间（秒）和占用字节上限
+    RESULT_CACHE_TTL = 7 * 24 * 3600
+    RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+    # GPU节点请求截止时间（秒），超时后GPU节点停止计算；
+    # 传给GPU节点的截止时间比本地读取超时提前该秒数，留出返回部分结果和网络传输的时间
+    GPU_REQUEST_DEADLINE = 60
+    GPU_DEADLINE_MARGIN = 2
+
+    # GPU节点HTTP客户端：每个worker进程的连接池大小、超时（秒）和重试
+    GPU_POOL_SIZE = 10
+    GPU_CONNECT_TIMEOUT = 2
+    GPU_READ_TIMEOUT = 60
+    GPU_RETRIES = 2
+    GPU_RETRY_BACKOFF = 0.2
+    GPU_STATUS_TIMEOUT = 2
+
+    # 与GPU节点之间的传输编码：'msgpack'（未安装msgpack时自动退回JSON）或'json'；
+    # 请求体超过该字节数时压缩（安装了zstandard时用zstd，否则gzip）
+    GPU_TRANSPORT = 'msgpack'
+    GPU_COMPRESS_MIN_BYTES = 64 * 1024
+
+    # 多GPU节点负载均衡：连续失败几次熔断节点、熔断后多久half-open探测和健康检查间隔（秒）
+    GPU_BREAKER_THRESHOLD = 3
+    GPU_BREAKER_RESET = 30
+    GPU_HEALTH_INTERVAL = 5
+
+    # 对冲请求：超过同一路径、同一文本长度档（按2的幂分档）最近延迟的该分位数仍未返回时向另一个节点重发，
+    # 该档样本数不足时不对冲；
+    # 批量请求代价大，不对冲
+    GPU_HEDGE_PATHS = ('/title', '/summarize')
+    GPU_HEDGE_PERCENTILE = 95
+    GPU_HEDGE_MIN_SAMPLES = 20
+    GPU_LATENCY_HISTORY = 200
+
+    # 标题与摘要并行调用GPU节点的线程池大小（每个进程）
+    GPU_FANOUT_WORKERS = 16
+
+    # 'http' 通过HTTP调用GPU节点；'embedded' 在当前进程中直接加载gpu_node的引擎（单机部署），
+    # 内嵌模式下每个worker进程各持有一份模型，建议Celery使用单进程或线程池
+    GPU_MODE = 'http'
+    GPU_NODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gpu_node')
+
     GPU_Node = {
         'GPU1': 'http://127.0.0.1:3000'
     }
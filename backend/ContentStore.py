@@ -0,0 +1,98 @@
+"""
+文档内容去重
+相同内容只在content_store中保存一份，summary_history通过canonical_id引用，不再重复保存contents，
+Celery任务消息中也只传递内容哈希，由worker从content_store读取；
+生成的摘要和标题按内容哈希和字数限制保存在content_result中，重复上传的文档直接复用，不再请求GPU节点。
+保存的是模型生成的结果，用户在记录上的编辑不会影响其他记录。
+"""
+import hashlib
+from datetime import datetime
+
+import Dbconn
+
+# 查询记录原文：去重后的记录contents为空，从content_store读取
+CONTENTS = "COALESCE(summary_history.contents, content_store.contents)"
+JOIN = "LEFT JOIN content_store ON summary_history.canonical_id = content_store.id"
+
+
+def fingerprint(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def store_many(contents):
+    """
+    保存内容，已存在的内容不重复保存
+    :return: [(canonical_id, content_hash)]，与contents一一对应
+    """
+    hashes = [fingerprint(content) for content in contents]
+    create_datetime = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S")
+    Dbconn.dbSetMany(
+        "INSERT OR IGNORE INTO content_store(content_hash, contents, create_datetime) VALUES(?,?,?)",
+        [[content_hash, content, create_datetime] for content_hash, content in zip(hashes, contents)]
+    )
+    ids = _ids(set(hashes))
+    return [(ids[content_hash], content_hash) for content_hash in hashes]
+
+
+def store(content):
+    return store_many([content])[0]
+
+
+def load_many(hashes):
+    """
+    按内容哈希读取内容，任务消息中只传递哈希
+    :return: {content_hash: (canonical_id, contents)}
+    """
+    hashes = list(set(hashes))
+    ret = Dbconn.dbGet(
+        f"SELECT content_hash, id, contents FROM content_store WHERE content_hash IN ({','.join('?' * len(hashes))})",
+        hashes)
+    return {content_hash: (canonical_id, contents) for content_hash, canonical_id, contents in ret}
+
+
+def load(content_hash):
+    return load_many([content_hash])[content_hash][1]
+
+
+def _ids(hashes):
+    hashes = list(hashes)
+    ret = Dbconn.dbGet(
+        f"SELECT content_hash, id FROM content_store WHERE content_hash IN ({','.join('?' * len(hashes))})", hashes)
+    return dict(ret)
+
+
+def results(keys):
+    """
+    查询已保存的处理结果
+    :param keys: [(content_hash, max_len)]
+    :return: {(content_hash, max_len): {'summary': 摘要json, 'title': 标题json, 'time_use': 生成耗时}}
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    hashes = list({content_hash for content_hash, _ in keys})
+    ret = Dbconn.dbGet(
+        f"SELECT content_hash, words_limit, summary, title, time_use FROM content_result "
+        f"WHERE content_hash IN ({','.join('?' * len(hashes))})", hashes)
+    return {(content_hash, max_len): {'summary': summary, 'title': title, 'time_use': time_use}
+            for content_hash, max_len, summary, title, time_use in ret if (content_hash, max_len) in keys}
+
+
+def result(content_hash, max_len):
+    return results([(content_hash, max_len)]).get((content_hash, max_len))
+
+
+def save_results(rows):
+    """
+    保存生成的完整结果
+    :param rows: [(content_hash, max_len, 摘要json, 标题json, 生成耗时)]
+    """
+    if rows:
+        Dbconn.dbSetMany(
+            "INSERT OR REPLACE INTO content_result(content_hash, words_limit, summary, title, time_use) VALUES(?,?,?,?,?)",
+            rows
+        )
+
+
+def save_result(content_hash, max_len, summary, title, time_use):
+    save_results([(content_hash, max_len, summary, title, time_use)])
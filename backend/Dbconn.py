@@ -1,4 +1,9 @@
+import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
 
 DATABASE = './db.sqlite'
 
@@ -11,19 +16,273 @@ def dbGet(sql, params):
     finally:
         local_conn.close()
 
+# 写入合并：写入线程取到一条写入后最多再等待该时间（秒）收集同时到达的写入，每个事务最多包含的写入数；
+# 其他进程正在写入时等待锁的时间（秒）；调用方等待写入开始执行的最长时间（秒）
+FLUSH_INTERVAL = 0.002
+MAX_BATCH = 256
+BUSY_TIMEOUT = 30
+WRITE_TIMEOUT = BUSY_TIMEOUT * 2
+
+
+class Writer:
+    """
+    每个进程一个写入线程，进程内各线程（接口服务的请求线程、标题摘要的并行线程）提交的写入排队后
+    合并到一个事务中提交，减少连接数和提交次数。
+    不是全局唯一的写入者：Celery prefork的每个子进程同时只执行一个任务，进程之间的写入不会合并，
+    进程之间的锁竞争由WAL模式（写入只追加日志、读取不阻塞）和BUSY_TIMEOUT等待锁解决。
+    每次写入在各自的SAVEPOINT中执行，失败时只回滚这一次写入；调用方等到事务提交后才返回结果，
+    进程在提交前退出时写入没有返回给调用方，与逐条提交的可靠性相同。
+    调用方等待超时时取消尚未开始执行的写入，抛出TimeoutError时写入一定没有生效，重试不会重复写入。
+    """
+
+    def __init__(self, flush_interval=None, max_batch=None):
+        self.flush_interval = FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.max_batch = max_batch or MAX_BATCH
+        self._queue = None
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _alive(self):
+        return self._pid == os.getpid() and self._thread.is_alive()
+
+    def _ensure_thread(self):
+        """写入线程在首次写入时创建，fork出的子进程各自创建；线程意外退出后在下次写入时重新创建"""
+        if self._alive():
+            return
+        with self._lock:
+            if self._alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+            # 同一进程中重新创建线程时沿用原队列，已提交的写入不会丢失
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name="db-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, fn):
+        """
+        提交一次写入
+        :param fn: fn(cursor)，在写入线程中执行，返回值作为结果
+        :return: Future，事务提交后得到fn的返回值或异常
+        """
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def _run(self, pending):
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(pending.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self.apply(batch)
+            except Exception as e:
+                # 任何异常都不能让写入线程退出，否则之后的写入都无人处理
+                self._fail(batch, e)
+
+    @staticmethod
+    def _fail(batch, error):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    @staticmethod
+    def apply(batch):
+        """在一个事务中执行一批写入，并设置各写入的结果"""
+        results = []
+        local_conn = None
+        try:
+            local_conn = sqlite3.connect(DATABASE, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                         check_same_thread=False)
+            cur = local_conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            for fn, future in batch:
+                # 调用方已超时取消的写入不再执行；开始执行后不能再取消，调用方等到提交后返回
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cur.execute("SAVEPOINT write")
+                try:
+                    results.append((future, fn(cur), None))
+                except Exception as e:
+                    cur.execute("ROLLBACK TO write")
+                    results.append((future, None, e))
+                cur.execute("RELEASE write")
+            cur.execute("COMMIT")
+        except Exception as e:
+            # 整个事务失败（如无法打开数据库、等待锁超时），本批写入都未生效
+            if local_conn is not None and local_conn.in_transaction:
+                try:
+                    local_conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            Writer._fail(batch, e)
+            return
+        finally:
+            if local_conn is not None:
+                local_conn.close()
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+writer = Writer()
+
+
+def _wait(future):
+    """
+    等待写入结果，超过WRITE_TIMEOUT仍未开始执行时取消
+    已开始执行的写入在当前事务结束后一定有结果（等待锁的时间受BUSY_TIMEOUT限制），继续等待，不会在写入生效后报告超时
+    """
+    try:
+        return future.result(timeout=WRITE_TIMEOUT)
+    except TimeoutError:
+        if future.cancel():
+            raise
+    return future.result()
+
+
 def dbSet(sql, params):
+    def write(cur):
+        cur.execute(sql, params)
+        if sql.split()[0] == 'INSERT':
+            return cur.lastrowid
+        return cur.rowcount
+    return _wait(writer.submit(write))
+
+def dbInsertMany(sql, rows):
+    """在一个事务中插入多行，返回各行的id"""
+    def write(cur):
+        ids = []
+        for params in rows:
+            cur.execute(sql, params)
+            ids.append(cur.lastrowid)
+        return ids
+    return _wait(writer.submit(write))
+
+def dbSetMany(sql, rows):
+    """在一个事务中执行多次更新，返回影响的行数"""
+    def write(cur):
+        cur.executemany(sql, rows)
+        return cur.rowcount
+    return _wait(writer.submit(write))
+
+# 新增的表和索引，重复执行无副作用
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS batch_job
+    (
+        id              integer not null
+            constraint batch_job_pk
+                primary key autoincrement,
+        user_id         integer,
+        name            text,
+        queued          integer default 0,
+        running         integer default 0,
+        done            integer default 0,
+        failed          integer default 0,
+        sealed          integer default 0,
+        error           text,
+        create_datetime text,
+        created_at      real,
+        started_at      real,
+        finished_at     real
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS content_store
+    (
+        id              integer not null
+            constraint content_store_pk
+                primary key autoincrement,
+        content_hash    text not null
+            constraint content_store_hash
+                unique,
+        contents        text,
+        create_datetime text
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS content_result
+    (
+        content_hash text    not null,
+        words_limit  integer not null,
+        summary      text,
+        title        text,
+        time_use     real,
+        constraint content_result_pk
+            primary key (content_hash, words_limit)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS content_simhash
+    (
+        canonical_id integer not null
+            constraint content_simhash_pk
+                primary key,
+        simhash      integer not null,
+        band0        integer not null,
+        band1        integer not null,
+        band2        integer not null,
+        band3        integer not null
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS content_simhash_band0 ON content_simhash (band0)",
+    "CREATE INDEX IF NOT EXISTS content_simhash_band1 ON content_simhash (band1)",
+    "CREATE INDEX IF NOT EXISTS content_simhash_band2 ON content_simhash (band2)",
+    "CREATE INDEX IF NOT EXISTS content_simhash_band3 ON content_simhash (band3)",
+]
+
+# 已有表中新增的列 (表名, 列名, 类型)
+COLUMNS = [
+    ('summary_history', 'job_id', 'integer'),
+    ('summary_history', 'content_hash', 'text'),
+    ('summary_history', 'canonical_id', 'integer'),
+    ('summary_history', 'near_id', 'integer'),
+    ('summary_history', 'near_distance', 'integer'),
+    # 处理该记录的Celery任务、开始处理时间、租约到期时间和已重新投递次数
+    ('summary_history', 'task_id', 'text'),
+    ('summary_history', 'started_at', 'real'),
+    ('summary_history', 'lease_until', 'real'),
+    ('summary_history', 'attempts', 'integer NOT NULL DEFAULT 0'),
+    # 插入该记录的批量任务，回收后不变，批量任务重新投递时据此跳过已插入的批次
+    ('summary_history', 'batch_id', 'text'),
+]
+
+INDEXES = [
+    ('summary_history', "CREATE INDEX IF NOT EXISTS summary_history_job_id ON summary_history (job_id)"),
+    ('summary_history', "CREATE INDEX IF NOT EXISTS summary_history_canonical_id ON summary_history (canonical_id)"),
+    ('summary_history', "CREATE INDEX IF NOT EXISTS summary_history_lease ON summary_history (status, lease_until)"),
+    ('summary_history', "CREATE INDEX IF NOT EXISTS summary_history_batch_id ON summary_history (batch_id)"),
+]
+
+def init():
+    """创建新增的表和列，启动时执行"""
     local_conn = sqlite3.connect(DATABASE, check_same_thread=False)
     try:
         cur = local_conn.cursor()
-        cur.execute(sql, params)
-        if sql.split()[0] == 'INSERT':
-            ret = cur.lastrowid
-        else:
-            ret = cur.rowcount
+        # WAL模式下读取不阻塞写入，写入提交时只追加日志
+        cur.execute("PRAGMA journal_mode=WAL")
+        for sql in TABLES:
+            cur.execute(sql)
+        for table, column, columnType in COLUMNS:
+            columns = [row[1] for row in cur.execute(f"PRAGMA table_info({table})")]
+            # 表不存在时跳过（如只包含部分表的测试数据库）
+            if columns and column not in columns:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {columnType}")
+                if (table, column) == ('summary_history', 'lease_until'):
+                    # 迁移前就卡住的记录没有租约，视为已到期
+                    cur.execute("UPDATE summary_history SET lease_until=0 WHERE status=0")
+        for table, sql in INDEXES:
+            if cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", [table]).fetchone():
+                cur.execute(sql)
         local_conn.commit()
-        return ret
     finally:
-        local_conn.close()
-
-def init():
-    pass  # 无需操作，仅保留接口兼容性
\ No newline at end of file
+        local_conn.close()
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+docx文本提取
+直接从docx压缩包中流式解析word/document.xml，只取正文段落和表格中的文字，不构建python-docx的文档对象树；
+每个顶层段落或表格处理完后即清空已解析的元素，内存占用与文档长度无关。
+"""
+import io
+import zipfile
+from xml.etree import ElementTree
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+BODY = W + 'body'
+P = W + 'p'
+T = W + 't'
+TR = W + 'tr'
+TC = W + 'tc'
+# 段落内转为空白字符的元素
+BREAKS = {W + 'tab': '\t', W + 'br': '\n', W + 'cr': '\n'}
+
+
+def extract(source):
+    """
+    提取docx正文
+    :param source: docx文件内容（bytes）或可seek的文件对象
+    :return: 文本，段落和表格行之间以换行分隔，同一行的单元格以制表符分隔，空段落不保留
+    """
+    return '\n'.join(paragraphs(source))
+
+
+def paragraphs(source):
+    """逐个产出段落和表格行的文本，调用方读取到足够的字数后可以停止，不再解析后面的内容"""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with zipfile.ZipFile(source) as zFile, zFile.open('word/document.xml') as xml:
+        yield from _lines(xml)
+
+
+def _lines(xml):
+    body = None
+    # 正在解析的段落（文本框中的段落嵌套在外层段落中）
+    paragraphs = []
+    # 正在解析的表格行和单元格，分别收集单元格文本和段落文本
+    containers = []
+    for event, elem in ElementTree.iterparse(xml, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if tag == P:
+                paragraphs.append([])
+            elif tag == TR or tag == TC:
+                containers.append([])
+            elif tag == BODY:
+                body = elem
+            continue
+
+        if tag == T:
+            if paragraphs:
+                paragraphs[-1].append(elem.text or '')
+        elif tag in BREAKS:
+            if paragraphs:
+                paragraphs[-1].append(BREAKS[tag])
+        elif tag == P or tag == TR or tag == TC:
+            if tag == P:
+                text = ''.join(paragraphs.pop())
+            elif tag == TC:
+                text = ' '.join(part for part in containers.pop() if part)
+            else:
+                text = '\t'.join(containers.pop())
+            if containers:
+                containers[-1].append(text)
+            elif text.strip():
+                yield text
+            if body is not None and not containers and not paragraphs:
+                # 顶层段落或表格已输出，释放已解析的元素
+                body.clear()
@@ -0,0 +1,184 @@
+import json
+import time
+import uuid
+
+import redis
+
+from Common import Config
+from SingleFlight import release_lock
+
+
+class FairQueue:
+    """
+    按用户公平调度批量任务
+    每个用户的批次先进入各自的Redis子队列，调度时在有待处理批次的用户之间轮转，每次取一个批次投递到Celery。
+    每个用户和所有用户合计在Celery中（排队或执行）的批次数都有上限，Celery队列中始终只有少量批次，
+    一个用户的大压缩包不会排在其他用户的上传前面；批次完成后释放占用并再次调度。
+    用户上限只在其他用户有待投递的批次时生效，只有一个用户有任务时可以用满合计上限。
+    """
+
+    def __init__(self, client, send, prefix='zhiwen:fair:', user_cap=None, max_inflight=None, lease=None,
+                 cap_overrides=None):
+        """
+        :param send: send(user_id, payload, slot)，把批次投递到Celery，批次完成时需以slot调用release
+        """
+        self.client = client
+        self.send = send
+        self.prefix = prefix
+        self.user_cap = user_cap or Config.FAIR_USER_CONCURRENCY
+        self.max_inflight = max_inflight or Config.FAIR_MAX_INFLIGHT
+        self.lease = lease or Config.FAIR_LEASE_SECONDS
+        self.cap_overrides = Config.FAIR_USER_CONCURRENCY_OVERRIDES if cap_overrides is None else cap_overrides
+        self.ring_key = prefix + 'ring'
+        self.active_key = prefix + 'active'
+        self.inflight_key = prefix + 'inflight'
+        self.lock_key = prefix + 'lock'
+        self.dirty_key = prefix + 'dirty'
+        self.limit_key = prefix + 'max_inflight'
+
+    def _queue_key(self, user_id):
+        return self.prefix + 'queue:' + str(user_id)
+
+    def _running_key(self, user_id):
+        return self.prefix + 'running:' + str(user_id)
+
+    def cap(self, user_id):
+        return self.cap_overrides.get(user_id, self.user_cap)
+
+    def inflight_limit(self):
+        """所有用户合计的上限，自动调整worker进程数后随之提高，不低于配置值"""
+        value = self.client.get(self.limit_key)
+        return max(self.max_inflight, int(value)) if value else self.max_inflight
+
+    def set_inflight_limit(self, limit, ttl):
+        """
+        按worker进程数设置合计上限并调度
+        :param ttl: 有效期（秒），设置方停止更新后恢复为配置值
+        """
+        self.client.set(self.limit_key, int(limit), ex=int(ttl))
+        self.dispatch()
+
+    def backlog(self):
+        """各用户子队列中尚未投递到Celery的批次数"""
+        users = self.client.smembers(self.active_key)
+        return sum(self.client.llen(self._queue_key(int(user_id))) for user_id in users)
+
+    def _others_waiting(self, user_id):
+        """其他用户的子队列中是否有待投递的批次"""
+        for other in self.client.smembers(self.active_key):
+            other = int(other)
+            if other != user_id and self.client.llen(self._queue_key(other)):
+                return True
+        return False
+
+    def _running(self, key, now):
+        # 占用以过期时间为分数，worker异常退出未释放的占用到期后不再计数
+        self.client.zremrangebyscore(key, '-inf', now)
+        return self.client.zcard(key)
+
+    def push(self, user_id, payload):
+        """
+        加入用户的子队列并尝试调度，Redis不可用时直接投递
+        批次加入子队列后即返回，调度失败不抛出异常，调用方不会重复加入；批次在下一次调度时投递
+        """
+        try:
+            self.client.rpush(self._queue_key(user_id), json.dumps(payload, ensure_ascii=False))
+            # 新加入的用户排在轮转最前，下一次调度即可投递
+            if self.client.sadd(self.active_key, user_id):
+                self.client.lpush(self.ring_key, user_id)
+        except redis.exceptions.RedisError:
+            self.send(user_id, payload, None)
+            return
+        try:
+            self.dispatch()
+        except Exception as e:
+            # Redis或Celery broker暂时不可用，批次已在子队列中
+            print(f"fair queue: dispatch failed after push: {e}")
+
+    def release(self, user_id, slot):
+        """批次完成，释放占用并调度下一批"""
+        try:
+            self.client.zrem(self._running_key(user_id), slot)
+            self.client.zrem(self.inflight_key, slot)
+            self.dispatch()
+        except redis.exceptions.RedisError:
+            pass
+
+    def dispatch(self):
+        """
+        在上限内尽可能多地投递批次
+        多个进程同时调度时只有抢到锁的一方执行，其余进程留下标记，由执行者释放锁后再调度一轮
+        :return: 投递的批次数
+        """
+        sent = 0
+        self.client.set(self.dirty_key, 1)
+        while self.client.get(self.dirty_key):
+            token = uuid.uuid4().hex
+            if not self.client.set(self.lock_key, token, nx=True, ex=30):
+                break
+            try:
+                self.client.delete(self.dirty_key)
+                sent += self._dispatch()
+            finally:
+                # 锁已过期并被其他进程抢到时不能删除
+                release_lock(self.client, self.lock_key, token)
+        return sent
+
+    def _dispatch(self):
+        now = time.time()
+        sent = 0
+        # 连续达到上限的用户数，轮转一圈都无法投递时结束
+        idle = 0
+        max_inflight = self.inflight_limit()
+        while self._running(self.inflight_key, now) < max_inflight:
+            if idle >= self.client.llen(self.ring_key):
+                break
+            user_id = int(self.client.lpop(self.ring_key))
+            queue_key = self._queue_key(user_id)
+            running_key = self._running_key(user_id)
+            if self._running(running_key, now) >= self.cap(user_id) and self._others_waiting(user_id):
+                self.client.rpush(self.ring_key, user_id)
+                idle += 1
+                continue
+
+            raw = self.client.lpop(queue_key)
+            if raw is None:
+                # 子队列已空，移出轮转；之后再检查一次，避免漏掉同时写入的批次
+                self.client.srem(self.active_key, user_id)
+                if self.client.llen(queue_key) and self.client.sadd(self.active_key, user_id):
+                    self.client.rpush(self.ring_key, user_id)
+                continue
+
+            slot = uuid.uuid4().hex
+            self.client.zadd(running_key, {slot: now + self.lease})
+            self.client.zadd(self.inflight_key, {slot: now + self.lease})
+            self.client.rpush(self.ring_key, user_id)
+            try:
+                self.send(user_id, json.loads(raw), slot)
+            except Exception:
+                # 投递失败时放回队首
+                self.client.lpush(queue_key, raw)
+                self.client.zrem(running_key, slot)
+                self.client.zrem(self.inflight_key, slot)
+                raise
+            sent += 1
+            idle = 0
+        return sent
+
+    def stats(self):
+        """各用户排队和在Celery中的批次数"""
+        now = time.time()
+        try:
+            users = sorted(int(user_id) for user_id in self.client.smembers(self.active_key))
+            return {
+                'inflight': self._running(self.inflight_key, now),
+                'max_inflight': self.inflight_limit(),
+                'users': [{
+                    'user_id': user_id,
+                    'queued': self.client.llen(self._queue_key(user_id)),
+                    'running': self._running(self._running_key(user_id), now),
+                    'cap': self.cap(user_id),
+                } for user_id in users],
+            }
+        except redis.exceptions.RedisError:
+            return None
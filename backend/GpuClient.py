@@ -0,0 +1,599 @@
+import gzip
+import importlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from Common import Config
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MSGPACK = 'application/msgpack'
+
+# 可重试的状态码：节点过载或网关错误（504表示截止时间已过，不重试）
+RETRY_STATUS = (502, 503)
+
+
+class GpuNodeError(Exception):
+    """GPU节点请求失败"""
+
+    def __init__(self, msg, status=None):
+        super().__init__(msg)
+        self.status = status
+
+    @property
+    def node_fault(self):
+        """连接失败或节点过载；节点返回的业务错误（如参数错误、截止时间已过）不算节点故障"""
+        return self.status is None or self.status in RETRY_STATUS
+
+
+class GpuClient:
+    """
+    GPU节点HTTP客户端
+    每个worker进程持有独立的连接池（fork后重新创建），连接保持keep-alive，
+    支持连接/读取超时和带抖动的有限次重试；请求体默认用msgpack编码，大文本压缩后发送，
+    响应按Content-Type解码。
+    """
+
+    def __init__(self, base_url=None, pool_size=None, connect_timeout=None, read_timeout=None,
+                 retries=None, backoff=None, transport=None, compress_min_bytes=None):
+        self.base_url = base_url or list(Config.GPU_Node.values())[0]
+        self.pool_size = pool_size or Config.GPU_POOL_SIZE
+        self.connect_timeout = connect_timeout or Config.GPU_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or Config.GPU_READ_TIMEOUT
+        self.retries = Config.GPU_RETRIES if retries is None else retries
+        self.backoff = Config.GPU_RETRY_BACKOFF if backoff is None else backoff
+        self.transport = transport or Config.GPU_TRANSPORT
+        self.compress_min_bytes = compress_min_bytes or Config.GPU_COMPRESS_MIN_BYTES
+        self._lock = threading.Lock()
+        self._pid = None
+        self._session = None
+
+    def session(self):
+        """返回当前进程的Session，Celery prefork子进程不会复用父进程的连接"""
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                                          max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session, self._pid = session, pid
+        return self._session
+
+    def encode(self, body):
+        """
+        编码请求体
+        :return: (bytes, 请求头)
+        """
+        if self.transport == 'msgpack' and msgpack is not None:
+            data = msgpack.packb(body, use_bin_type=True)
+            headers = {'Content-Type': MSGPACK, 'Accept': MSGPACK}
+        else:
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            headers = {'Content-Type': 'application/json'}
+        if len(data) >= self.compress_min_bytes:
+            if zstandard is not None:
+                data = zstandard.ZstdCompressor().compress(data)
+                headers['Content-Encoding'] = 'zstd'
+            else:
+                data = gzip.compress(data, compresslevel=1)
+                headers['Content-Encoding'] = 'gzip'
+        return data, headers
+
+    @staticmethod
+    def decode(resp):
+        if msgpack is not None and resp.headers.get('Content-Type', '').startswith(MSGPACK):
+            result = msgpack.unpackb(resp.content, raw=False)
+        else:
+            result = resp.json()
+        # 超时后返回的部分结果由X-Partial响应头标记，与内嵌模式一样放入结果中
+        if resp.headers.get('X-Partial') == '1' and isinstance(result, dict):
+            result['partial'] = True
+        return result
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        """
+        发送请求并返回解码后的响应
+        :param timeout: 本次请求的剩余时间（秒），作为读取超时并限制重试；未指定时读取超时为read_timeout。
+                        批量请求的截止时间远长于read_timeout，读取超时随之延长，不会在GPU节点计算完成前放弃
+        """
+        url = self.base_url + path
+        data = None
+        if body is not None:
+            data, body_headers = self.encode(body)
+            headers = dict(headers or {}, **body_headers)
+        end = time.time() + timeout if timeout is not None else None
+        attempt = 0
+        while True:
+            read_timeout = self.read_timeout
+            if end is not None:
+                read_timeout = max(0.001, end - time.time())
+            try:
+                resp = self.session().request(method, url, data=data, headers=headers,
+                                              timeout=(self.connect_timeout, read_timeout))
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                error = GpuNodeError(f"GPU节点连接失败: {e}")
+            except requests.exceptions.RequestException as e:
+                # 读取超时等错误不重试，避免重复占用GPU
+                raise GpuNodeError(f"GPU节点请求失败: {e}")
+            else:
+                if resp.status_code < 400:
+                    return self.decode(resp)
+                error = GpuNodeError(f"GPU节点返回错误: {resp.status_code}", status=resp.status_code)
+                if resp.status_code not in RETRY_STATUS:
+                    raise error
+
+            if attempt >= self.retries:
+                raise error
+            delay = random.uniform(0, self.backoff * 2 ** attempt)
+            if end is not None and time.time() + delay >= end:
+                raise error
+            time.sleep(delay)
+            attempt += 1
+
+    def post(self, path, body, headers=None, timeout=None):
+        return self.request('POST', path, body=body, headers=headers, timeout=timeout)
+
+    def get(self, path, timeout=None):
+        return self.request('GET', path, timeout=timeout)
+
+
+class CircuitBreaker:
+    """
+    单个节点的熔断器
+    closed: 正常放行，连续失败达到阈值后打开；
+    open: 拒绝请求，冷却期过后转为half-open；
+    half_open: 只放行一个探测请求，成功则关闭，失败则重新打开。
+    调用方需持有NodePool的锁。
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold, reset_seconds, clock=time.time):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self._state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    @property
+    def state(self):
+        if self._state == self.OPEN and self.clock() >= self.opened_at + self.reset_seconds:
+            self._state = self.HALF_OPEN
+            self.probing = False
+        return self._state
+
+    def available(self):
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self.probing)
+
+    def acquire(self):
+        """占用一次放行，half-open状态下即为探测请求"""
+        if self.state == self.HALF_OPEN:
+            self.probing = True
+
+    def record_success(self):
+        self._state = self.CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            self.trip()
+
+    def trip(self):
+        self._state = self.OPEN
+        self.opened_at = self.clock()
+        self.probing = False
+
+    def half_open(self):
+        """健康检查成功时提前结束冷却期，仍需一次真实请求探测后才完全恢复"""
+        if self.state == self.OPEN:
+            self._state = self.HALF_OPEN
+            self.probing = False
+
+    def retry_at(self):
+        return self.opened_at + self.reset_seconds if self.state == self.OPEN else 0.0
+
+
+class Node:
+    """一个GPU节点及其路由状态"""
+
+    def __init__(self, name, url, client, breaker):
+        self.name = name
+        self.url = url
+        self.client = client
+        self.breaker = breaker
+        self.outstanding = 0
+        self.utilization = 0.0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.last_error = None
+
+    @property
+    def weight(self):
+        """按节点上报的GPU利用率降低权重"""
+        return max(0.1, 1 - self.utilization / 100)
+
+
+def _length_bucket(body):
+    """按文本长度分档（2的幂），处理耗时随长度增长，长文档与短文档的延迟不放在一起比较"""
+    text = body.get('text') if isinstance(body, dict) else None
+    return len(text).bit_length() if isinstance(text, str) else 0
+
+
+class NodePool:
+    """
+    多GPU节点负载均衡
+    使用power-of-two-choices：随机取两个可用节点，选 (在途请求数+1)/权重 较小者；
+    每个节点有独立的熔断器，连续失败后停止放行，冷却期后以half-open探测恢复。
+    同一路径、同一长度档的请求超过最近延迟的p95仍未返回时，向另一个节点发送对冲请求，取先返回的结果；
+    长文档只与长度相近的文档比较，正常耗时较长时不会被对冲而在两个节点上重复计算。
+    """
+
+    def __init__(self, nodes=None, breaker_threshold=None, breaker_reset=None, health_interval=None,
+                 hedge_percentile=None, hedge_min_samples=None, latency_history=None,
+                 client_factory=GpuClient, rng=None):
+        nodes = nodes or Config.GPU_Node
+        breaker_threshold = breaker_threshold or Config.GPU_BREAKER_THRESHOLD
+        breaker_reset = breaker_reset or Config.GPU_BREAKER_RESET
+        self.nodes = [Node(name, url, client_factory(base_url=url), CircuitBreaker(breaker_threshold, breaker_reset))
+                      for name, url in nodes.items()]
+        self.health_interval = health_interval or Config.GPU_HEALTH_INTERVAL
+        self.hedge_percentile = hedge_percentile or Config.GPU_HEDGE_PERCENTILE
+        self.hedge_min_samples = hedge_min_samples or Config.GPU_HEDGE_MIN_SAMPLES
+        self.latency_history = latency_history or Config.GPU_LATENCY_HISTORY
+        self.rng = rng or random.Random()
+        self._latency = {}
+        self._lock = threading.Lock()
+        self._health_pid = None
+        # 对冲请求需要在后台线程中发送主请求；线程在首次提交时才创建
+        self._executor = ThreadPoolExecutor(max_workers=Config.GPU_POOL_SIZE * 2, thread_name_prefix="gpu-hedge")
+
+    def pick(self, exclude=()):
+        """选择一个节点并占用一个在途名额，所有节点熔断时抛出GpuNodeError"""
+        self._ensure_health_checks()
+        with self._lock:
+            candidates = [n for n in self.nodes if n.breaker.available() and n not in exclude]
+            if not candidates:
+                raise GpuNodeError("没有可用的GPU节点")
+            if len(candidates) > 1:
+                candidates = self.rng.sample(candidates, 2)
+            node = min(candidates, key=lambda n: (n.outstanding + 1) / n.weight)
+            node.breaker.acquire()
+            node.outstanding += 1
+        return node
+
+    def release(self, node, error=None):
+        """归还在途名额并记录结果"""
+        with self._lock:
+            node.outstanding -= 1
+            if error is None:
+                node.breaker.record_success()
+                return
+            node.last_error = str(error)
+            node.breaker.record_failure()
+
+    def hedge_delay(self, path, body=None):
+        """该路径、该长度档最近成功请求延迟的分位数，样本不足或该路径不对冲时返回None"""
+        if path not in Config.GPU_HEDGE_PATHS:
+            return None
+        with self._lock:
+            samples = sorted(self._latency.get((path, _length_bucket(body)), ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return samples[min(len(samples) - 1, len(samples) * self.hedge_percentile // 100)]
+
+    def _call(self, node, method, path, body, headers, timeout):
+        """在指定节点上发送请求，记录延迟和熔断状态；无论结果如何都归还在途名额"""
+        start = time.monotonic()
+        error = None
+        try:
+            result = node.client.request(method, path, body=body, headers=headers, timeout=timeout)
+        except GpuNodeError as e:
+            error = e if e.node_fault else None
+            raise
+        except Exception as e:
+            # 成功状态码但响应无法解码等意外错误，同样计为节点故障
+            error = GpuNodeError(f"GPU节点响应异常: {e}")
+            raise error from e
+        finally:
+            self.release(node, error=error)
+        key = (path, _length_bucket(body))
+        with self._lock:
+            samples = self._latency.get(key)
+            if samples is None:
+                samples = self._latency[key] = deque(maxlen=self.latency_history)
+            samples.append(time.monotonic() - start)
+        return result
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        """
+        在选中的节点上发送请求
+        节点故障时换一个节点再试一次；主请求超过同一长度档的p95未返回时向另一个节点发送对冲请求
+        """
+        node = self.pick()
+        start = time.monotonic()
+        delay = self.hedge_delay(path, body)
+        if delay is None or len(self.nodes) < 2:
+            try:
+                return self._call(node, method, path, body, headers, timeout)
+            except GpuNodeError as e:
+                if not e.node_fault or len(self.nodes) < 2:
+                    raise
+                error = e
+            # 重试只使用剩余的时间
+            remaining = None if timeout is None else timeout - (time.monotonic() - start)
+            if remaining is not None and remaining <= 0:
+                raise error
+            try:
+                retry = self.pick(exclude=[node])
+            except GpuNodeError:
+                raise error
+            return self._call(retry, method, path, body, headers, remaining)
+
+        tried = [node]
+        pending = {self._executor.submit(self._call, node, method, path, body, headers, timeout): node}
+        error = None
+        while pending:
+            wait_for = None if len(tried) > 1 else delay
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                winner = pending.pop(future)
+                try:
+                    result = future.result()
+                except GpuNodeError as e:
+                    if not e.node_fault:
+                        raise
+                    error = e
+                else:
+                    if winner is not node:
+                        with self._lock:
+                            winner.hedge_wins += 1
+                    # 落后的请求在后台完成，GPU节点会在截止时间后停止计算
+                    return result
+            if len(tried) > 1:
+                continue
+            try:
+                hedge = self.pick(exclude=tried)
+            except GpuNodeError:
+                if error is not None:
+                    raise error
+                continue
+            tried.append(hedge)
+            with self._lock:
+                hedge.hedged += 1
+            remaining = None if timeout is None else max(0.001, timeout - (time.monotonic() - start))
+            pending[self._executor.submit(self._call, hedge, method, path, body, headers, remaining)] = hedge
+        raise error
+
+    def post(self, path, body, headers=None, timeout=None):
+        return self.request('POST', path, body=body, headers=headers, timeout=timeout)
+
+    def check_health(self, timeout=None):
+        """
+        轮询各节点的/nvidia_info，更新利用率权重；
+        失败的节点熔断，已熔断但健康的节点转为half-open等待真实请求探测
+        :return: {节点名: 设备信息或None}
+        """
+        results = {}
+        for node in self.nodes:
+            try:
+                info = node.client.get('/nvidia_info', timeout=timeout or Config.GPU_STATUS_TIMEOUT)
+            except GpuNodeError as e:
+                with self._lock:
+                    node.last_error = str(e)
+                    node.breaker.trip()
+                results[node.name] = None
+                continue
+            gpus = info.get('gpus') or []
+            with self._lock:
+                if gpus:
+                    node.utilization = sum(g['gpu_usage_percent'] for g in gpus) / len(gpus)
+                node.breaker.half_open()
+            results[node.name] = info
+        return results
+
+    def device_info(self, timeout=None):
+        """
+        读取各节点的/nvidia_info用于展示，不改变熔断状态和负载均衡权重
+        :return: {节点名: 设备信息或None}
+        """
+        results = {}
+        for node in self.nodes:
+            try:
+                results[node.name] = node.client.get('/nvidia_info', timeout=timeout or Config.GPU_STATUS_TIMEOUT)
+            except GpuNodeError:
+                results[node.name] = None
+        return results
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            try:
+                self.check_health()
+            except Exception:
+                pass
+
+    def _ensure_health_checks(self):
+        """每个worker进程启动一个后台健康检查线程"""
+        if len(self.nodes) < 2 or self._health_pid == os.getpid():
+            return
+        with self._lock:
+            if self._health_pid == os.getpid():
+                return
+            self._health_pid = os.getpid()
+        threading.Thread(target=self._health_loop, name="gpu-health", daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            return [{
+                'name': n.name,
+                'url': n.url,
+                'outstanding': n.outstanding,
+                'utilization': n.utilization,
+                'weight': round(n.weight, 2),
+                'available': n.breaker.available(),
+                'breaker': n.breaker.state,
+                'failures': n.breaker.failures,
+                'hedged': n.hedged,
+                'hedge_wins': n.hedge_wins,
+                'last_error': n.last_error,
+            } for n in self.nodes]
+
+
+class EmbeddedPool:
+    """
+    内嵌推理，接口与NodePool相同
+    在当前进程中直接调用gpu_node的标题和摘要引擎，省去JSON编解码和HTTP往返；
+    引擎在首次请求时加载（fork之后），同一进程内的生成调用串行执行。
+    """
+
+    name = 'embedded'
+
+    def __init__(self, node_dir=None):
+        self.node_dir = os.path.abspath(node_dir or Config.GPU_NODE_DIR)
+        self.outstanding = 0
+        self.last_error = None
+        self._engines = None
+        self._lock = threading.Lock()
+        self._generate_lock = threading.Lock()
+        self._routes = {
+            ('POST', '/title'): self._title,
+            ('POST', '/summarize'): self._summarize,
+            ('POST', '/batch'): self._batch,
+            ('GET', '/nvidia_info'): self._nvidia_info,
+        }
+
+    def engines(self):
+        """加载gpu_node的引擎模块"""
+        if self._engines is None:
+            with self._lock:
+                if self._engines is None:
+                    if self.node_dir not in sys.path:
+                        sys.path.insert(0, self.node_dir)
+                    core = importlib.import_module('core')
+                    deadline = importlib.import_module('core.deadline')
+                    device_stats = importlib.import_module('core.device_stats')
+                    sampler = device_stats.DeviceSampler()
+                    sampler.start()
+                    self._engines = {
+                        'generator': core.load_generator(),
+                        'generate_summary': core.generate_summary,
+                        'Deadline': deadline.Deadline,
+                        'DeadlineExceeded': deadline.DeadlineExceeded,
+                        'sampler': sampler,
+                    }
+        return self._engines
+
+    def _title(self, engines, body, headers, deadline):
+        sentences = int(body.get('sentences', 3))
+        allow_partial = headers.get('X-Allow-Partial') == '1'
+        with self._generate_lock:
+            titles = engines['generator'].generate(body['text'], sentences, deadline=deadline,
+                                                   allow_partial=allow_partial)
+        result = {'title': titles}
+        # 允许部分结果时超时不抛出异常，生成结束时已超时说明标题只解码了一部分
+        if allow_partial and deadline is not None and deadline.expired():
+            result['partial'] = True
+        return result
+
+    def _summarize(self, engines, body, headers, deadline):
+        text = body['text'].strip()
+        if not text:
+            raise ValueError("Text cannot be empty or whitespace only")
+        with self._generate_lock:
+            summary = engines['generate_summary'](text, int(body.get('sentences', 3)), deadline=deadline)
+        return {'summary': summary, 'sentence_count': len(summary)}
+
+    def _batch(self, engines, body, headers, deadline):
+        results = []
+        for text in body['texts']:
+            try:
+                results.append({
+                    'summary': self._summarize(engines, {'text': text}, headers, deadline)['summary'],
+                    'title': self._title(engines, {'text': text}, {}, deadline)['title'],
+                })
+            except Exception as e:
+                results.append({'error': str(e) or type(e).__name__})
+        return {'results': results}
+
+    def _nvidia_info(self, engines, body, headers, deadline):
+        return engines['sampler'].snapshot()
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        """
+        在当前进程中执行请求，错误按HTTP状态码转换为GpuNodeError
+        :param timeout: 剩余时间（秒），作为引擎的截止时间
+        """
+        handler = self._routes.get((method, path))
+        if handler is None:
+            raise GpuNodeError(f"内嵌模式不支持 {method} {path}", status=404)
+        engines = self.engines()
+        deadline = engines['Deadline'](timeout) if timeout is not None else None
+        with self._lock:
+            self.outstanding += 1
+        try:
+            return handler(engines, body or {}, headers or {}, deadline)
+        except engines['DeadlineExceeded'] as e:
+            raise GpuNodeError(str(e), status=504)
+        except (KeyError, TypeError, ValueError) as e:
+            raise GpuNodeError(f"参数错误: {e}", status=400)
+        except Exception as e:
+            self.last_error = str(e)
+            raise GpuNodeError(f"内嵌推理失败: {e}", status=500)
+        finally:
+            with self._lock:
+                self.outstanding -= 1
+
+    def post(self, path, body, headers=None, timeout=None):
+        return self.request('POST', path, body=body, headers=headers, timeout=timeout)
+
+    def get(self, path, timeout=None):
+        return self.request('GET', path, timeout=timeout)
+
+    def check_health(self, timeout=None):
+        """引擎尚未在本进程加载时不报告设备状态，避免为状态查询加载模型"""
+        if self._engines is None:
+            return {self.name: None}
+        return {self.name: self.get('/nvidia_info')}
+
+    def device_info(self, timeout=None):
+        return self.check_health(timeout)
+
+    def stats(self):
+        return [{
+            'name': self.name,
+            'url': self.node_dir,
+            'outstanding': self.outstanding,
+            'available': True,
+            'loaded': self._engines is not None,
+            'last_error': self.last_error,
+        }]
+
+
+# 进程内共享的GPU节点池，按配置选择HTTP或内嵌推理
+pool = EmbeddedPool() if Config.GPU_MODE == 'embedded' else NodePool()
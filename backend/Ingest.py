@@ -0,0 +1,124 @@
+"""
+上传文件的文本读取
+文件只读取一次字节，按BOM、空字节分布和UTF-8校验快速判断编码（UTF-8、UTF-16或GB18030），
+用增量解码器分块解码并逐行规范空白；达到模型实际使用的字数后停止解码，大文件不会整篇解码和复制。
+"""
+import codecs
+import re
+
+import DocxText
+from Common import Config
+
+CHUNK = 64 * 1024
+# 判断编码时检查的字节数
+SAMPLE = 16 * 1024
+
+LINE_BREAK = re.compile(r'\r\n|\r|\n')
+# 行内连续的空白（含全角空格和不换行空格）合并为一个空格
+SPACES = re.compile(r'[ \t\f\v\xa0\u3000]+')
+# 除换行和制表符外的控制字符、BOM和零宽字符
+INVISIBLE = re.compile(r'[\x00-\x08\x0b-\x1f\x7f\ufeff\u200b-\u200d]')
+NON_ASCII = re.compile(rb'[\x80-\xff]')
+
+
+def detect_encoding(data):
+    """
+    判断文本编码
+    :return: 'utf-8-sig'、'utf-16'、'utf-16-le'、'utf-16-be'、'utf-8'或'gb18030'
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    # UTF-8和GB18030文本中不会出现空字节；没有BOM的UTF-16中ASCII字符的高位字节为0
+    sample = data[:SAMPLE]
+    zeros = sample.count(0)
+    if zeros > len(sample) // 8:
+        odd = sample[1::2].count(0)
+        return 'utf-16-le' if odd >= zeros - odd else 'utf-16-be'
+
+    # 开头的纯ASCII部分在各编码下相同，从第一个非ASCII字节开始校验
+    match = NON_ASCII.search(data)
+    if match is None:
+        return 'utf-8'
+    sample = data[match.start():match.start() + SAMPLE]
+    try:
+        # 非最终块，末尾被截断的多字节字符不算错误
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 'gb18030'
+    return 'utf-8'
+
+
+def _decoded_lines(data, encoding):
+    """分块解码并按换行符拆分，\\r\\n、\\r和\\n都视为换行"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    view = memoryview(data)
+    carry = ''
+    for start in range(0, len(data), CHUNK):
+        final = start + CHUNK >= len(data)
+        text = carry + decoder.decode(view[start:start + CHUNK], final=final)
+        # 块末尾的\r可能与下一块开头的\n组成一个换行
+        if text.endswith('\r') and not final:
+            text, carry = text[:-1], '\r'
+        else:
+            carry = ''
+        lines = LINE_BREAK.split(text)
+        carry = lines.pop() + carry
+        yield from lines
+    if carry:
+        yield carry
+
+
+def normalize(lines, max_chars=None):
+    """
+    规范空白并截断
+    行内连续空白合并为一个空格，去掉行首尾空白和不可见字符，连续空行只保留一个，去掉首尾空行；
+    读取到max_chars个字符后停止读取lines
+    :param lines: 文本行的可迭代对象，行内可以包含换行符
+    :return: 规范后的文本
+    """
+    max_chars = Config.INGEST_MAX_CHARS if max_chars is None else max_chars
+    parts = []
+    size = 0
+    blank = False
+    for raw in lines:
+        for line in LINE_BREAK.split(raw):
+            line = SPACES.sub(' ', INVISIBLE.sub('', line)).strip()
+            if not line:
+                blank = bool(parts)
+                continue
+            if parts:
+                line = ('\n\n' if blank else '\n') + line
+            blank = False
+            if size + len(line) >= max_chars:
+                parts.append(line[:max_chars - size])
+                return ''.join(parts).rstrip()
+            parts.append(line)
+            size += len(line)
+    return ''.join(parts)
+
+
+def decode(data, max_chars=None):
+    """检测编码并解码txt文件内容"""
+    return normalize(_decoded_lines(data, detect_encoding(data)), max_chars)
+
+
+def extract_text(data, extName, max_chars=None):
+    """
+    从txt或docx文件内容中提取文本
+    :raise ValueError: 文件超过Config.INGEST_MAX_BYTES
+    """
+    if len(data) > Config.INGEST_MAX_BYTES:
+        raise ValueError(f"文件超过{Config.INGEST_MAX_BYTES // (1024 * 1024)}MB")
+    if extName.lower() == 'docx':
+        return normalize(DocxText.paragraphs(data), max_chars)
+    return decode(data, max_chars)
+
+
+def read_file(fileName, max_chars=None):
+    """读取文件并提取文本，超过大小上限时不读取全部内容"""
+    with open(fileName, 'rb') as f:
+        data = f.read(Config.INGEST_MAX_BYTES + 1)
+    return extract_text(data, fileName.split('.')[-1], max_chars)
@@ -0,0 +1,79 @@
+"""
+近似重复检测
+每篇文档按字符3-gram计算64位SimHash，分为4段16位分别建索引。汉明距离不超过3的两个指纹
+至少有一段完全相同，查询时只取任一段相同的候选再计算距离，文档数增长到百万级时每段的候选仍然很少。
+"""
+import hashlib
+import re
+import unicodedata
+
+import Dbconn
+from Common import Config
+
+SHINGLE = 3
+BANDS = 4
+BAND_BITS = 64 // BANDS
+
+
+def simhash(content):
+    """64位SimHash，各3-gram按出现次数加权"""
+    text = re.sub(r'\s+', '', unicodedata.normalize('NFKC', content))
+    shingles = [text[i:i + SHINGLE] for i in range(max(len(text) - SHINGLE + 1, 1))]
+    bits = {}
+    for shingle in set(shingles):
+        digest = hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest()
+        bits[shingle] = format(int.from_bytes(digest, 'big'), '064b')
+    # 按位统计为1的次数，超过一半时该位为1
+    half = len(shingles) / 2
+    return int(''.join('1' if column.count('1') > half else '0'
+                       for column in zip(*(bits[shingle] for shingle in shingles))), 2)
+
+
+def bands(value):
+    return [(value >> (BAND_BITS * i)) & ((1 << BAND_BITS) - 1) for i in range(BANDS)]
+
+
+def distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _signed(value):
+    # SQLite整数为有符号64位
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def find(value, exclude=None, max_distance=None):
+    """
+    查找近似重复的已有内容
+    :param value: 待查询文档的SimHash
+    :param exclude: 排除的内容id（文档自身）
+    :return: [(内容id, 内容哈希, 汉明距离)]，按距离从近到远
+    """
+    max_distance = Config.NEAR_DUPLICATE_DISTANCE if max_distance is None else max_distance
+    ret = Dbconn.dbGet(
+        "SELECT content_simhash.canonical_id, content_hash, simhash FROM content_simhash "
+        "JOIN content_store ON content_simhash.canonical_id = content_store.id "
+        "WHERE band0=? OR band1=? OR band2=? OR band3=?", bands(value))
+    matches = [(canonical_id, content_hash, distance(value, _unsigned(other)))
+               for canonical_id, content_hash, other in ret if canonical_id != exclude]
+    return sorted((match for match in matches if match[2] <= max_distance), key=lambda match: match[2])
+
+
+def check(canonical_id, content):
+    """
+    查找与内容近似重复的已有内容，并把内容加入索引
+    :return: 最相近的 (内容id, 内容哈希, 汉明距离)，文本过短或没有近似重复时返回None
+    """
+    if len(content) < Config.NEAR_DUPLICATE_MIN_CHARS:
+        return None
+    value = simhash(content)
+    matches = find(value, exclude=canonical_id)
+    Dbconn.dbSet(
+        "INSERT OR IGNORE INTO content_simhash(canonical_id, simhash, band0, band1, band2, band3) VALUES(?,?,?,?,?,?)",
+        [canonical_id, _signed(value), *bands(value)]
+    )
+    return matches[0] if matches else None
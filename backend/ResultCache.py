@@ -0,0 +1,122 @@
+import json
+import re
+import time
+import unicodedata
+
+import redis
+
+from Common import Config
+from SingleFlight import make_key
+
+
+def normalize(content):
+    """归一化文本：全角转半角并合并空白，仅空白不同的文本共用缓存"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', content)).strip()
+
+
+class ResultCache:
+    """
+    标题/摘要结果缓存
+    以归一化文本的哈希加参数为键保存在Redis中，条目带TTL；
+    按写入时间维护索引和总字节数，超过上限时淘汰最早写入的条目。
+    Redis与Celery共用，不能依赖实例级的maxmemory淘汰策略。
+    """
+
+    def __init__(self, client, prefix='zhiwen:cache:', ttl=None, max_bytes=None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl or Config.RESULT_CACHE_TTL
+        self.max_bytes = max_bytes or Config.RESULT_CACHE_MAX_BYTES
+        self.index_key = prefix + 'index'
+        self.sizes_key = prefix + 'sizes'
+        self.stats_key = prefix + 'stats'
+
+    def key(self, content, **params):
+        return self.prefix + 'entry:' + make_key('result', normalize(content), **params)
+
+    def get(self, key, record=True):
+        """
+        查询缓存并记录命中率，命中时累计节省的处理时间
+        :param record: 为False时不记录，未命中后还要查询其他来源的调用方查询完再调用record
+        :return: 缓存的结果dict，未命中或Redis不可用时返回None
+        """
+        try:
+            raw = self.client.get(key)
+        except redis.exceptions.RedisError:
+            return None
+        value = None if raw is None else json.loads(raw)
+        if record:
+            self.record(value)
+        return value
+
+    def record(self, value):
+        """
+        记录一次查询的结果
+        :param value: 查到的结果dict（需包含生成耗时time_use），未查到时为None
+        """
+        try:
+            if value is None:
+                self.client.hincrby(self.stats_key, 'misses', 1)
+                return
+            self.client.hincrby(self.stats_key, 'hits', 1)
+            self.client.hincrbyfloat(self.stats_key, 'saved_seconds', value.get('time_use') or 0)
+        except redis.exceptions.RedisError:
+            pass
+
+    def set(self, key, value):
+        """写入缓存，value需包含生成耗时time_use"""
+        raw = json.dumps(value, ensure_ascii=False)
+        size = len(raw.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        try:
+            now = time.time()
+            old = self.client.hget(self.sizes_key, key)
+            self.client.set(key, raw, ex=self.ttl)
+            self.client.hset(self.sizes_key, key, size)
+            self.client.zadd(self.index_key, {key: now})
+            self.client.hincrby(self.stats_key, 'bytes', size - int(old or 0))
+            self._evict(now)
+        except redis.exceptions.RedisError:
+            pass
+
+    def _drop(self, key, delete):
+        if isinstance(key, bytes):
+            key = key.decode()
+        # 多个worker同时淘汰时只有移出索引成功的一方扣减字节数
+        if not self.client.zrem(self.index_key, key):
+            return
+        size = self.client.hget(self.sizes_key, key)
+        self.client.hdel(self.sizes_key, key)
+        self.client.hincrby(self.stats_key, 'bytes', -int(size or 0))
+        if delete:
+            self.client.delete(key)
+
+    def _evict(self, now):
+        # 已过期的条目只需移出索引
+        for key in self.client.zrangebyscore(self.index_key, '-inf', now - self.ttl):
+            self._drop(key, delete=False)
+        while int(self.client.hget(self.stats_key, 'bytes') or 0) > self.max_bytes:
+            oldest = self.client.zrange(self.index_key, 0, 0)
+            if not oldest:
+                break
+            self._drop(oldest[0], delete=True)
+
+    def stats(self):
+        """命中率、节省的时间和占用字节数"""
+        try:
+            raw = self.client.hgetall(self.stats_key)
+            entries = self.client.zcard(self.index_key)
+        except redis.exceptions.RedisError:
+            return None
+        values = {(k.decode() if isinstance(k, bytes) else k): float(v) for k, v in raw.items()}
+        hits, misses = int(values.get('hits', 0)), int(values.get('misses', 0))
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'saved_seconds': round(values.get('saved_seconds', 0.0), 1),
+            'entries': entries,
+            'bytes': int(values.get('bytes', 0)),
+            'max_bytes': self.max_bytes,
+        }
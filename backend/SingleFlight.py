@@ -0,0 +1,121 @@
+import hashlib
+import json
+import time
+import uuid
+
+import redis
+
+from Common import Config
+
+
+# 只有锁的值仍是自己的token时才删除，比较和删除在Redis中原子执行；
+# 分开get和delete时，锁恰好在两次调用之间过期并被其他进程抢到，会误删对方的锁
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def release_lock(client, key, token):
+    """释放自己持有的锁，锁已过期或被其他进程持有时不做任何操作"""
+    return client.eval(RELEASE_SCRIPT, 1, key, token)
+
+
+def make_key(kind, content, **params):
+    """根据类型、内容哈希和参数生成合并键"""
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    return f"{kind}:{digest}:{json.dumps(params, sort_keys=True)}"
+
+
+class RedisSingleFlight:
+    """
+    跨Celery worker的相同请求合并
+    第一个请求抢到锁后执行计算并把结果写入本次计算专属的结果槽，
+    其余请求轮询该结果槽；计算结束后锁被释放，不保留结果（不是缓存）。
+    """
+
+    def __init__(self, client, prefix='zhiwen:flight:', lock_ttl=None, result_ttl=None, poll_interval=0.05):
+        self.client = client
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl or Config.SINGLE_FLIGHT_LOCK_TTL
+        self.result_ttl = result_ttl or Config.SINGLE_FLIGHT_RESULT_TTL
+        self.poll_interval = poll_interval
+
+    def do(self, key, fn):
+        """
+        执行fn，若其他worker正在计算相同key则等待其结果
+        :return: fn的返回值（需可JSON序列化）
+        """
+        lock_key = self.prefix + 'lock:' + key
+        deadline = time.time() + self.lock_ttl
+
+        while time.time() < deadline:
+            token = uuid.uuid4().hex
+            try:
+                acquired = self.client.set(lock_key, token, nx=True, ex=self.lock_ttl)
+                if not acquired:
+                    token = self.client.get(lock_key)
+            except redis.exceptions.RedisError:
+                # Redis不可用时退化为直接计算
+                return fn()
+
+            if acquired:
+                return self._lead(lock_key, token, fn)
+            if token is None:
+                # 锁恰好被释放，重新抢锁
+                continue
+
+            if isinstance(token, bytes):
+                token = token.decode()
+            found, value = self._wait(lock_key, token)
+            if found:
+                if 'error' in value:
+                    raise RuntimeError(value['error'])
+                return value['result']
+            # 持锁的worker异常退出，重新抢锁
+
+        return fn()
+
+    def _result_key(self, lock_key, token):
+        return lock_key + ':' + token
+
+    def _lead(self, lock_key, token, fn):
+        result_key = self._result_key(lock_key, token)
+        try:
+            result = fn()
+        except Exception as e:
+            self._publish(result_key, {'error': str(e)})
+            raise
+        else:
+            self._publish(result_key, {'result': result})
+            return result
+        finally:
+            try:
+                release_lock(self.client, lock_key, token)
+            except redis.exceptions.RedisError:
+                pass
+
+    def _publish(self, result_key, value):
+        try:
+            self.client.set(result_key, json.dumps(value, ensure_ascii=False), ex=self.result_ttl)
+        except redis.exceptions.RedisError:
+            pass
+
+    def _wait(self, lock_key, token):
+        result_key = self._result_key(lock_key, token)
+        while True:
+            try:
+                raw = self.client.get(result_key)
+                if raw is not None:
+                    return True, json.loads(raw)
+                if self.client.get(lock_key) is None:
+                    # 锁已释放，再检查一次结果槽，避免错过刚写入的结果
+                    raw = self.client.get(result_key)
+                    if raw is not None:
+                        return True, json.loads(raw)
+                    return False, None
+            except redis.exceptions.RedisError:
+                return False, None
+            time.sleep(self.poll_interval)
@@ -1,19 +1,43 @@
 # coding:utf-8
 
-import json
-import requests
+import time
 from Common import Config
+import GpuClient
 
+# GPU节点按优先级分道调度：单篇交互请求优先于压缩包批量请求
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
 
-def summary(content, max_len=3):
-    # 选择GPU节点逻辑
-    gpu_url = list(Config.GPU_Node.values())[0]
+
+def make_deadline(seconds=None):
+    """生成截止时间（时间戳）"""
+    return time.time() + (seconds or Config.GPU_REQUEST_DEADLINE)
+
+
+def _headers(priority, deadline, allow_partial=False):
+    """
+    构造GPU节点请求头，截止时间以剩余毫秒数传递，GPU节点超时后停止计算；
+    GPU节点收到请求后才开始计时，传给它的截止时间比本地读取超时短Config.GPU_DEADLINE_MARGIN，
+    使节点超时后返回的部分结果或504能在本地超时之前送达
+    :return: (headers, 剩余秒数)
+    """
+    remaining = max(0.0, (deadline or make_deadline()) - time.time())
+    headers = {
+        'X-Priority': priority,
+        'X-Deadline-Ms': str(int(max(0.0, remaining - Config.GPU_DEADLINE_MARGIN) * 1000)),
+    }
+    if allow_partial:
+        headers['X-Allow-Partial'] = '1'
+    return headers, remaining
+
+
+def summary(content, max_len=3, priority=INTERACTIVE, deadline=None):
     req_body = {
         'text': content
     }
 
-    resp = requests.post(url=gpu_url + "/summarize", json=req_body).text
-    resp = json.loads(resp)
+    headers, remaining = _headers(priority, deadline)
+    resp = GpuClient.pool.post("/summarize", req_body, headers=headers, timeout=remaining)
 
     summary_ret = resp['summary']
 
@@ -26,15 +50,17 @@ def summary(content, max_len=3):
     return ret
 
 
-def title(content):
-    # 选择GPU节点逻辑
-    gpu_url = list(Config.GPU_Node.values())[0]
+def title(content, priority=INTERACTIVE, deadline=None, allow_partial=False):
+    """
+    生成标题
+    :return: {'ret0', 'ret1', 'ret2'}，GPU节点超时返回部分解码的标题时另有 'partial': True
+    """
     req_body = {
         'text': content
     }
 
-    resp = requests.post(url=gpu_url + "/title", json=req_body).text
-    resp = json.loads(resp)
+    headers, remaining = _headers(priority, deadline, allow_partial)
+    resp = GpuClient.pool.post("/title", req_body, headers=headers, timeout=remaining)
 
     title_ret = resp['title']
 
@@ -43,7 +69,34 @@ def title(content):
         'ret1': title_ret[1],
         'ret2': title_ret[2]
     }
+    if resp.get('partial'):
+        ret['partial'] = True
+
+    return ret
+
+
+def _rets(values):
+    return {f'ret{i}': values[i] for i in range(3)}
+
+
+def batch(contents, priority=BATCH, deadline=None):
+    """
+    一次请求生成多篇文档的摘要和标题
+    :return: 与contents一一对应的 (摘要dict, 标题dict)，单篇失败时为GpuNodeError
+    """
+    req_body = {
+        'texts': contents
+    }
+
+    headers, remaining = _headers(priority, deadline)
+    resp = GpuClient.pool.post("/batch", req_body, headers=headers, timeout=remaining)
 
+    ret = []
+    for item in resp['results']:
+        try:
+            ret.append((_rets(item['summary']), _rets(item['title'])))
+        except (KeyError, IndexError, TypeError):
+            ret.append(GpuClient.GpuNodeError(item.get('error', "GPU节点返回的结果不完整")))
     return ret
 
 
@@ -8,16 +8,18 @@ import Dbconn
 from Common import Config
 from Auth import Auth
 import BgTasks
+import BatchJob
+import ContentStore
+import Summary
+import GpuClient
 
 import uuid
 import os
-import zipfile
 import functools
 
 import json
 import datetime
 import psutil
-import requests
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
@@ -67,7 +69,35 @@ def get_summary():
     max_len = int(request.form.get('max_len'))
     userInfo = Auth.decode_JWT(request.headers.get('Authorization'))['data']
 
-    return success(body=BgTasks.get_one_summary(content, max_len, user_id=userInfo['id']))
+    # 先插入记录再投递任务，接口立即返回，前端通过/api/summary_status查询结果
+    sid = BgTasks.create_history(content, max_len, user_id=userInfo['id'])
+    try:
+        # 内容已保存到content_store，任务消息中只带内容哈希
+        task = BgTasks.get_one_summary.delay(None, max_len, user_id=userInfo['id'], priority=Summary.INTERACTIVE,
+                                             sid=sid, content_hash=ContentStore.fingerprint(content))
+    except Exception as e:
+        Dbconn.dbSet("UPDATE summary_history SET status=? WHERE id=?", [-1, sid])
+        return error(msg=f"任务提交失败: {str(e)}")
+
+    return success(body={'sid': sid, 'task_id': task.id})
+
+
+# 查询单条摘要的处理状态，立即返回，前端按固定间隔轮询；
+# uwsgi的同步线程很少，服务端等待会让少量轮询的用户占满全部线程
+@app.route('/api/summary_status')
+@loginRequired
+def summary_status():
+    userInfo = Auth.decode_JWT(request.headers.get('Authorization'))['data']
+    sid = request.args.get('sid')
+    ret = Dbconn.dbGet("SELECT status, summary, title, time_use, user_id FROM summary_history WHERE id=?", [sid])
+    if not ret or (ret[0][4] != userInfo['id'] and not userInfo['isAdmin']):
+        return error(msg="记录不存在")
+    status, summary, title, time_use, _ = ret[0]
+
+    body = {'sid': int(sid), 'status': status}
+    if status == 1:
+        body.update({'summary': summary, 'title': title, 'time_use': time_use})
+    return success(body=body)
 
 
 # 上传文件
@@ -120,36 +150,18 @@ def get_file_summary():
         userInfo = Auth.decode_JWT(request.headers.get('Authorization'))['data']
         
         if extName == 'zip':
-            # 处理压缩包
-            dirName = os.path.join(app.config['UPLOAD_FOLDER'], fileName.split('.')[0])
-            if not os.path.exists(dirName):
-                os.makedirs(dirName)
-                
+            # 压缩包在后台任务中直接从归档读取并分批投递，接口立即返回任务id
             zip_path = os.path.join(app.config['UPLOAD_FOLDER'], fileName)
-            print(f"处理压缩包: {zip_path}")
-            
-            # 解压文件
-            zFile = zipfile.ZipFile(zip_path, "r")
-            zFile.extractall(dirName)
-            zFile.close()
-            
-            # 递归处理目录中的所有文件
-            processed_count = 0
-            for root, dirs, files in os.walk(dirName):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    # 只处理txt和docx文件
-                    if file.endswith('.txt') or file.endswith('.docx'):
-                        print(f"处理文件: {file_path}")
-                        try:
-                            BgTasks.get_file_summary(file_path, user_id=userInfo['id'])
-                            processed_count += 1
-                        except Exception as e:
-                            print(f"处理文件失败: {file_path}, 错误: {str(e)}")
-            
-            if processed_count == 0:
-                return error(msg="压缩包中没有找到可处理的文本文件")
-                
+            if not os.path.exists(zip_path):
+                return error(msg="文件不存在")
+            job_id = BatchJob.create(userInfo['id'], fileName)
+            try:
+                task = BgTasks.ingest_zip.delay(zip_path, user_id=userInfo['id'], job_id=job_id)
+            except Exception as e:
+                BatchJob.seal(job_id, error=f"任务提交失败: {str(e)}")
+                return error(msg=f"任务提交失败: {str(e)}")
+            return success(msg="已添加到后台处理，可在下方查看进度", body={'job_id': job_id, 'task_id': task.id})
+
         elif extName == 'txt' or extName == 'docx':
             # 处理单个txt文件
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], fileName)
@@ -165,6 +177,24 @@ def get_file_summary():
         return error(msg=f"处理文件时出错: {str(e)}")
 
 
+# 查询批量任务进度，只读取batch_job中的计数
+@app.route('/api/batch_job')
+@loginRequired
+def batch_job():
+    userInfo = Auth.decode_JWT(request.headers.get('Authorization'))['data']
+    job = BatchJob.progress(request.args.get('job_id'))
+    if job is None or (job['user_id'] != userInfo['id'] and not userInfo['isAdmin']):
+        return error(msg="任务不存在")
+    return success(body=job)
+
+
+# 查询各用户批量任务的排队情况
+@app.route('/api/task_queues')
+@adminRequired
+def task_queues():
+    return success(body=BgTasks.fair.stats())
+
+
 # 获取历史处理记录
 @app.route('/api/get_history')
 def get_history():
@@ -213,7 +243,13 @@ def download():
 @app.route('/api/get_detail')
 def get_detail():
     id = request.args.get('id')
-    ret = Dbconn.dbGet("SELECT * FROM summary_history WHERE id=?", [id])
+    ret = Dbconn.dbGet(
+        f"""
+        SELECT summary_history.id, status, {ContentStore.CONTENTS}, summary, title, time_use, file_name, words_limit,
+               summary_history.create_datetime, titleChoice, summaryChoice, user_id, isVerify
+        FROM summary_history {ContentStore.JOIN}
+        WHERE summary_history.id=?
+        """, [id])
 
     # 处理summary和title的dict问题
     ret = [list(ret[0])]
@@ -225,6 +261,31 @@ def get_detail():
     )
 
 
+# 获取与指定记录近似重复的已有内容的生成结果
+@app.route('/api/near_duplicate')
+def near_duplicate():
+    id = request.args.get('id')
+    ret = Dbconn.dbGet(
+        """
+        SELECT near_id, near_distance, content_result.words_limit, content_result.summary, content_result.title
+        FROM summary_history
+        JOIN content_store ON summary_history.near_id = content_store.id
+        JOIN content_result ON content_store.content_hash = content_result.content_hash
+        WHERE summary_history.id=?
+        """, [id])
+    if not ret:
+        return success(body=None)
+
+    return success(
+        body={
+            'near_id': ret[0][0],
+            'distance': ret[0][1],
+            'results': [{'max_len': max_len, 'summary': json.loads(summary), 'title': json.loads(title)}
+                        for _, _, max_len, summary, title in ret],
+        }
+    )
+
+
 # 获取指定记录词云
 @app.route('/api/get_cloud')
 def get_cloud():
@@ -232,13 +293,17 @@ def get_cloud():
 
     if id == '0':
         # id为0表示查询近10条
-        ret = Dbconn.dbGet("SELECT contents FROM summary_history WHERE 1=1 ORDER BY id DESC LIMIT 10 ", [])
+        ret = Dbconn.dbGet(
+            f"SELECT {ContentStore.CONTENTS} FROM summary_history {ContentStore.JOIN} "
+            f"WHERE 1=1 ORDER BY summary_history.id DESC LIMIT 10 ", [])
         contents = ""
         for it in ret:
-            contents += it[0]
+            contents += it[0] or ""
 
     else:
-        ret = Dbconn.dbGet("SELECT contents FROM summary_history WHERE id=?", [id])
+        ret = Dbconn.dbGet(
+            f"SELECT {ContentStore.CONTENTS} FROM summary_history {ContentStore.JOIN} WHERE summary_history.id=?",
+            [id])
         contents = ret[0][0]
 
     return success(
@@ -406,6 +471,10 @@ def admin_reject():
         return success()
 
 
+# 统计状态中公开的GPU节点字段
+GPU_NODE_PUBLIC_FIELDS = ('name', 'outstanding', 'utilization', 'available', 'breaker', 'loaded')
+
+
 # 获取统计状态
 @app.route('/api/status')
 def status():
@@ -416,26 +485,32 @@ def status():
     today_unverify = Dbconn.dbGet(
         f"SELECT COUNT(*) FROM summary_history WHERE isVerify=0", [])[0][0]
 
-    # 向GPU节点发送请求，获取GPU使用情况
-    gpu_url = list(Config.GPU_Node.values())[0]  # 获取GPU节点URL
-    print(gpu_url)
-    try:
-        response = requests.get(f"{gpu_url}/nvidia_info")
-        gpu_info = response.json()  # 解析返回的JSON数据
-        gpu_usage_percent = gpu_info['gpus'][0]['gpu_usage_percent']  # 提取GPU计算核心使用率
-    except requests.exceptions.RequestException as e:
-        gpu_usage_percent = "Error"  # 如果请求出错，设置为Error
-    
+    # 向各GPU节点发送请求，获取GPU使用情况；只读取，不影响熔断和负载均衡
+    gpu_usage = []
+    for gpu_info in GpuClient.pool.device_info().values():
+        try:
+            gpu_usage.append(gpu_info['gpus'][0]['gpu_usage_percent'])  # 提取GPU计算核心使用率
+        except (TypeError, KeyError, IndexError):
+            pass
+    # 所有节点都无法获取时设置为Error
+    gpu_usage_percent = round(sum(gpu_usage) / len(gpu_usage), 1) if gpu_usage else "Error"
+
     info = {
         'cpu': str(psutil.cpu_percent(1)),
         'mem': str(psutil.virtual_memory().percent),
         'today_sum': today_sum,
         'today_unverify': today_unverify,
-        'gpu_usage_percent': str(gpu_usage_percent)  # 添加GPU使用率
+        'gpu_usage_percent': str(gpu_usage_percent),  # 添加GPU使用率
+        # 接口不需要登录，不返回节点地址和错误信息
+        'gpu_nodes': [{key: node[key] for key in GPU_NODE_PUBLIC_FIELDS if key in node}
+                      for node in GpuClient.pool.stats()],
+        'result_cache': BgTasks.cache.stats()  # 结果缓存命中率和节省的处理时间
     }
 
     return success(body=info)
 
 
 if __name__ == '__main__':
+    # 创建新增的表和列；uwsgi部署时由wsgi.py执行
+    Dbconn.init()
     app.run(debug=Config.APP_DEBUG, host=Config.APP_HOST, port=Config.APP_PORT)
@@ -3,6 +3,7 @@ import json
 from unittest.mock import patch, MagicMock
 from flask import url_for
 from Auth import Auth
+import ContentStore
 
 
 class TestAppRoutes:
@@ -169,4 +170,178 @@ class TestAppRoutes:
 
             data = json.loads(response.data)
             assert data['code'] == -1  # 假设管理员权限错误码为-1
-            assert '无权限' in data['msg']
\ No newline at end of file
+            assert '无权限' in data['msg']
+
+class TestAsyncSummary:
+    """测试异步单条摘要接口"""
+
+    USER = {'data': {'id': 7, 'isAdmin': False, 'username': 'test_user'}}
+
+    @patch('Auth.Auth.decode_JWT')
+    @patch('BgTasks.get_one_summary.delay')
+    @patch('BgTasks.create_history')
+    def test_get_summary_enqueues_task(self, mock_create, mock_delay, mock_decode_jwt, client):
+        """测试提交后立即返回记录id和任务id"""
+        mock_decode_jwt.return_value = self.USER
+        mock_create.return_value = 42
+        mock_delay.return_value = MagicMock(id='task-1')
+
+        response = client.post('/api/get_summary', data={'content': '测试内容', 'max_len': '3'},
+                               headers={'Authorization': 'token'})
+
+        data = json.loads(response.data)
+        assert data['code'] == 0
+        assert data['body'] == {'sid': 42, 'task_id': 'task-1'}
+        mock_create.assert_called_once_with('测试内容', 3, user_id=7)
+        assert mock_delay.call_args.kwargs['sid'] == 42
+        # 任务消息中只带内容哈希
+        assert mock_delay.call_args[0][0] is None
+        assert mock_delay.call_args.kwargs['content_hash'] == ContentStore.fingerprint('测试内容')
+
+    @patch('Auth.Auth.decode_JWT')
+    @patch('Dbconn.dbSet')
+    @patch('BgTasks.get_one_summary.delay')
+    @patch('BgTasks.create_history')
+    def test_get_summary_broker_down(self, mock_create, mock_delay, mock_dbset, mock_decode_jwt, client):
+        """测试任务投递失败时记录标记为出错"""
+        mock_decode_jwt.return_value = self.USER
+        mock_create.return_value = 42
+        mock_delay.side_effect = ConnectionError("broker down")
+
+        response = client.post('/api/get_summary', data={'content': '测试内容', 'max_len': '3'},
+                               headers={'Authorization': 'token'})
+
+        assert json.loads(response.data)['code'] == -1
+        mock_dbset.assert_called_once_with("UPDATE summary_history SET status=? WHERE id=?", [-1, 42])
+
+    @patch('Auth.Auth.decode_JWT')
+    @patch('Dbconn.dbGet')
+    def test_status_done(self, mock_dbget, mock_decode_jwt, client):
+        """测试处理完成后返回结果"""
+        mock_decode_jwt.return_value = self.USER
+        mock_dbget.return_value = [(1, '{"ret0": "摘要"}', '{"ret0": "标题"}', 1.5, 7)]
+
+        response = client.get('/api/summary_status?sid=42', headers={'Authorization': 'token'})
+
+        body = json.loads(response.data)['body']
+        assert body == {'sid': 42, 'status': 1, 'summary': '{"ret0": "摘要"}', 'title': '{"ret0": "标题"}',
+                        'time_use': 1.5}
+
+    @patch('Auth.Auth.decode_JWT')
+    @patch('Dbconn.dbGet')
+    def test_status_does_not_wait(self, mock_dbget, mock_decode_jwt, client):
+        """测试处理中时立即返回，不在服务端等待（旧前端传入的wait参数被忽略）"""
+        mock_decode_jwt.return_value = self.USER
+        mock_dbget.return_value = [(0, None, None, None, 7)]
+
+        response = client.get('/api/summary_status?sid=42&wait=5', headers={'Authorization': 'token'})
+
+        assert json.loads(response.data)['body'] == {'sid': 42, 'status': 0}
+        assert mock_dbget.call_count == 1
+
+    @patch('Auth.Auth.decode_JWT')
+    @patch('Dbconn.dbGet')
+    def test_status_owner_only(self, mock_dbget, mock_decode_jwt, client):
+        """测试只有记录所有者和管理员可以查询"""
+        mock_dbget.return_value = [(1, '{"ret0": "摘要"}', '{"ret0": "标题"}', 1.5, 8)]
+
+        mock_decode_jwt.return_value = self.USER
+        response = client.get('/api/summary_status?sid=42', headers={'Authorization': 'token'})
+        assert json.loads(response.data) == {'code': -1, 'msg': "记录不存在", 'body': None}
+
+        mock_decode_jwt.return_value = {'data': {'id': 1, 'isAdmin': True}}
+        response = client.get('/api/summary_status?sid=42', headers={'Authorization': 'token'})
+        assert json.loads(response.data)['body']['status'] == 1
+
+
+class TestBatchJobRoute:
+    """测试批量任务进度接口"""
+
+    JOB = {'job_id': 5, 'user_id': 7, 'state': 'running', 'total': 10, 'done': 4}
+
+    @patch('Auth.Auth.decode_JWT')
+    @patch('BatchJob.progress')
+    def test_owner_can_view(self, mock_progress, mock_decode_jwt, client):
+        """测试任务所有者查询进度"""
+        mock_decode_jwt.return_value = {'data': {'id': 7, 'isAdmin': False}}
+        mock_progress.return_value = self.JOB
+
+        response = client.get('/api/batch_job?job_id=5', headers={'Authorization': 'token'})
+
+        assert json.loads(response.data)['body'] == self.JOB
+        mock_progress.assert_called_once_with('5')
+
+    @patch('Auth.Auth.decode_JWT')
+    @patch('BatchJob.progress')
+    def test_other_user_cannot_view(self, mock_progress, mock_decode_jwt, client):
+        """测试其他普通用户不能查询"""
+        mock_decode_jwt.return_value = {'data': {'id': 8, 'isAdmin': False}}
+        mock_progress.return_value = self.JOB
+
+        response = client.get('/api/batch_job?job_id=5', headers={'Authorization': 'token'})
+
+        assert json.loads(response.data)['code'] == -1
+
+    @patch('Auth.Auth.decode_JWT')
+    @patch('BgTasks.ingest_zip.delay')
+    @patch('BatchJob.create')
+    def test_zip_upload_creates_job(self, mock_create, mock_delay, mock_decode_jwt, client, tmp_path):
+        """测试上传压缩包时创建批量任务并返回任务id"""
+        mock_decode_jwt.return_value = {'data': {'id': 7, 'isAdmin': False}}
+        mock_create.return_value = 5
+        mock_delay.return_value = MagicMock(id='task-1')
+
+        with patch.dict(client.application.config, {'UPLOAD_FOLDER': str(tmp_path)}):
+            (tmp_path / 'docs.zip').write_bytes(b'')
+            response = client.get('/api/get_file_summary?filename=docs.zip', headers={'Authorization': 'token'})
+
+        assert json.loads(response.data)['body'] == {'job_id': 5, 'task_id': 'task-1'}
+        mock_create.assert_called_once_with(7, 'docs.zip')
+        assert mock_delay.call_args.kwargs == {'user_id': 7, 'job_id': 5}
+
+
+class TestTaskQueuesRoute:
+    """测试批量任务排队情况接口"""
+
+    @patch('Auth.Auth.decode_JWT')
+    def test_admin_can_view(self, mock_decode_jwt, client):
+        """测试管理员查看各用户排队的批次数"""
+        mock_decode_jwt.return_value = {'data': {'id': 1, 'isAdmin': True}}
+        stats = {'inflight': 1, 'max_inflight': 8, 'users': [{'user_id': 7, 'queued': 3, 'running': 1, 'cap': 2}]}
+
+        with patch('BgTasks.fair.stats', return_value=stats):
+            response = client.get('/api/task_queues', headers={'Authorization': 'token'})
+
+        assert json.loads(response.data)['body'] == stats
+
+    @patch('Auth.Auth.decode_JWT')
+    def test_user_cannot_view(self, mock_decode_jwt, client):
+        """测试普通用户无权限"""
+        mock_decode_jwt.return_value = {'data': {'id': 7, 'isAdmin': False}}
+
+        response = client.get('/api/task_queues', headers={'Authorization': 'token'})
+
+        assert json.loads(response.data)['code'] == -1
+
+
+class TestStatusRoute:
+    """测试统计状态接口"""
+
+    @patch('psutil.cpu_percent', return_value=10.0)
+    @patch('Dbconn.dbGet', return_value=[(0,)])
+    def test_status_hides_node_details(self, mock_dbget, mock_cpu, client):
+        """测试不返回GPU节点地址和错误信息，也不触发健康检查"""
+        pool = MagicMock()
+        pool.device_info.return_value = {'GPU1': {'gpus': [{'gpu_usage_percent': 40.0}]}, 'GPU2': None}
+        pool.stats.return_value = [{'name': 'GPU1', 'url': 'http://10.0.0.1:3000', 'outstanding': 1,
+                                    'utilization': 40.0, 'available': True, 'breaker': 'closed',
+                                    'last_error': 'connect to 10.0.0.1 failed'}]
+
+        with patch('GpuClient.pool', pool), patch('BgTasks.cache.stats', return_value={}):
+            response = client.get('/api/status')
+
+        body = json.loads(response.data)['body']
+        assert body['gpu_usage_percent'] == '40.0'
+        assert body['gpu_nodes'] == [{'name': 'GPU1', 'outstanding': 1, 'utilization': 40.0, 'available': True,
+                                      'breaker': 'closed'}]
+        pool.check_health.assert_not_called()
@@ -0,0 +1,209 @@
+"""
+测试Autoscaler模块
+"""
+import pytest
+import requests_mock
+from unittest.mock import patch
+
+from Autoscaler import Autoscaler, BrokerProbe, GpuProbe, GROW, HOLD, SHRINK
+from FairQueue import FairQueue
+from tests.test_helper import FakeRedis
+
+NODES = {'GPU1': 'http://gpu-a:3000', 'GPU2': 'http://gpu-b:3000'}
+
+
+class FakePool:
+    """模拟的worker进程池"""
+
+    def __init__(self, concurrency, workers=1):
+        self.size = concurrency
+        self.workers = workers
+        self.resizes = []
+
+    def concurrency(self):
+        return self.size
+
+    def resize(self, delta):
+        self.resizes.append(delta)
+        self.size += delta
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def lane_stats(queued, latency_ms):
+    return {'policy': 'weighted', 'lanes': {
+        'interactive': {'queued': 0, 'completed': 10, 'wait_p50_ms': 1.0, 'wait_p95_ms': 2.0,
+                        'latency_p50_ms': 100.0, 'latency_p95_ms': 200.0},
+        'batch': {'queued': queued, 'completed': 10, 'wait_p50_ms': 1.0, 'wait_p95_ms': 2.0,
+                  'latency_p50_ms': latency_ms / 2, 'latency_p95_ms': latency_ms},
+    }}
+
+
+def nvidia_info(usage):
+    return {'gpus': [{'gpu_usage_percent': 0.0}], 'window': {'gpu_usage_percent': [usage, usage]}}
+
+
+def idle_gpu():
+    return {'gpu_queued': 0, 'utilization': 50.0, 'latency_ms': 1000.0}
+
+
+class TestAutoscaler:
+    """测试按队列深度调整进程池"""
+
+    @pytest.fixture
+    def clock(self):
+        return Clock()
+
+    def make(self, pool, broker, gpu, clock, fair=None):
+        return Autoscaler(pool, broker, gpu, min_concurrency=2, max_concurrency=8, step=2,
+                          grow_samples=2, shrink_samples=3, cooldown=30, fair=fair, clock=clock)
+
+    def test_probes(self):
+        """测试从模拟的broker和GPU节点采样，不可达的节点不计入"""
+        client = FakeRedis()
+        for i in range(5):
+            client.rpush('celery', f"task{i}")
+        assert BrokerProbe(client, queues=('celery', 'other'))() == 5
+
+        probe = GpuProbe(NODES, timeout=1)
+        with requests_mock.Mocker() as m:
+            m.get('http://gpu-a:3000/lane_stats', json=lane_stats(3, 4000.0))
+            m.get('http://gpu-a:3000/nvidia_info', json=nvidia_info(80.0))
+            m.get('http://gpu-b:3000/lane_stats', json=lane_stats(5, 6000.0))
+            m.get('http://gpu-b:3000/nvidia_info', json=nvidia_info(40.0))
+            assert probe() == {'gpu_queued': 8, 'utilization': 60.0, 'latency_ms': 6000.0}
+
+            m.get('http://gpu-b:3000/lane_stats', status_code=503)
+            assert probe() == {'gpu_queued': 3, 'utilization': 80.0, 'latency_ms': 4000.0}
+
+            m.get('http://gpu-a:3000/lane_stats', status_code=503)
+            assert probe() is None
+
+    def test_fair_queue_backlog(self, clock):
+        """测试公平调度子队列中的批次计入积压，扩容后合计投递上限随所有worker的进程数提高"""
+        client = FakeRedis()
+        sent = []
+        fair = FairQueue(client, lambda user_id, payload, slot: sent.append(slot), user_cap=100, max_inflight=8)
+        for n in range(40):
+            fair.push(n % 2, {'n': n})
+        # Celery中只有8个批次，其余在子队列中
+        assert len(sent) == 8 and client.llen('celery') == 0
+        assert BrokerProbe(client, fair=fair)() == 32
+
+        pool = FakePool(4, workers=3)
+        scaler = self.make(pool, BrokerProbe(client, fair=fair), idle_gpu, clock, fair=fair)
+        scaler.tick()
+        assert fair.inflight_limit() == 12 and len(sent) == 12
+        scaler.tick()
+        assert pool.size == 6
+        assert fair.inflight_limit() == 18 and len(sent) == 18
+
+    def test_run_survives_errors(self, clock):
+        """测试Celery远程控制等任何异常都不会结束调整循环"""
+        pool = FakePool(4)
+        calls = []
+
+        def concurrency():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("inspect failed")
+            if len(calls) == 3:
+                raise StopIteration
+            return 4
+
+        pool.concurrency = concurrency
+        scaler = self.make(pool, lambda: 0, idle_gpu, clock)
+        with patch('Autoscaler.time.sleep', side_effect=[None, None, KeyboardInterrupt]):
+            with pytest.raises(KeyboardInterrupt):
+                scaler.run(interval=1)
+        assert len(calls) == 3
+
+    def test_decide(self, clock):
+        """测试扩容和缩容条件"""
+        scaler = self.make(FakePool(4), None, None, clock)
+        scaler.concurrency = 4
+        assert scaler.decide(20, 0, 50.0, 1000.0) == GROW
+        # GPU已满载，积压也不扩容
+        assert scaler.decide(20, 0, 95.0, 1000.0) == HOLD
+        # GPU节点排队过多或延迟过高时缩容
+        assert scaler.decide(20, 100, 50.0, 1000.0) == SHRINK
+        assert scaler.decide(20, 0, 50.0, 60000.0) == SHRINK
+        assert scaler.decide(0, 0, 10.0, 1000.0) == SHRINK
+        # 少量积压或GPU仍在工作时保持不变
+        assert scaler.decide(5, 0, 50.0, 1000.0) == HOLD
+        assert scaler.decide(0, 0, 50.0, 1000.0) == HOLD
+
+    def test_grow_needs_consecutive_samples(self, clock):
+        """测试连续多次采样需要扩容才扩容，且不超过上限"""
+        client = FakeRedis()
+        for i in range(30):
+            client.rpush('celery', f"task{i}")
+        pool = FakePool(4)
+        scaler = self.make(pool, BrokerProbe(client), idle_gpu, clock)
+
+        scaler.tick()
+        assert pool.resizes == []
+        scaler.tick()
+        assert pool.size == 6
+
+        # 冷却期内不再调整
+        for _ in range(3):
+            scaler.tick()
+        assert pool.size == 6
+
+        for _ in range(10):
+            clock.now += 31
+            scaler.tick()
+            scaler.tick()
+        assert pool.size == 8
+
+    def test_no_flapping(self, clock):
+        """测试采样结果交替变化时不调整"""
+        pool = FakePool(4)
+        samples = iter([30, 0] * 10)
+        gpu = iter([idle_gpu(), {'gpu_queued': 0, 'utilization': 10.0, 'latency_ms': 1000.0}] * 10)
+        scaler = self.make(pool, lambda: next(samples), lambda: next(gpu), clock)
+
+        for _ in range(20):
+            clock.now += 31
+            scaler.tick()
+
+        assert pool.resizes == []
+
+    def test_gpu_unavailable_holds(self, clock):
+        """测试GPU节点状态未知时不调整，进程池超出上下限时调整回范围内"""
+        pool = FakePool(4)
+        scaler = self.make(pool, lambda: 100, lambda: None, clock)
+        for _ in range(5):
+            scaler.tick()
+        assert pool.resizes == []
+
+        pool.size = 1
+        scaler.tick()
+        assert pool.size == 2
+
+    def test_converges_on_simulated_gpu(self, clock):
+        """
+        测试闭环模拟：GPU节点每次只能同时处理6个请求，多出的请求在GPU节点排队并推高延迟；
+        Celery积压不变时进程池应收敛到GPU节点容量附近，不在上下限之间反复调整
+        """
+        pool = FakePool(2)
+
+        def gpu():
+            queued = max(0, pool.size - 6) * 40
+            return {'gpu_queued': queued, 'utilization': min(100.0, pool.size / 6 * 80),
+                    'latency_ms': 5000.0 + queued * 500}
+
+        scaler = self.make(pool, lambda: 100, gpu, clock)
+        for _ in range(100):
+            clock.now += 10
+            scaler.tick()
+
+        assert 6 <= pool.size <= 8
+        assert len(pool.resizes) <= 8
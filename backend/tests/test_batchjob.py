@@ -0,0 +1,111 @@
+"""
+测试BatchJob模块
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+
+import pytest
+from unittest.mock import patch
+
+import BatchJob
+import Dbconn
+
+
+@pytest.fixture
+def job_db():
+    """包含summary_history表并执行过迁移的临时数据库"""
+    db_fd, db_path = tempfile.mkstemp()
+    original_db = Dbconn.DATABASE
+    Dbconn.DATABASE = db_path
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE summary_history (id integer primary key autoincrement, status integer, contents text)")
+    conn.commit()
+    conn.close()
+    Dbconn.init()
+
+    yield db_path
+
+    os.close(db_fd)
+    os.unlink(db_path)
+    Dbconn.DATABASE = original_db
+
+
+class TestBatchJob:
+    """测试批量任务进度计数"""
+
+    def test_lifecycle(self, job_db):
+        """测试投递、处理、重试到完成的计数变化"""
+        with patch('BatchJob.time.time', return_value=1000.0):
+            job_id = BatchJob.create(3, "docs.zip")
+            BatchJob.advance(job_id, queued=4)
+            assert BatchJob.progress(job_id)['state'] == 'ingesting'
+            BatchJob.seal(job_id)
+            assert BatchJob.progress(job_id)['state'] == 'queued'
+
+        with patch('BatchJob.time.time', return_value=1010.0):
+            BatchJob.advance(job_id, queued=-4, running=4)
+        with patch('BatchJob.time.time', return_value=1020.0):
+            # 一批完成3篇，1篇重新排队单独重试
+            BatchJob.advance(job_id, running=-4, done=3, queued=1)
+            job = BatchJob.progress(job_id)
+
+        assert job['state'] == 'running'
+        assert (job['total'], job['queued'], job['running'], job['done'], job['failed']) == (4, 1, 0, 3, 0)
+        assert job['throughput'] == 0.3
+        assert job['eta'] == pytest.approx(3.3, abs=0.1)
+
+        with patch('BatchJob.time.time', return_value=1030.0):
+            BatchJob.advance(job_id, queued=-1, running=1)
+            BatchJob.advance(job_id, running=-1, failed=1)
+        with patch('BatchJob.time.time', return_value=2000.0):
+            job = BatchJob.progress(job_id)
+
+        assert job['state'] == 'finished'
+        assert job['elapsed'] == 20.0 and job['eta'] is None
+        assert (job['done'], job['failed']) == (3, 1)
+
+    def test_seal_after_all_done(self, job_db):
+        """测试文档在压缩包读取结束前已全部完成时，标记投递结束即完成"""
+        job_id = BatchJob.create(3, "docs.zip")
+        BatchJob.advance(job_id, queued=1)
+        BatchJob.advance(job_id, queued=-1, running=1)
+        BatchJob.advance(job_id, running=-1, done=1)
+        assert BatchJob.progress(job_id)['state'] == 'ingesting'
+
+        BatchJob.seal(job_id)
+        assert BatchJob.progress(job_id)['state'] == 'finished'
+
+    def test_seal_with_error(self, job_db):
+        """测试读取压缩包失败"""
+        job_id = BatchJob.create(3, "bad.zip")
+        BatchJob.seal(job_id, error="压缩包格式错误")
+
+        job = BatchJob.progress(job_id)
+        assert job['state'] == 'error' and job['total'] == 0
+
+    def test_concurrent_updates(self, job_db):
+        """测试多个线程同时更新计数不丢失"""
+        job_id = BatchJob.create(3, "docs.zip")
+        BatchJob.advance(job_id, queued=40)
+
+        def worker():
+            for _ in range(10):
+                BatchJob.advance(job_id, queued=-1, running=1)
+                BatchJob.advance(job_id, running=-1, done=1)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        job = BatchJob.progress(job_id)
+        assert (job['queued'], job['running'], job['done']) == (0, 0, 40)
+
+    def test_missing_job(self, job_db):
+        """测试任务不存在和不属于批量任务的文档"""
+        assert BatchJob.progress(999) is None
+        BatchJob.advance(None, done=1)
+        BatchJob.seal(None)
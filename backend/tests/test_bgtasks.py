@@ -5,11 +5,52 @@ import pytest
 from unittest.mock import patch, MagicMock, call
 from datetime import datetime
 import BgTasks
+import ContentStore
+import Dbconn
+import io
 import json
+import sqlite3
+import time
+import zipfile
+
+from docx import Document
+from Common import Config
+from FairQueue import FairQueue
+from ResultCache import ResultCache
+from SingleFlight import RedisSingleFlight
+from tests.test_helper import FakeRedis
+
+ARTICLE = ("国务院办公厅近日印发关于进一步优化营商环境降低市场主体制度性交易成本的意见。"
+           "意见提出，要进一步破除隐性门槛，推动降低市场主体准入成本。"
+           "全面实施市场准入负面清单管理，健全市场准入负面清单动态调整机制。"
+           "优化经营主体登记注册服务，推进企业开办全程网上办理。"
+           "规范涉企收费，推动减轻市场主体经营负担。各地区各部门要抓好贯彻落实，确保各项措施落地见效。")
+
 
 class TestBgTasks:
     """测试后台任务处理"""
 
+    @pytest.fixture(autouse=True)
+    def cache(self, monkeypatch):
+        """每个测试使用独立的内存结果缓存"""
+        monkeypatch.setattr('BgTasks.cache', ResultCache(FakeRedis()))
+        monkeypatch.setattr('BgTasks.fair', FairQueue(FakeRedis(), BgTasks._send_batch, user_cap=100,
+                                                      max_inflight=100))
+
+    @pytest.fixture(autouse=True)
+    def database(self, monkeypatch, tmp_path_factory):
+        """每个测试使用独立的临时数据库，保存去重后的内容和结果"""
+        db_path = str(tmp_path_factory.mktemp("db") / "test.sqlite")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE summary_history (id integer primary key autoincrement, status integer, "
+                     "contents text, summary text, title text, time_use text, file_name text, words_limit integer, "
+                     "create_datetime text, user_id integer)")
+        conn.commit()
+        conn.close()
+        monkeypatch.setattr('Dbconn.DATABASE', db_path)
+        Dbconn.init()
+
+    @patch('BgTasks.flight', RedisSingleFlight(FakeRedis()))
     @patch('BgTasks.Dbconn.dbSet')
     @patch('BgTasks.Summary.title')
     @patch('BgTasks.Summary.summary')
@@ -31,15 +72,488 @@ class TestBgTasks:
 
         insert_args = mock_dbset.call_args_list[0][0]
         assert "INSERT INTO summary_history" in insert_args[0]
-        assert insert_args[1] == [0, content, max_len, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), filename, user_id]
+        canonical_id, content_hash = ContentStore.store(content)
+        assert insert_args[1] == [0, None, max_len, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), filename, user_id,
+                                  content_hash, canonical_id, None, None,
+                                  pytest.approx(time.time() + Config.TASK_QUEUE_LEASE, abs=5)]
 
         update_args = mock_dbset.call_args_list[1][0]
         assert "UPDATE summary_history" in update_args[0]
         expected_summary = json.dumps(mock_summary.return_value, ensure_ascii=False)
         expected_title = json.dumps(mock_title.return_value, ensure_ascii=False)
-        assert update_args[1] == [expected_title, expected_summary, pytest.approx(0.0, abs=1e-3), 1]
+        assert update_args[1] == [expected_title, expected_summary, pytest.approx(0.0, abs=0.05), 1]
 
         # 验证返回结果
         assert json.loads(result["summary"]) == mock_summary.return_value
         assert json.loads(result["title"]) == mock_title.return_value
         assert result["sid"] == 1
+
+    @patch('BgTasks.flight', RedisSingleFlight(FakeRedis()))
+    @patch('BgTasks.Dbconn.dbSet')
+    @patch('BgTasks.Summary.title')
+    @patch('BgTasks.Summary.summary')
+    def test_get_one_summary_parallel(self, mock_summary, mock_title, mock_dbset):
+        """测试摘要和标题并行请求，并记录各自耗时"""
+        mock_dbset.return_value = 1
+
+        def slow(value):
+            def call(*args, **kwargs):
+                time.sleep(0.3)
+                return value
+            return call
+
+        mock_summary.side_effect = slow({'ret0': "摘要"})
+        mock_title.side_effect = slow({'ret0': "标题"})
+
+        start = time.perf_counter()
+        result = BgTasks.get_one_summary("并行内容", 100)
+
+        assert time.perf_counter() - start < 0.55
+        assert result["timings"]["summary"] >= 0.3
+        assert result["timings"]["title"] >= 0.3
+
+    @patch('BgTasks.flight', RedisSingleFlight(FakeRedis()))
+    @patch('BgTasks.Dbconn.dbSet')
+    @patch('BgTasks.Summary.title')
+    @patch('BgTasks.Summary.summary')
+    def test_title_failure_keeps_summary(self, mock_summary, mock_title, mock_dbset):
+        """测试标题失败时保留摘要"""
+        mock_dbset.return_value = 1
+        mock_summary.return_value = {'ret0': "摘要"}
+        mock_title.side_effect = Exception("GPU节点返回错误: 500")
+
+        result = BgTasks.get_one_summary("标题失败内容", 100)
+
+        assert json.loads(result["summary"]) == {'ret0': "摘要"}
+        assert json.loads(result["title"]) == BgTasks.TITLE_FALLBACK
+        update_args = mock_dbset.call_args_list[1][0]
+        assert update_args[1][-1] == 1
+
+    @patch('BgTasks.flight', RedisSingleFlight(FakeRedis()))
+    @patch('BgTasks.Dbconn.dbSet')
+    @patch('BgTasks.Summary.title')
+    @patch('BgTasks.Summary.summary')
+    def test_summary_failure_marks_row_failed(self, mock_summary, mock_title, mock_dbset):
+        """测试摘要失败时记录处理出错"""
+        mock_dbset.return_value = 1
+        mock_summary.side_effect = Exception("GPU节点返回错误: 500")
+        mock_title.return_value = {'ret0': "标题"}
+
+        result = BgTasks.get_one_summary("摘要失败内容", 100)
+
+        assert result["title"] == "错误"
+        assert mock_dbset.call_args_list[1][0][1] == [-1, 1]
+
+    @patch('BgTasks.flight', RedisSingleFlight(FakeRedis()))
+    @patch('BgTasks.Dbconn.dbSet')
+    @patch('BgTasks.Summary.title')
+    @patch('BgTasks.Summary.summary')
+    def test_cache_hit_skips_gpu(self, mock_summary, mock_title, mock_dbset):
+        """测试相同文本命中缓存时不再请求GPU节点，但仍写入处理记录"""
+        mock_dbset.side_effect = [1, None, 2, None]
+        mock_summary.return_value = {'ret0': "摘要"}
+        mock_title.return_value = {'ret0': "标题"}
+
+        first = BgTasks.get_one_summary("缓存内容", 100, user_id=1)
+        second = BgTasks.get_one_summary("  缓存内容\n", 100, user_id=2)
+
+        assert mock_summary.call_count == 1 and mock_title.call_count == 1
+        assert not first["cached"] and second["cached"]
+        assert second["sid"] == 2
+        assert second["summary"] == first["summary"] and second["title"] == first["title"]
+        assert mock_dbset.call_args_list[3][0][1][:2] == [first["title"], first["summary"]]
+        assert BgTasks.cache.stats()['hits'] == 1
+
+    @patch('BgTasks.flight', RedisSingleFlight(FakeRedis()))
+    @patch('BgTasks.Dbconn.dbSet')
+    @patch('BgTasks.Summary.title')
+    @patch('BgTasks.Summary.summary')
+    def test_fallback_title_not_cached(self, mock_summary, mock_title, mock_dbset):
+        """测试标题失败的结果不写入缓存"""
+        mock_dbset.return_value = 1
+        mock_summary.return_value = {'ret0': "摘要"}
+        mock_title.side_effect = Exception("GPU节点返回错误: 500")
+
+        BgTasks.get_one_summary("不缓存内容", 100)
+
+        assert BgTasks.cache.stats()['entries'] == 0
+
+    @patch('BgTasks.flight', RedisSingleFlight(FakeRedis()))
+    @patch('BgTasks.Dbconn.dbSet')
+    @patch('BgTasks.Summary.title')
+    @patch('BgTasks.Summary.summary')
+    def test_partial_title_not_cached(self, mock_summary, mock_title, mock_dbset):
+        """测试GPU节点标记为部分结果的标题不缓存，保存的标题中不带标记"""
+        mock_dbset.return_value = 1
+        mock_summary.return_value = {'ret0': "摘要"}
+        mock_title.return_value = {'ret0': "部分标题", 'partial': True}
+
+        result = BgTasks.get_one_summary("部分标题内容", 100)
+
+        assert json.loads(result["title"]) == {'ret0': "部分标题"}
+        assert BgTasks.cache.stats()['entries'] == 0
+        assert ContentStore.result(ContentStore.fingerprint("部分标题内容"), 100) is None
+
+    @patch('BgTasks.Summary.summary')
+    def test_flight_keys_by_priority(self, mock_summary):
+        """测试不同优先级和是否接受部分结果的请求不合并"""
+        mock_summary.return_value = {'ret0': "摘要"}
+        keys = []
+
+        class Flight:
+            def do(self, key, fn):
+                keys.append(key)
+                return fn()
+
+        with patch('BgTasks.flight', Flight()), patch('BgTasks.Summary.title') as mock_title:
+            mock_title.return_value = {'ret0': "标题"}
+            BgTasks._generate(1, "合并内容", 100, BgTasks.Summary.INTERACTIVE, BgTasks.cache.key("合并内容", max_len=100))
+            BgTasks._generate(2, "合并内容", 100, BgTasks.Summary.BATCH, BgTasks.cache.key("合并内容", max_len=100))
+
+        assert len(set(keys)) == 4
+        assert [args.kwargs['allow_partial'] for args in mock_title.call_args_list] == [True, False]
+
+    @staticmethod
+    def _refs(items):
+        """与enqueue_batches相同，先保存内容，批次中只带内容哈希"""
+        stored = ContentStore.store_many([item['content'] for item in items])
+        return [{'content_hash': content_hash, 'max_len': item['max_len'], 'filename': item.get('filename')}
+                for (_, content_hash), item in zip(stored, items)]
+
+    @staticmethod
+    def _history():
+        return Dbconn.dbGet("SELECT id, status, contents, summary, title, content_hash, canonical_id, job_id "
+                            "FROM summary_history ORDER BY id", [])
+
+    @patch('BgTasks.get_one_summary.delay')
+    @patch('BgTasks.Summary.batch')
+    def test_get_batch_summary(self, mock_batch, mock_delay):
+        """测试批量任务一次请求GPU节点、一个事务写入，失败的文档单独重试"""
+        BgTasks.cache.set(BgTasks.cache.key("已缓存", max_len=150),
+                          {'summary': '"缓存摘要"', 'title': '"缓存标题"', 'time_use': 1.0})
+        mock_batch.return_value = [({'ret0': "摘要"}, {'ret0': "标题"}), Exception("Text cannot be empty")]
+        items = [{'content': "已缓存", 'max_len': 150, 'filename': "a.txt"},
+                 {'content': "新文档", 'max_len': 150, 'filename': "b.txt"},
+                 {'content': "坏文档", 'max_len': 150, 'filename': "c.txt"}]
+
+        result = BgTasks.get_batch_summary(self._refs(items), user_id=3)
+
+        assert result == {'sids': [1, 2, 3], 'done': 2, 'retried': 1}
+        # 只有未命中缓存的文档请求GPU节点
+        assert mock_batch.call_args[0][0] == ["新文档", "坏文档"]
+        rows = self._history()
+        assert [row[1] for row in rows] == [1, 1, 0]
+        assert rows[0][3:5] == ('"缓存摘要"', '"缓存标题"')
+        # 内容只保存在content_store中
+        assert [row[2] for row in rows] == [None, None, None]
+        assert [row[5] for row in rows] == [ContentStore.fingerprint(item['content']) for item in items]
+        mock_delay.assert_called_once_with(None, 150, "c.txt", user_id=3, priority='batch', sid=3,
+                                           job_id=None, content_hash=ContentStore.fingerprint("坏文档"))
+
+    @patch('BgTasks.get_one_summary.delay')
+    @patch('BgTasks.Summary.batch')
+    def test_batch_reuses_duplicates(self, mock_batch, mock_delay):
+        """测试重复的文档只保存一份内容，复用已保存的结果"""
+        mock_batch.return_value = [({'ret0': "摘要"}, {'ret0': "标题"})]
+        BgTasks.get_batch_summary(self._refs([{'content': "相同文档", 'max_len': 150},
+                                              {'content': "相同文档", 'max_len': 150}]))
+        # 同一批中的重复文档只请求一次
+        assert mock_batch.call_args[0][0] == ["相同文档"]
+
+        # Redis缓存过期后仍从content_result复用
+        BgTasks.cache = ResultCache(FakeRedis())
+        result = BgTasks.get_batch_summary(self._refs([{'content': "相同文档", 'max_len': 150}]))
+
+        assert mock_batch.call_count == 1 and result['done'] == 1
+        stats = BgTasks.cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 0)
+        rows = self._history()
+        assert len({row[6] for row in rows}) == 1
+        assert {row[3] for row in rows} == {json.dumps({'ret0': "摘要"}, ensure_ascii=False)}
+        assert Dbconn.dbGet("SELECT COUNT(*) FROM content_store", []) == [(1,)]
+
+    @patch('BgTasks.flight', RedisSingleFlight(FakeRedis()))
+    @patch('BgTasks.Summary.title')
+    @patch('BgTasks.Summary.summary')
+    def test_get_one_summary_reuses_stored_result(self, mock_summary, mock_title):
+        """测试单条摘要复用相同内容此前生成的结果"""
+        mock_summary.return_value = {'ret0': "摘要"}
+        mock_title.return_value = {'ret0': "标题"}
+        BgTasks.get_one_summary("相同文档", 150, user_id=1)
+        BgTasks.cache = ResultCache(FakeRedis())
+
+        result = BgTasks.get_one_summary("相同文档", 150, user_id=2)
+
+        assert result['cached'] is True
+        assert mock_summary.call_count == 1
+        assert [row[1] for row in self._history()] == [1, 1]
+        # 复用此前保存的结果计为命中
+        stats = BgTasks.cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 0)
+
+    @patch('BgTasks.get_one_summary.delay')
+    @patch('BgTasks.Summary.batch')
+    def test_batch_near_duplicates(self, mock_batch, mock_delay):
+        """测试记录近似重复的已有内容，开启复用时不再生成"""
+        article = ARTICLE
+        edited = article.replace("各地区", "各省市")
+        mock_batch.return_value = [({'ret0': "摘要"}, {'ret0': "标题"})]
+        BgTasks.get_batch_summary(self._refs([{'content': article, 'max_len': 150}]))
+
+        BgTasks.get_batch_summary(self._refs([{'content': edited, 'max_len': 150}]))
+        assert mock_batch.call_count == 2
+        near_id, near_distance = Dbconn.dbGet("SELECT near_id, near_distance FROM summary_history WHERE id=2", [])[0]
+        assert near_id == 1 and near_distance <= 3
+
+        with patch('BgTasks.Config.NEAR_DUPLICATE_REUSE', True):
+            result = BgTasks.get_batch_summary(
+                self._refs([{'content': edited.replace("抓好", "认真抓好"), 'max_len': 150}]))
+        assert mock_batch.call_count == 2 and result['done'] == 1
+
+    @patch('BgTasks.flight', RedisSingleFlight(FakeRedis()))
+    @patch('BgTasks.Summary.title')
+    @patch('BgTasks.Summary.summary')
+    def test_get_one_summary_loads_content_by_hash(self, mock_summary, mock_title):
+        """测试任务只带内容哈希时从content_store读取内容"""
+        mock_summary.return_value = {'ret0': "摘要"}
+        mock_title.return_value = {'ret0': "标题"}
+        sid = BgTasks.create_history("很长的文档", 150, user_id=1)
+
+        result = BgTasks.get_one_summary(None, 150, user_id=1, sid=sid,
+                                         content_hash=ContentStore.fingerprint("很长的文档"))
+
+        assert result['sid'] == sid
+        assert mock_summary.call_args[0][0] == "很长的文档"
+
+    @patch('BgTasks.BatchJob.advance')
+    @patch('BgTasks.get_one_summary.delay')
+    @patch('BgTasks.Summary.batch')
+    def test_batch_updates_job_progress(self, mock_batch, mock_delay, mock_advance):
+        """测试批量任务更新所属任务的计数，重试的文档回到排队状态"""
+        mock_batch.return_value = [({'ret0': "摘要"}, {'ret0': "标题"}), Exception("Text cannot be empty")]
+
+        BgTasks.get_batch_summary(self._refs([{'content': "文档一", 'max_len': 150},
+                                              {'content': "文档二", 'max_len': 150}]), user_id=3, job_id=5)
+
+        assert mock_advance.call_args_list == [call(5, queued=-2, running=2),
+                                               call(5, running=-2, done=1, queued=1)]
+        assert [row[7] for row in self._history()] == [5, 5]
+        assert mock_delay.call_args.kwargs['job_id'] == 5
+
+    @patch('BgTasks.BatchJob.advance')
+    @patch('BgTasks.flight', RedisSingleFlight(FakeRedis()))
+    @patch('BgTasks.Dbconn.dbSet')
+    @patch('BgTasks.Summary.title')
+    @patch('BgTasks.Summary.summary')
+    def test_retry_updates_job_progress(self, mock_summary, mock_title, mock_dbset, mock_advance):
+        """测试单独重试的文档完成或失败时更新任务计数"""
+        mock_title.return_value = "标题"
+        mock_summary.side_effect = Exception("GPU节点连接失败")
+
+        BgTasks.get_one_summary("内容", 150, sid=13, job_id=5)
+
+        assert mock_advance.call_args_list == [call(5, queued=-1, running=1), call(5, running=-1, failed=1)]
+
+    @staticmethod
+    def _stuck(sid, **columns):
+        """把记录设置为租约已到期"""
+        columns = dict({'lease_until': time.time() - 1}, **columns)
+        Dbconn.dbSet(f"UPDATE summary_history SET {', '.join(f'{name}=?' for name in columns)} WHERE id=?",
+                     [*columns.values(), sid])
+
+    @patch('BgTasks.BatchJob.advance')
+    @patch('BgTasks.get_one_summary.apply_async')
+    @patch('BgTasks.app.control.revoke')
+    @patch('BgTasks._task_state', return_value='STARTED')
+    def test_reap_stuck_requeues(self, mock_state, mock_revoke, mock_apply, mock_advance):
+        """测试worker退出后卡在处理中的记录被重新投递，原任务不再处理"""
+        sid = BgTasks.create_history("内容", 150, "a.txt", user_id=3)
+        self._stuck(sid, task_id='old', started_at=time.time() - 600, job_id=5)
+
+        assert BgTasks.reap_stuck() == {'requeued': 1, 'failed': 0}
+
+        mock_revoke.assert_called_once_with('old', terminate=True)
+        mock_advance.assert_called_once_with(5, running=-1, queued=1)
+        task_id, started_at, attempts = Dbconn.dbGet(
+            "SELECT task_id, started_at, attempts FROM summary_history WHERE id=?", [sid])[0]
+        assert (started_at, attempts) == (None, 1)
+        assert mock_apply.call_args.kwargs['task_id'] == task_id
+        assert mock_apply.call_args[0][1]['sid'] == sid
+        assert mock_apply.call_args[0][1]['content_hash'] == ContentStore.fingerprint("内容")
+
+        # 租约已续期，再次执行不会重复投递；原任务开始执行时发现记录已转给新任务
+        assert BgTasks.reap_stuck() == {'requeued': 0, 'failed': 0}
+        assert BgTasks.get_one_summary(None, 150, sid=sid, content_hash=ContentStore.fingerprint("内容")) is None
+
+    @patch('BgTasks.BatchJob.advance')
+    @patch('BgTasks.get_one_summary.apply_async')
+    def test_reap_stuck_marks_failed(self, mock_apply, mock_advance):
+        """测试达到最大尝试次数的记录标记为失败，租约未到期的记录不处理"""
+        sid = BgTasks.create_history("内容", 150, user_id=3)
+        self._stuck(sid, attempts=Config.TASK_MAX_ATTEMPTS - 1, job_id=5)
+        BgTasks.create_history("另一篇内容", 150, user_id=3)
+
+        assert BgTasks.reap_stuck() == {'requeued': 0, 'failed': 1}
+
+        assert [row[1] for row in self._history()] == [-1, 0]
+        mock_advance.assert_called_once_with(5, queued=-1, failed=1)
+        mock_apply.assert_not_called()
+
+    @patch('BgTasks.BatchJob.advance')
+    @patch('BgTasks.get_one_summary.apply_async')
+    @patch('BgTasks.app.control.revoke')
+    @patch('BgTasks._task_state', return_value='STARTED')
+    def test_reap_stuck_releases_batch_slot(self, mock_state, mock_revoke, mock_apply, mock_advance):
+        """测试回收卡住的批次时只撤销一次，并释放公平调度的占用"""
+        for content in ("文档一", "文档二"):
+            sid = BgTasks.create_history(content, 150, user_id=3)
+            self._stuck(sid, task_id='slot-1', started_at=time.time() - 600)
+
+        with patch.object(BgTasks.fair, 'release') as mock_release:
+            assert BgTasks.reap_stuck() == {'requeued': 2, 'failed': 0}
+
+        mock_revoke.assert_called_once_with('slot-1', terminate=True)
+        mock_release.assert_called_once_with(3, 'slot-1')
+
+    def test_heartbeat_renews_lease(self):
+        """测试处理期间续租，处理完成后不再续租"""
+        sid = BgTasks.create_history("内容", 150, user_id=3)
+        self._stuck(sid, task_id='t1', lease_until=time.time() + 1)
+        other = BgTasks.create_history("另一篇内容", 150, user_id=3)
+        self._stuck(other, task_id='t2', lease_until=time.time() + 1)
+
+        def lease(row):
+            return Dbconn.dbGet("SELECT lease_until FROM summary_history WHERE id=?", [row])[0][0]
+
+        with patch('BgTasks.Config.TASK_HEARTBEAT_INTERVAL', 0.01):
+            with BgTasks._heartbeat('t1'):
+                deadline = time.time() + 5
+                while lease(sid) < time.time() + Config.TASK_LEASE_SECONDS - 60 and time.time() < deadline:
+                    time.sleep(0.01)
+            assert lease(sid) > time.time() + Config.TASK_LEASE_SECONDS - 60
+            assert lease(other) < time.time() + 2
+
+            # 超过最长运行时间后不再续租，卡死的任务仍会被回收
+            self._stuck(sid, lease_until=time.time() + 1)
+            with patch('BgTasks.Config.TASK_MAX_RUNTIME', 0), BgTasks._heartbeat('t1'):
+                time.sleep(0.1)
+            assert lease(sid) < time.time() + 2
+
+    @patch('BgTasks.get_one_summary.delay')
+    @patch('BgTasks.Summary.batch')
+    def test_batch_request_failure_retries_all(self, mock_batch, mock_delay):
+        """测试批量请求整体失败时每篇文档单独重试"""
+        mock_batch.side_effect = Exception("GPU节点连接失败")
+
+        result = BgTasks.get_batch_summary(self._refs([{'content': "文档一", 'max_len': 150},
+                                                       {'content': "文档二", 'max_len': 150}]))
+
+        assert result['retried'] == 2
+        assert [row[1] for row in self._history()] == [0, 0]
+        assert [c.kwargs['sid'] for c in mock_delay.call_args_list] == [1, 2]
+
+    @patch('BgTasks.get_one_summary.delay')
+    @patch('BgTasks.Summary.batch')
+    def test_batch_result_count_mismatch_retries_all(self, mock_batch, mock_delay):
+        """测试GPU节点返回的结果数少于文档数时全部单独重试，不留下未处理的记录"""
+        mock_batch.return_value = [({'ret0': "摘要"}, {'ret0': "标题"})]
+
+        result = BgTasks.get_batch_summary(self._refs([{'content': "文档一", 'max_len': 150},
+                                                       {'content': "文档二", 'max_len': 150}]))
+
+        assert result == {'sids': [1, 2], 'done': 0, 'retried': 2}
+        assert [c.kwargs['sid'] for c in mock_delay.call_args_list] == [1, 2]
+
+    @patch('BgTasks.BatchJob.advance')
+    @patch('BgTasks.Summary.batch')
+    def test_batch_redelivery_skips_inserted_rows(self, mock_batch, mock_advance):
+        """测试worker退出后重新投递的批次不重复插入记录和扣减排队数"""
+        assert BgTasks.get_batch_summary.acks_late and BgTasks.get_batch_summary.reject_on_worker_lost
+        mock_batch.return_value = [({'ret0': "摘要"}, {'ret0': "标题"})]
+        items = self._refs([{'content': "文档", 'max_len': 150}])
+
+        first = BgTasks.get_batch_summary.apply((items,), {'job_id': 5}, task_id='b1').get()
+        again = BgTasks.get_batch_summary.apply((items,), {'job_id': 5}, task_id='b1').get()
+
+        assert first['done'] == 1 and again == {'sids': first['sids'], 'done': 0, 'retried': 0}
+        assert len(self._history()) == 1 and mock_batch.call_count == 1
+        assert mock_advance.call_args_list[0] == call(5, queued=-1, running=1)
+        assert len(mock_advance.call_args_list) == 2
+
+    @patch('BgTasks.Summary.batch')
+    def test_batch_releases_slot(self, mock_batch):
+        """测试批次完成或出错后释放公平调度的占用"""
+        mock_batch.return_value = [({'ret0': "摘要"}, {'ret0': "标题"})]
+
+        items = self._refs([{'content': "文档", 'max_len': 150}])
+
+        with patch.object(BgTasks.fair, 'release') as mock_release:
+            BgTasks.get_batch_summary(items, user_id=3, slot='s1')
+            with patch('BgTasks.Dbconn.dbInsertMany', side_effect=Exception("database is locked")):
+                with pytest.raises(Exception):
+                    BgTasks.get_batch_summary(items, user_id=3, slot='s2')
+
+        assert mock_release.call_args_list == [call(3, 's1'), call(3, 's2')]
+
+    @patch('BgTasks.get_batch_summary.apply_async')
+    def test_enqueue_batches_in_chunks(self, mock_apply):
+        """测试按BATCH_SIZE分批投递"""
+        items = ({'content': f"内容{i}", 'max_len': 150} for i in range(5))
+
+        with patch('BgTasks.Config.BATCH_SIZE', 2), patch('BgTasks.BatchJob.advance') as mock_advance:
+            count = BgTasks.enqueue_batches(items, user_id=5, job_id=9)
+
+        assert count == 5
+        assert [len(c[0][0][0]) for c in mock_apply.call_args_list] == [2, 2, 1]
+        assert mock_apply.call_args[0][1]['user_id'] == 5 and mock_apply.call_args[0][1]['job_id'] == 9
+        # 任务id即公平调度的占用
+        assert mock_apply.call_args.kwargs['task_id'] == mock_apply.call_args[0][1]['slot']
+        assert [c.kwargs['queued'] for c in mock_advance.call_args_list] == [2, 2, 1]
+
+    @patch('BgTasks.get_batch_summary.apply_async')
+    def test_ingest_zip_streams_members(self, mock_apply, tmp_path):
+        """测试直接从压缩包读取txt和docx成员，不解压到磁盘"""
+        docx_buffer = io.BytesIO()
+        document = Document()
+        document.add_paragraph("文档段落")
+        document.save(docx_buffer)
+
+        zip_path = tmp_path / "upload_abc.zip"
+        with zipfile.ZipFile(zip_path, 'w') as zFile:
+            zFile.writestr("dir/1.txt", "第一篇\r\n内容".encode('utf-8'))
+            zFile.writestr("dir/2.docx", docx_buffer.getvalue())
+            zFile.writestr("dir/image.png", b"\x89PNG")
+            zFile.writestr("__MACOSX/dir/._1.txt", b"\x00")
+            zFile.writestr("big.txt", "字" * 100000)
+
+        with patch('BgTasks.Config.ZIP_MAX_MEMBER_BYTES', 200000):
+            result = BgTasks.ingest_zip(str(zip_path), user_id=5)
+
+        assert result['queued'] == 2 and result['error'] is None
+        assert len(result['skipped']) == 1 and result['skipped'][0].startswith("big.txt")
+        # 任务消息中只有内容哈希，内容已保存到content_store
+        items = mock_apply.call_args[0][0][0]
+        assert items[0] == {'content_hash': ContentStore.fingerprint("第一篇\n内容"), 'max_len': 150,
+                            'filename': "upload_abc/dir/1.txt"}
+        assert ContentStore.load(items[1]['content_hash']) == "文档段落"
+        assert list(tmp_path.iterdir()) == [zip_path]
+
+    @patch('BgTasks.get_batch_summary.apply_async')
+    def test_ingest_zip_limits(self, mock_apply, tmp_path):
+        """测试成员数和累计大小上限"""
+        zip_path = tmp_path / "many.zip"
+        with zipfile.ZipFile(zip_path, 'w') as zFile:
+            for i in range(5):
+                zFile.writestr(f"{i}.txt", "内容" * 10)
+
+        with patch('BgTasks.Config.ZIP_MAX_MEMBERS', 4):
+            result = BgTasks.ingest_zip(str(zip_path))
+        assert result['queued'] == 0 and "超过上限" in result['error']
+
+        with patch('BgTasks.Config.ZIP_MAX_TOTAL_BYTES', 150):
+            result = BgTasks.ingest_zip(str(zip_path))
+        assert result['queued'] == 2
+        assert "停止处理" in result['skipped'][-1]
+
+        (tmp_path / "bad.zip").write_bytes(b"not a zip")
+        assert "格式错误" in BgTasks.ingest_zip(str(tmp_path / "bad.zip"))['error']
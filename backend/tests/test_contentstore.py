@@ -0,0 +1,39 @@
+"""
+测试ContentStore模块
+"""
+import sqlite3
+
+import pytest
+
+import ContentStore
+import Dbconn
+
+
+@pytest.fixture
+def store_db(monkeypatch, tmp_path):
+    db_path = str(tmp_path / "test.sqlite")
+    sqlite3.connect(db_path).close()
+    monkeypatch.setattr('Dbconn.DATABASE', db_path)
+    Dbconn.init()
+    return db_path
+
+
+class TestContentStore:
+    """测试内容去重和结果复用"""
+
+    def test_store_deduplicates(self, store_db):
+        """测试相同内容只保存一份并返回相同的id"""
+        stored = ContentStore.store_many(["文档一", "文档二", "文档一"])
+
+        assert stored[0] == stored[2] and stored[0] != stored[1]
+        assert ContentStore.store("文档二") == stored[1]
+        assert Dbconn.dbGet("SELECT COUNT(*) FROM content_store", []) == [(2,)]
+
+    def test_results_by_hash_and_max_len(self, store_db):
+        """测试结果按内容哈希和字数限制区分"""
+        content_hash = ContentStore.fingerprint("文档")
+        ContentStore.save_result(content_hash, 150, '"摘要"', '"标题"', 1.5)
+
+        assert ContentStore.result(content_hash, 150) == {'summary': '"摘要"', 'title': '"标题"', 'time_use': 1.5}
+        assert ContentStore.result(content_hash, 100) is None
+        assert ContentStore.results([]) == {}
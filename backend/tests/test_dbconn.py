@@ -5,8 +5,12 @@ import pytest
 import os
 import sqlite3
 import tempfile
+import threading
+from concurrent.futures import Future
+from unittest.mock import patch
+
 import Dbconn
-from Dbconn import dbGet, dbSet, init
+from Dbconn import dbGet, dbSet, dbInsertMany, dbSetMany, init
 
 
 class TestDbconn:
@@ -129,3 +133,127 @@ class TestDbconn:
         
         assert len(result) == 1
         assert result[0][1] == "test_name2"
+
+
+    def test_dbInsertMany_and_dbSetMany(self, test_db):
+        """测试批量插入返回各行id，批量更新在一个事务中完成"""
+        ids = dbInsertMany(
+            "INSERT INTO test_table (name, value) VALUES (?, ?)",
+            [["a", 1], ["b", 2], ["c", 3]]
+        )
+        assert len(ids) == 3 and ids == sorted(ids)
+
+        count = dbSetMany("UPDATE test_table SET value=? WHERE id=?", [[10, ids[0]], [30, ids[2]]])
+        assert count == 2
+        assert dbGet("SELECT value FROM test_table ORDER BY id", []) == [(10,), (2,), (30,)]
+
+    def test_dbInsertMany_rolls_back(self, test_db):
+        """测试批量插入中途失败时整体回滚"""
+        with pytest.raises(sqlite3.Error):
+            dbInsertMany(
+                "INSERT INTO test_table (id, name, value) VALUES (?, ?, ?)",
+                [[1, "a", 1], [1, "dup", 2]]
+            )
+
+        assert dbGet("SELECT COUNT(*) FROM test_table", []) == [(0,)]
+
+    def test_init_migrates_idempotently(self, test_db):
+        """测试迁移新增batch_job表和summary_history.job_id列，重复执行无副作用"""
+        conn = sqlite3.connect(test_db)
+        conn.execute("CREATE TABLE summary_history (id integer primary key autoincrement, status integer)")
+        conn.commit()
+        conn.close()
+
+        init()
+        init()
+
+        columns = [row[1] for row in dbGet("PRAGMA table_info(summary_history)", [])]
+        assert columns.count('job_id') == 1
+        assert dbGet("SELECT COUNT(*) FROM batch_job", []) == [(0,)]
+
+    def test_init_enables_wal(self, test_db):
+        """测试迁移时开启WAL模式"""
+        assert dbGet("PRAGMA journal_mode", []) == [('wal',)]
+
+    def test_concurrent_writes_grouped(self, test_db):
+        """测试多个线程同时写入时合并到少数事务中，各自得到插入的行id"""
+        commits = []
+        apply = Dbconn.Writer.apply
+
+        def counting(batch):
+            commits.append(len(batch))
+            apply(batch)
+
+        results = {}
+
+        def worker(n):
+            results[n] = [dbSet("INSERT INTO test_table (name, value) VALUES (?, ?)", [f"t{n}", i])
+                          for i in range(20)]
+
+        with patch.object(Dbconn.Writer, 'apply', staticmethod(counting)):
+            threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        ids = [row_id for n in range(8) for row_id in results[n]]
+        assert len(set(ids)) == 160
+        for n in range(8):
+            assert dbGet("SELECT value FROM test_table WHERE name=? ORDER BY id", [f"t{n}"]) == \
+                [(i,) for i in range(20)]
+            assert dbGet(f"SELECT name FROM test_table WHERE id IN ({','.join('?' * 20)})", results[n]) == \
+                [(f"t{n}",)] * 20
+        assert sum(commits) == 160 and len(commits) < 160
+
+    def test_failed_write_isolated(self, test_db):
+        """测试同一事务中一次写入失败时只回滚这一次写入"""
+        def insert(row_id, name):
+            def write(cur):
+                cur.execute("INSERT INTO test_table (id, name, value) VALUES (?, ?, ?)", [row_id, name, 0])
+                return cur.lastrowid
+            return write
+
+        futures = [Future(), Future(), Future()]
+        Dbconn.Writer.apply([(insert(1, "a"), futures[0]), (insert(1, "dup"), futures[1]),
+                             (insert(2, "b"), futures[2])])
+
+        assert futures[0].result() == 1 and futures[2].result() == 2
+        with pytest.raises(sqlite3.IntegrityError):
+            futures[1].result()
+        assert dbGet("SELECT id, name FROM test_table ORDER BY id", []) == [(1, "a"), (2, "b")]
+
+    def test_writer_survives_errors(self, test_db):
+        """测试无法打开数据库或写入线程中出现意外异常时，写入返回异常且写入线程继续工作"""
+        with patch('Dbconn.DATABASE', os.path.join(tempfile.gettempdir(), "missing", "dir", "db.sqlite")):
+            with pytest.raises(sqlite3.OperationalError):
+                dbSet("INSERT INTO test_table (name, value) VALUES (?, ?)", ["a", 1])
+
+        with patch('Dbconn.Writer.apply', side_effect=RuntimeError("boom")):
+            with pytest.raises(RuntimeError):
+                dbSet("INSERT INTO test_table (name, value) VALUES (?, ?)", ["b", 2])
+
+        assert Dbconn.writer._thread.is_alive()
+        assert dbSet("INSERT INTO test_table (name, value) VALUES (?, ?)", ["c", 3]) == 1
+        assert dbGet("SELECT name FROM test_table", []) == [("c",)]
+
+    def test_timeout_cancels_pending_write(self, test_db):
+        """测试等待超时的写入尚未执行时被取消，已开始执行的写入等到提交后返回结果"""
+        started, release = threading.Event(), threading.Event()
+
+        def blocking(cur):
+            started.set()
+            release.wait(5)
+            cur.execute("INSERT INTO test_table (name, value) VALUES (?, ?)", ["a", 1])
+            return "done"
+
+        with patch('Dbconn.WRITE_TIMEOUT', 0.05):
+            running = Dbconn.writer.submit(blocking)
+            assert started.wait(5)
+            with pytest.raises(TimeoutError):
+                dbSet("INSERT INTO test_table (name, value) VALUES (?, ?)", ["b", 2])
+            threading.Timer(0.1, release.set).start()
+            assert Dbconn._wait(running) == "done"
+
+        assert dbGet("SELECT name FROM test_table", []) == [("a",)]
+
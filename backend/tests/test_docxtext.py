@@ -0,0 +1,90 @@
+"""
+测试DocxText模块
+"""
+import io
+import tracemalloc
+import zipfile
+
+import pytest
+from docx import Document
+
+import DocxText
+
+
+def save(document):
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+class TestDocxText:
+    """测试docx正文流式提取"""
+
+    def test_paragraphs_match_python_docx(self):
+        """测试段落文字与python-docx一致，段落之间换行，空段落不保留"""
+        document = Document()
+        document.add_heading("标题", level=1)
+        paragraph = document.add_paragraph("第一段，")
+        paragraph.add_run("加粗部分").bold = True
+        paragraph.add_run("\t制表符")
+        document.add_paragraph("")
+        document.add_paragraph("第二段\n换行")
+        data = save(document)
+
+        expected = [p.text for p in Document(io.BytesIO(data)).paragraphs if p.text.strip()]
+        assert DocxText.extract(data) == "\n".join(expected)
+        assert DocxText.extract(data) == "标题\n第一段，加粗部分\t制表符\n第二段\n换行"
+
+    def test_tables(self):
+        """测试表格按行输出，单元格以制表符分隔，与前后段落保持顺序"""
+        document = Document()
+        document.add_paragraph("表格之前")
+        table = document.add_table(rows=2, cols=2)
+        table.cell(0, 0).text = "姓名"
+        table.cell(0, 1).text = "得分"
+        table.cell(1, 0).text = "张三"
+        table.cell(1, 1).paragraphs[0].add_run("九十")
+        table.cell(1, 1).add_paragraph("优秀")
+        document.add_paragraph("表格之后")
+
+        assert DocxText.extract(save(document)) == "表格之前\n姓名\t得分\n张三\t九十 优秀\n表格之后"
+
+    def test_file_object(self, tmp_path):
+        """测试直接传入文件对象"""
+        document = Document()
+        document.add_paragraph("文件内容")
+        path = tmp_path / "a.docx"
+        path.write_bytes(save(document))
+
+        with open(path, 'rb') as f:
+            assert DocxText.extract(f) == "文件内容"
+
+    def test_bad_file(self):
+        """测试不是docx压缩包或缺少正文时抛出异常"""
+        with pytest.raises(zipfile.BadZipFile):
+            DocxText.extract(b"not a zip")
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as zFile:
+            zFile.writestr("word/other.xml", "<x/>")
+        with pytest.raises(KeyError):
+            DocxText.extract(buffer.getvalue())
+
+    def test_memory_bounded(self):
+        """测试逐段输出时释放已解析的元素，内存占用与文档长度无关"""
+        document = Document()
+        for i in range(3000):
+            document.add_paragraph(f"第{i}段" + "文字" * 50)
+        data = save(document)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zFile, zFile.open('word/document.xml') as xml:
+            tracemalloc.start()
+            try:
+                count = sum(1 for _ in DocxText._lines(xml))
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+        assert count == 3000
+        # 保留全部元素时峰值约2MB
+        assert peak < 512 * 1024
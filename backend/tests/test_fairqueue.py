@@ -0,0 +1,168 @@
+"""
+测试FairQueue模块
+"""
+import pytest
+import redis
+from unittest.mock import patch, MagicMock
+
+from FairQueue import FairQueue
+from tests.test_helper import FakeRedis
+
+
+class Recorder:
+    """记录投递顺序的假Celery"""
+
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, user_id, payload, slot):
+        self.sent.append((user_id, payload['n'], slot))
+
+
+def _queue(**kwargs):
+    recorder = Recorder()
+    return FairQueue(FakeRedis(), recorder, **kwargs), recorder
+
+
+class TestFairQueue:
+    """测试按用户公平调度"""
+
+    def test_round_robin_between_users(self):
+        """测试大批量用户只在没有其他用户等待时超过自己的上限，空出的名额先给后提交的用户"""
+        queue, recorder = _queue(user_cap=1, max_inflight=2)
+        for n in range(5):
+            queue.push(1, {'n': n})
+        # 只有用户1有任务时用满合计上限
+        assert [(u, n) for u, n, _ in recorder.sent] == [(1, 0), (1, 1)]
+
+        queue.push(2, {'n': 100})
+        assert len(recorder.sent) == 2
+
+        # 用户1已超过上限且用户2在等待，空出的名额给用户2
+        queue.release(1, recorder.sent[0][2])
+        assert [(u, n) for u, n, _ in recorder.sent[2:]] == [(2, 100)]
+        queue.release(1, recorder.sent[1][2])
+        assert [(u, n) for u, n, _ in recorder.sent[3:]] == [(1, 2)]
+
+    def test_interleaves_when_both_backlogged(self):
+        """测试多个用户都有积压时轮流投递"""
+        queue, recorder = _queue(user_cap=10, max_inflight=1)
+        for n in range(3):
+            queue.push(1, {'n': n})
+            queue.push(2, {'n': 10 + n})
+
+        order = []
+        while recorder.sent:
+            user_id, n, slot = recorder.sent.pop(0)
+            order.append(n)
+            queue.release(user_id, slot)
+
+        assert order == [0, 10, 1, 11, 2, 12]
+
+    def test_global_cap_keeps_throughput(self):
+        """测试只有一个用户时可以用满全部并发"""
+        queue, recorder = _queue(user_cap=4, max_inflight=3)
+        for n in range(6):
+            queue.push(1, {'n': n})
+
+        assert len(recorder.sent) == 3
+        assert queue.stats() == {'inflight': 3, 'max_inflight': 3,
+                                 'users': [{'user_id': 1, 'queued': 3, 'running': 3, 'cap': 4}]}
+
+    def test_inflight_limit_follows_workers(self):
+        """测试按worker进程数提高合计上限，过期后恢复配置值，且不低于配置值"""
+        queue, recorder = _queue(user_cap=10, max_inflight=2)
+        for n in range(6):
+            queue.push(1, {'n': n})
+        assert len(recorder.sent) == 2
+        assert queue.backlog() == 4
+
+        queue.set_inflight_limit(5, ttl=30)
+        assert len(recorder.sent) == 5
+        assert queue.stats()['max_inflight'] == 5 and queue.backlog() == 1
+
+        queue.set_inflight_limit(1, ttl=30)
+        assert queue.inflight_limit() == 2
+        queue.client.delete(queue.limit_key)
+        assert queue.inflight_limit() == 2
+
+    def test_lone_user_uses_all_slots(self):
+        """测试只有一个用户时不受用户上限限制，与不分用户的队列吞吐量相同"""
+        queue, recorder = _queue(user_cap=2, max_inflight=8)
+        for n in range(10):
+            queue.push(1, {'n': n})
+
+        assert len(recorder.sent) == 8
+        assert queue.stats()['users'] == [{'user_id': 1, 'queued': 2, 'running': 8, 'cap': 2}]
+
+    def test_cap_overrides(self):
+        """测试按用户设置并发上限"""
+        queue, recorder = _queue(user_cap=1, max_inflight=10, cap_overrides={7: 3})
+        with patch.object(queue, 'dispatch'):
+            for n in range(5):
+                queue.push(7, {'n': n})
+                queue.push(8, {'n': 10 + n})
+        queue.dispatch()
+
+        assert sorted(n for _, n, _ in recorder.sent) == [0, 1, 2, 10]
+
+    def test_expired_lease_frees_slot(self):
+        """测试worker退出未释放的占用到期后不再计数"""
+        queue, recorder = _queue(user_cap=1, max_inflight=1, lease=60)
+        queue.push(1, {'n': 0})
+        queue.push(1, {'n': 1})
+        assert len(recorder.sent) == 1
+
+        with patch('FairQueue.time.time', return_value=2e10):
+            queue.dispatch()
+        assert [n for _, n, _ in recorder.sent] == [0, 1]
+
+    def test_send_failure_requeues(self):
+        """测试投递失败时批次放回队首，已加入子队列的push不抛出异常"""
+        send = MagicMock(side_effect=[ConnectionError("broker down"), ConnectionError("broker down"), None])
+        queue = FairQueue(FakeRedis(), send, user_cap=1, max_inflight=1)
+
+        queue.push(1, {'n': 0})
+        assert queue.stats()['users'] == [{'user_id': 1, 'queued': 1, 'running': 0, 'cap': 1}]
+
+        with pytest.raises(ConnectionError):
+            queue.dispatch()
+        queue.dispatch()
+        assert send.call_args[0][1] == {'n': 0}
+
+    def test_redis_failure_during_dispatch(self):
+        """测试加入子队列后调度时Redis出错，push不抛出异常，批次只加入一次"""
+        queue, recorder = _queue(user_cap=1, max_inflight=1)
+
+        with patch.object(queue.client, 'lpop', side_effect=redis.exceptions.ConnectionError()):
+            queue.push(1, {'n': 0})
+        assert recorder.sent == []
+        assert queue.stats()['users'][0]['queued'] == 1
+
+        queue.dispatch()
+        assert [n for _, n, _ in recorder.sent] == [0]
+
+    def test_dispatch_keeps_lock_taken_by_others(self):
+        """测试调度锁过期后被其他进程抢到时，原持有者结束调度不会删除对方的锁"""
+        queue, _ = _queue()
+
+        def expire():
+            queue.client.set(queue.lock_key, 'other')
+            return 0
+
+        with patch.object(queue, '_dispatch', side_effect=expire):
+            queue.dispatch()
+        assert queue.client.get(queue.lock_key) == b'other'
+
+    def test_redis_down_sends_directly(self):
+        """测试Redis不可用时直接投递"""
+        client = MagicMock()
+        client.rpush.side_effect = redis.exceptions.ConnectionError()
+        recorder = Recorder()
+        queue = FairQueue(client, recorder)
+
+        queue.push(1, {'n': 0})
+
+        assert recorder.sent == [(1, 0, None)]
+        client.smembers.side_effect = redis.exceptions.ConnectionError()
+        assert queue.stats() is None
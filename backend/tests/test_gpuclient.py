@@ -0,0 +1,412 @@
+"""
+测试GpuClient模块
+"""
+import random
+import time
+
+import msgpack
+import pytest
+import requests
+import zstandard
+import requests_mock
+
+from GpuClient import CircuitBreaker, EmbeddedPool, GpuClient, GpuNodeError, NodePool
+
+BASE_URL = 'http://gpu-test:3000'
+
+
+class TestGpuClient:
+    """测试GPU节点HTTP客户端"""
+
+    @pytest.fixture
+    def client(self):
+        return GpuClient(base_url=BASE_URL, connect_timeout=1, read_timeout=30, retries=2, backoff=0)
+
+    def test_post_decodes_json(self, client):
+        """测试JSON传输时响应直接解码为JSON并带上连接/读取超时"""
+        client.transport = 'json'
+        with requests_mock.Mocker() as m:
+            m.post(f"{BASE_URL}/title", json={"title": ["标题"]})
+
+            assert client.post('/title', {'text': '内容'}) == {"title": ["标题"]}
+            assert m.request_history[0].json() == {'text': '内容'}
+            assert m.request_history[0].timeout == (1, 30)
+
+    def test_msgpack_transport(self, client):
+        """测试默认使用msgpack编码请求体并解码msgpack响应"""
+        with requests_mock.Mocker() as m:
+            m.post(f"{BASE_URL}/title", content=msgpack.packb({"title": ["标题"]}),
+                   headers={'Content-Type': 'application/msgpack'})
+
+            assert client.post('/title', {'text': '内容'}) == {"title": ["标题"]}
+            sent = m.request_history[0]
+            assert sent.headers['Content-Type'] == 'application/msgpack'
+            assert sent.headers['Accept'] == 'application/msgpack'
+            assert msgpack.unpackb(sent.body) == {'text': '内容'}
+
+    def test_large_body_compressed(self, client):
+        """测试大文本请求体压缩后发送"""
+        client.compress_min_bytes = 1024
+        with requests_mock.Mocker() as m:
+            m.post(f"{BASE_URL}/summarize", json={"summary": ["摘要"]})
+
+            client.post('/summarize', {'text': '内容' * 1000})
+            sent = m.request_history[0]
+            assert sent.headers['Content-Encoding'] == 'zstd'
+            assert len(sent.body) < 1024
+            raw = zstandard.ZstdDecompressor().decompress(sent.body)
+            assert msgpack.unpackb(raw) == {'text': '内容' * 1000}
+
+    def test_session_reused(self, client):
+        """测试同一进程复用连接池"""
+        assert client.session() is client.session()
+
+    def test_session_recreated_after_fork(self, client, monkeypatch):
+        """测试fork后的子进程创建新的连接池"""
+        parent = client.session()
+        monkeypatch.setattr('GpuClient.os.getpid', lambda: -1)
+
+        assert client.session() is not parent
+
+    def test_retry_on_connection_error(self, client):
+        """测试连接失败时有限次重试"""
+        with requests_mock.Mocker() as m:
+            m.post(f"{BASE_URL}/summarize", [
+                {'exc': requests.exceptions.ConnectionError},
+                {'status_code': 503},
+                {'json': {"summary": ["摘要"]}},
+            ])
+
+            assert client.post('/summarize', {'text': '内容'}) == {"summary": ["摘要"]}
+            assert m.call_count == 3
+
+    def test_retries_bounded(self, client):
+        """测试重试次数用尽后抛出异常"""
+        with requests_mock.Mocker() as m:
+            m.post(f"{BASE_URL}/summarize", exc=requests.exceptions.ConnectionError)
+
+            with pytest.raises(GpuNodeError):
+                client.post('/summarize', {'text': '内容'})
+            assert m.call_count == 3
+
+    def test_no_retry_on_client_error_or_deadline(self, client):
+        """测试参数错误和截止时间已过时不重试"""
+        with requests_mock.Mocker() as m:
+            m.post(f"{BASE_URL}/title", status_code=400, json={"error": "bad"})
+            m.post(f"{BASE_URL}/summarize", status_code=504, json={"error": "Deadline exceeded"})
+
+            with pytest.raises(GpuNodeError) as exc_info:
+                client.post('/title', {'text': ''})
+            assert exc_info.value.status == 400
+
+            with pytest.raises(GpuNodeError):
+                client.post('/summarize', {'text': '内容'})
+            assert m.call_count == 2
+
+    def test_read_timeout_limited_by_deadline(self, client):
+        """测试读取超时不超过剩余时间"""
+        with requests_mock.Mocker() as m:
+            m.get(f"{BASE_URL}/nvidia_info", json={"gpus": []})
+
+            client.get('/nvidia_info', timeout=2)
+            assert m.request_history[0].timeout[1] <= 2
+
+    def test_read_timeout_extends_to_deadline(self, client):
+        """测试截止时间长于read_timeout时读取超时随之延长"""
+        with requests_mock.Mocker() as m:
+            m.post(f"{BASE_URL}/batch", json={"results": []})
+
+            client.post('/batch', {'texts': ['内容']}, timeout=600)
+            connect_timeout, read_timeout = m.request_history[0].timeout
+            assert connect_timeout == 1 and 599 < read_timeout <= 600
+
+
+class FakeNodeClient:
+    """假的节点客户端，按预设行为返回或抛出异常"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.calls = 0
+        self.fail = False
+        self.delay = 0
+        self.utilization = 0
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise GpuNodeError("连接失败")
+        return {'node': self.base_url}
+
+    def get(self, path, timeout=None):
+        if self.fail:
+            raise GpuNodeError("连接失败")
+        return {'gpus': [{'gpu_usage_percent': self.utilization}]}
+
+
+class TestNodePool:
+    """测试多GPU节点负载均衡"""
+
+    @pytest.fixture
+    def pool(self):
+        nodes = {f'GPU{i}': f'http://gpu{i}:3000' for i in range(4)}
+        pool = NodePool(nodes, breaker_threshold=2, breaker_reset=60, health_interval=60, hedge_min_samples=5,
+                        client_factory=FakeNodeClient, rng=random.Random(0))
+        pool._ensure_health_checks = lambda: None  # 测试中不启动后台健康检查
+        return pool
+
+    def test_requests_spread_across_nodes(self, pool):
+        """测试请求分散到所有节点"""
+        for _ in range(400):
+            pool.post('/title', {'text': '内容'})
+
+        calls = [n.client.calls for n in pool.nodes]
+        assert all(c > 50 for c in calls)
+
+    def test_least_outstanding_preferred(self, pool):
+        """测试优先选择在途请求少的节点"""
+        held = [pool.pick() for _ in range(8)]
+        outstanding = [n.outstanding for n in pool.nodes]
+        assert max(outstanding) - min(outstanding) <= 1
+        for node in held:
+            pool.release(node)
+
+    def test_busy_node_gets_less_traffic(self, pool):
+        """测试利用率高的节点权重降低"""
+        pool.nodes[0].client.utilization = 95
+        pool.check_health()
+        held = [pool.pick() for _ in range(40)]
+
+        assert pool.nodes[0].outstanding < pool.nodes[1].outstanding
+        for node in held:
+            pool.release(node)
+
+    def test_failing_node_tripped_and_probed(self, pool):
+        """测试连续失败的节点熔断，健康检查成功后half-open探测恢复"""
+        bad = pool.nodes[0]
+        bad.client.fail = True
+        for _ in range(50):
+            pool.post('/title', {'text': '内容'})
+
+        assert not pool.stats()[0]['available']
+        calls = bad.client.calls
+        for _ in range(50):
+            pool.post('/title', {'text': '内容'})
+        assert bad.client.calls == calls
+
+        bad.client.fail = False
+        pool.check_health()
+        assert pool.stats()[0]['breaker'] == 'half_open'
+        assert pool.stats()[0]['available']
+
+        for _ in range(50):
+            pool.post('/title', {'text': '内容'})
+        assert pool.stats()[0]['breaker'] == 'closed'
+        assert bad.client.calls > calls
+
+    def test_business_error_not_counted(self, pool):
+        """测试节点返回的业务错误不导致熔断"""
+        def bad_request(*args, **kwargs):
+            raise GpuNodeError("参数错误", status=400)
+
+        for node in pool.nodes:
+            node.client.request = bad_request
+        for _ in range(10):
+            with pytest.raises(GpuNodeError):
+                pool.post('/title', {'text': ''})
+
+        assert all(n['available'] for n in pool.stats())
+
+    def test_unexpected_error_releases_node(self, pool):
+        """测试响应无法解码等意外错误也归还在途名额并计为节点故障"""
+        def bad_response(*args, **kwargs):
+            raise ValueError("Expecting value: line 1 column 1")
+
+        for node in pool.nodes:
+            node.client.request = bad_response
+        for _ in range(4):
+            with pytest.raises(GpuNodeError):
+                pool.post('/title', {'text': '内容'})
+
+        assert all(n['outstanding'] == 0 for n in pool.stats())
+        assert sum(n['failures'] for n in pool.stats()) >= 4
+
+    def test_retry_uses_remaining_time(self, pool):
+        """测试换节点重试时只使用剩余的时间"""
+        timeouts = []
+
+        def slow_failure(*args, timeout=None, **kwargs):
+            timeouts.append(timeout)
+            time.sleep(0.2)
+            raise GpuNodeError("连接失败")
+
+        for node in pool.nodes:
+            node.client.request = slow_failure
+        with pytest.raises(GpuNodeError):
+            pool.post('/title', {'text': '内容'}, timeout=1)
+
+        assert timeouts[0] == 1 and timeouts[1] <= 0.81
+
+    def test_device_info_keeps_breakers(self, pool):
+        """测试读取设备状态不改变熔断状态"""
+        pool.nodes[0].client.fail = True
+        info = pool.device_info()
+
+        assert info['GPU0'] is None and info['GPU1'] == {'gpus': [{'gpu_usage_percent': 0}]}
+        assert all(n['breaker'] == 'closed' and n['last_error'] is None for n in pool.stats())
+
+    def test_slow_node_hedged(self, pool):
+        """测试超过p95仍未返回时向另一个节点发送对冲请求"""
+        for _ in range(10):
+            pool.post('/title', {'text': '内容'})
+        assert pool.hedge_delay('/title', {'text': '内容'}) < 0.05
+
+        slow = pool.nodes[1]
+        slow.client.delay = 1
+        slow_calls = slow.client.calls
+        start = time.monotonic()
+        while slow.client.calls == slow_calls:
+            result = pool.post('/title', {'text': '内容'})
+
+        # 主请求落到慢节点时，由其他节点的对冲请求先返回
+        assert time.monotonic() - start < 0.9
+        assert result != {'node': slow.url}
+        assert sum(n['hedge_wins'] for n in pool.stats()) == 1
+
+    def test_hedge_delay_by_length(self, pool):
+        """测试延迟按文本长度分档统计，长文档不与短文档的p95比较"""
+        for _ in range(10):
+            pool.post('/title', {'text': '短'})
+
+        assert pool.hedge_delay('/title', {'text': '短'}) is not None
+        # 长文档所在的档没有样本，不对冲
+        assert pool.hedge_delay('/title', {'text': '长' * 5000}) is None
+
+    def test_no_hedge_without_samples(self, pool):
+        """测试延迟样本不足时不对冲"""
+        assert pool.hedge_delay('/summarize') is None
+
+
+class TestCircuitBreaker:
+    """测试节点熔断器"""
+
+    @pytest.fixture
+    def clock(self):
+        return {'now': 0.0}
+
+    @pytest.fixture
+    def breaker(self, clock):
+        return CircuitBreaker(threshold=3, reset_seconds=10, clock=lambda: clock['now'])
+
+    def test_opens_after_consecutive_failures(self, breaker):
+        """测试连续失败达到阈值后打开，成功会清零计数"""
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.available()
+
+    def test_half_open_allows_single_probe(self, breaker, clock):
+        """测试冷却期后只放行一个探测请求"""
+        breaker.trip()
+        clock['now'] = 10
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.available()
+
+        breaker.acquire()
+        assert not breaker.available()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_failed_probe_reopens(self, breaker, clock):
+        """测试探测失败后重新打开并重新计时"""
+        breaker.trip()
+        clock['now'] = 10
+        breaker.acquire()
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        clock['now'] = 15
+        assert not breaker.available()
+
+
+class FakeDeadlineExceeded(Exception):
+    pass
+
+
+class FakeDeadline:
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def expired(self):
+        return self.timeout <= 0
+
+
+class FakeGenerator:
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, text, num_titles=3, deadline=None, allow_partial=False):
+        self.calls.append((text, num_titles, deadline.timeout, allow_partial))
+        if deadline.timeout <= 0:
+            raise FakeDeadlineExceeded("Deadline exceeded before decoding")
+        return [f"标题{i}" for i in range(num_titles)]
+
+
+class TestEmbeddedPool:
+    """测试内嵌推理模式"""
+
+    @pytest.fixture
+    def pool(self):
+        pool = EmbeddedPool(node_dir='/nonexistent')
+        pool._engines = {
+            'generator': FakeGenerator(),
+            'generate_summary': lambda text, n, deadline=None: [text[:2]] * n,
+            'Deadline': FakeDeadline,
+            'DeadlineExceeded': FakeDeadlineExceeded,
+            'sampler': None,
+        }
+        return pool
+
+    def test_same_interface_as_http(self, pool):
+        """测试返回与GPU节点HTTP接口相同的JSON结构"""
+        headers = {'X-Priority': 'interactive', 'X-Deadline-Ms': '5000', 'X-Allow-Partial': '1'}
+
+        assert pool.post('/title', {'text': '内容'}, headers=headers, timeout=5) == \
+            {'title': ['标题0', '标题1', '标题2']}
+        assert pool.post('/summarize', {'text': '摘要内容'}, timeout=5) == \
+            {'summary': ['摘要'] * 3, 'sentence_count': 3}
+        assert pool._engines['generator'].calls == [('内容', 3, 5, True)]
+
+    def test_errors_mapped_to_status(self, pool):
+        """测试引擎错误转换为对应状态码的GpuNodeError"""
+        with pytest.raises(GpuNodeError) as exc_info:
+            pool.post('/title', {'text': '内容'}, timeout=0)
+        assert exc_info.value.status == 504
+
+        with pytest.raises(GpuNodeError) as exc_info:
+            pool.post('/summarize', {'text': '  '}, timeout=5)
+        assert exc_info.value.status == 400
+
+        with pytest.raises(GpuNodeError) as exc_info:
+            pool.post('/unknown', {}, timeout=5)
+        assert exc_info.value.status == 404
+
+    def test_health_without_loading(self):
+        """测试引擎未加载时状态查询不加载模型"""
+        pool = EmbeddedPool(node_dir='/nonexistent')
+
+        assert pool.check_health() == {'embedded': None}
+        assert pool.stats()[0]['loaded'] is False
+
+    def test_summary_module_uses_embedded_pool(self, pool, monkeypatch):
+        """测试Summary通过配置选择的节点池调用内嵌引擎"""
+        import Summary
+        monkeypatch.setattr('GpuClient.pool', pool)
+
+        assert Summary.title('内容') == {'ret0': '标题0', 'ret1': '标题1', 'ret2': '标题2'}
@@ -2,10 +2,13 @@
 测试辅助工具和数据
 """
 import json
+import threading
+import time
 import pytest
 import jwt
 from datetime import datetime, timedelta
 from Common import Config
+import SingleFlight
 
 
 class TestHelper:
@@ -68,3 +71,179 @@ class TestHelper:
         })
         data = json.loads(response.data)
         return data['body']['token'] if data['code'] == 0 else None
+
+
+class FakeRedis:
+    """线程安全的内存版Redis，只实现测试用到的命令"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._expire = {}
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    def _alive(self, key):
+        if key in self._expire and self._expire[key] <= time.time():
+            self._data.pop(key, None)
+            self._expire.pop(key, None)
+        return key in self._data
+
+    def set(self, key, value, nx=False, ex=None):
+        with self._lock:
+            if nx and self._alive(key):
+                return None
+            self._data[key] = self._encode(value)
+            self._expire.pop(key, None)
+            if ex:
+                self._expire[key] = time.time() + ex
+            return True
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key) if self._alive(key) else None
+
+    def delete(self, *keys):
+        with self._lock:
+            count = 0
+            for key in keys:
+                if self._alive(key):
+                    count += 1
+                self._data.pop(key, None)
+                self._expire.pop(key, None)
+            return count
+
+    def eval(self, script, numkeys, *args):
+        """只支持SingleFlight.RELEASE_SCRIPT（比较后删除）"""
+        if script != SingleFlight.RELEASE_SCRIPT:
+            raise NotImplementedError(script)
+        key, token = args
+        with self._lock:
+            if self._alive(key) and self._data[key] == self._encode(token):
+                del self._data[key]
+                self._expire.pop(key, None)
+                return 1
+            return 0
+
+    def exists(self, key):
+        with self._lock:
+            return int(self._alive(key))
+
+    def hset(self, key, field, value):
+        with self._lock:
+            self._data.setdefault(key, {})[self._encode(field)] = self._encode(value)
+            return 1
+
+    def hget(self, key, field):
+        with self._lock:
+            return self._data.get(key, {}).get(self._encode(field))
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            values = self._data.get(key, {})
+            return sum(values.pop(self._encode(f), None) is not None for f in fields)
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._data.get(key, {}))
+
+    def hincrby(self, key, field, amount=1):
+        with self._lock:
+            values = self._data.setdefault(key, {})
+            value = int(values.get(self._encode(field), 0)) + amount
+            values[self._encode(field)] = self._encode(value)
+            return value
+
+    def hincrbyfloat(self, key, field, amount=1.0):
+        with self._lock:
+            values = self._data.setdefault(key, {})
+            value = float(values.get(self._encode(field), 0)) + amount
+            values[self._encode(field)] = self._encode(value)
+            return value
+
+    def zadd(self, key, mapping):
+        with self._lock:
+            values = self._data.setdefault(key, {})
+            added = 0
+            for member, score in mapping.items():
+                member = self._encode(member)
+                added += member not in values
+                values[member] = float(score)
+            return added
+
+    def zrem(self, key, *members):
+        with self._lock:
+            values = self._data.get(key, {})
+            return sum(values.pop(self._encode(m), None) is not None for m in members)
+
+    def zcard(self, key):
+        with self._lock:
+            return len(self._data.get(key, {}))
+
+    def _zsorted(self, key):
+        return sorted(self._data.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    def zrange(self, key, start, end):
+        with self._lock:
+            members = [m for m, _ in self._zsorted(key)]
+            return members[start:None if end == -1 else end + 1]
+
+    def zrangebyscore(self, key, low, high):
+        with self._lock:
+            low = float(low)
+            high = float(high)
+            return [m for m, score in self._zsorted(key) if low <= score <= high]
+
+    def zremrangebyscore(self, key, low, high):
+        with self._lock:
+            low = float(low)
+            high = float(high)
+            values = self._data.get(key, {})
+            removed = [m for m, score in values.items() if low <= score <= high]
+            for member in removed:
+                del values[member]
+            return len(removed)
+
+    def rpush(self, key, *values):
+        with self._lock:
+            items = self._data.setdefault(key, [])
+            items.extend(self._encode(v) for v in values)
+            return len(items)
+
+    def lpush(self, key, *values):
+        with self._lock:
+            items = self._data.setdefault(key, [])
+            for value in values:
+                items.insert(0, self._encode(value))
+            return len(items)
+
+    def lpop(self, key):
+        with self._lock:
+            items = self._data.get(key)
+            return items.pop(0) if items else None
+
+    def llen(self, key):
+        with self._lock:
+            return len(self._data.get(key, []))
+
+    def sadd(self, key, *members):
+        with self._lock:
+            values = self._data.setdefault(key, set())
+            added = {self._encode(m) for m in members} - values
+            values.update(added)
+            return len(added)
+
+    def srem(self, key, *members):
+        with self._lock:
+            values = self._data.get(key, set())
+            removed = {self._encode(m) for m in members} & values
+            values.difference_update(removed)
+            return len(removed)
+
+    def smembers(self, key):
+        with self._lock:
+            return set(self._data.get(key, set()))
@@ -0,0 +1,106 @@
+"""
+测试Ingest模块
+"""
+import codecs
+
+import pytest
+from unittest.mock import patch
+from docx import Document
+
+import Ingest
+
+TEXT = "国务院办公厅印发意见。\n要进一步破除隐性门槛𠀀，推动降低成本😀。"
+
+
+class TestIngest:
+    """测试上传文件的编码检测和文本规范"""
+
+    @pytest.mark.parametrize("data, encoding", [
+        (TEXT.encode('utf-8'), 'utf-8'),
+        (codecs.BOM_UTF8 + TEXT.encode('utf-8'), 'utf-8-sig'),
+        (TEXT.encode('gb18030'), 'gb18030'),
+        (TEXT.encode('utf-16'), 'utf-16'),
+    ])
+    def test_detect_encoding(self, data, encoding):
+        """测试按BOM和UTF-8校验判断编码"""
+        assert Ingest.detect_encoding(data) == encoding
+        assert Ingest.decode(data) == TEXT
+
+    def test_utf16_without_bom(self):
+        """测试没有BOM的UTF-16按空字节的位置判断字节序"""
+        text = "Summary of report 2024: 摘要"
+        assert Ingest.detect_encoding(text.encode('utf-16-le')) == 'utf-16-le'
+        assert Ingest.detect_encoding(text.encode('utf-16-be')) == 'utf-16-be'
+        assert Ingest.decode(text.encode('utf-16-be')) == text
+
+    def test_gbk_after_long_ascii_prefix(self):
+        """测试非ASCII字符出现在很长的ASCII内容之后"""
+        data = b"a" * (Ingest.SAMPLE * 2) + "中文内容".encode('gbk')
+        assert Ingest.detect_encoding(data) == 'gb18030'
+        assert Ingest.decode(data, max_chars=len(data)).endswith("中文内容")
+
+    def test_characters_outside_gbk_kept(self):
+        """测试不再丢弃GBK之外的字符"""
+        assert Ingest.decode(TEXT.encode('utf-8')).count("𠀀") == 1
+
+    def test_normalize_whitespace(self):
+        """测试统一换行、合并行内空白、去掉不可见字符和多余空行"""
+        data = "\ufeff  第一段\t\t内容\u3000\u3000继续\r\n\r\n\r\n\n第二段\x00\u200b \r第三段  \n\n".encode('utf-8')
+        assert Ingest.decode(data) == "第一段 内容 继续\n\n第二段\n第三段"
+
+    def test_chunk_boundaries(self):
+        """测试多字节字符和\\r\\n被分块拆开时解码结果不变"""
+        text = "\r\n".join(f"第{i}行内容" for i in range(200))
+        for encoding in ('utf-8', 'gb18030', 'utf-16'):
+            data = text.encode(encoding)
+            for chunk in (3, 7, 64):
+                with patch('Ingest.CHUNK', chunk):
+                    assert Ingest.decode(data) == text.replace("\r\n", "\n"), (encoding, chunk)
+
+    def test_truncate_stops_reading(self):
+        """测试达到字数后停止读取后面的内容"""
+        consumed = []
+
+        def lines():
+            for i in range(1000):
+                consumed.append(i)
+                yield "一二三四五六七八九十"
+
+        text = Ingest.normalize(lines(), max_chars=25)
+        assert text == "一二三四五六七八九十\n一二三四五六七八九十\n一二三"
+        assert len(consumed) == 3
+
+        # 3MB的文件只解码开头几块
+        decoded = []
+        real = codecs.getincrementaldecoder
+
+        def factory(encoding):
+            def make(errors='strict'):
+                decoder = real(encoding)(errors=errors)
+                decode = decoder.decode
+                decoder.decode = lambda data, final=False: decoded.append(len(data)) or decode(data, final)
+                return decoder
+            return make
+
+        data = ("字" * 1000 + "\n").encode('utf-8') * 1000
+        with patch('Ingest.CHUNK', 1024), patch('Ingest.codecs.getincrementaldecoder', factory):
+            assert len(Ingest.decode(data, max_chars=2000)) == 2000
+        assert sum(decoded) < 32 * 1024
+
+    def test_size_cap(self):
+        """测试超过字节数上限的文件"""
+        with patch('Ingest.Config.INGEST_MAX_BYTES', 10):
+            with pytest.raises(ValueError):
+                Ingest.extract_text("超过十个字节的内容".encode('utf-8'), 'txt')
+
+    def test_docx(self, tmp_path):
+        """测试docx按段落规范和截断"""
+        document = Document()
+        document.add_paragraph("第一段  内容")
+        document.add_paragraph("")
+        document.add_paragraph("第二段" * 10)
+        path = tmp_path / "a.DOCX"
+        document.save(str(path))
+
+        assert Ingest.read_file(str(path)) == "第一段 内容\n" + "第二段" * 10
+        assert Ingest.read_file(str(path), max_chars=10) == "第一段 内容\n第二段"
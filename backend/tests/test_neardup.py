@@ -0,0 +1,80 @@
+"""
+测试NearDup模块
+"""
+import sqlite3
+
+import pytest
+
+import ContentStore
+import Dbconn
+import NearDup
+from tests.test_bgtasks import ARTICLE
+
+
+@pytest.fixture
+def index_db(monkeypatch, tmp_path):
+    db_path = str(tmp_path / "test.sqlite")
+    sqlite3.connect(db_path).close()
+    monkeypatch.setattr('Dbconn.DATABASE', db_path)
+    Dbconn.init()
+    return db_path
+
+
+def _add(content):
+    canonical_id, _ = ContentStore.store(content)
+    return canonical_id, NearDup.check(canonical_id, content)
+
+
+class TestNearDup:
+    """测试SimHash近似重复检测"""
+
+    def test_simhash_distance(self):
+        """测试少量改动的文本距离很近，无关文本距离很远"""
+        edited = ARTICLE.replace("各地区", "各省市")
+        unrelated = "今天天气很好，我们一起去公园散步，看到了很多花，心情非常愉快。" * 3
+
+        assert NearDup.simhash(ARTICLE) == NearDup.simhash(" ".join(ARTICLE))
+        assert NearDup.distance(NearDup.simhash(ARTICLE), NearDup.simhash(edited)) <= 3
+        assert NearDup.distance(NearDup.simhash(ARTICLE), NearDup.simhash(unrelated)) > 10
+
+    def test_bands_cover_threshold(self):
+        """测试距离不超过3的两个指纹至少有一段相同"""
+        value = NearDup.simhash(ARTICLE)
+        flipped = value ^ (1 << 3) ^ (1 << 20) ^ (1 << 40)
+        assert any(a == b for a, b in zip(NearDup.bands(value), NearDup.bands(flipped)))
+
+    def test_check_finds_nearest(self, index_db):
+        """测试检测并索引，排除文档自身和距离超过阈值的内容"""
+        first_id, near = _add(ARTICLE)
+        assert near is None
+
+        edited_id, near = _add(ARTICLE.replace("各地区", "各省市"))
+        assert near[0] == first_id and near[1] == ContentStore.fingerprint(ARTICLE) and near[2] <= 3
+
+        _, near = _add("今天天气很好，我们一起去公园散步，看到了很多花，心情非常愉快。" * 3)
+        assert near is None
+        # 再次检测相同内容时不匹配自身
+        assert NearDup.check(first_id, ARTICLE)[0] == edited_id
+        assert Dbconn.dbGet("SELECT COUNT(*) FROM content_simhash", []) == [(3,)]
+
+    def test_short_text_skipped(self, index_db):
+        """测试过短的文本不检测"""
+        assert _add("短文本")[1] is None
+        assert Dbconn.dbGet("SELECT COUNT(*) FROM content_simhash", []) == [(0,)]
+
+    def test_high_bit_roundtrip(self, index_db):
+        """测试最高位为1的指纹按有符号整数保存后仍能匹配"""
+        canonical_id, _ = ContentStore.store("文档")
+        value = (1 << 63) | 12345
+        Dbconn.dbSet("INSERT INTO content_simhash(canonical_id, simhash, band0, band1, band2, band3) "
+                     "VALUES(?,?,?,?,?,?)", [canonical_id, NearDup._signed(value), *NearDup.bands(value)])
+
+        assert NearDup.find(value ^ 1) == [(canonical_id, ContentStore.fingerprint("文档"), 1)]
+
+    def test_lookup_uses_band_indexes(self, index_db):
+        """测试按段查询使用索引，不扫描全表"""
+        plan = Dbconn.dbGet("EXPLAIN QUERY PLAN SELECT canonical_id FROM content_simhash "
+                            "WHERE band0=? OR band1=? OR band2=? OR band3=?", [1, 2, 3, 4])
+        details = " ".join(row[-1] for row in plan)
+        assert "content_simhash_band0" in details and "content_simhash_band3" in details
+        assert "SCAN content_simhash" not in details
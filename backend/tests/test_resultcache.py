@@ -0,0 +1,83 @@
+"""
+测试ResultCache模块
+"""
+import pytest
+import redis
+
+from ResultCache import ResultCache, normalize
+from tests.test_helper import FakeRedis
+
+
+class TestResultCache:
+    """测试标题/摘要结果缓存"""
+
+    @pytest.fixture
+    def cache(self):
+        return ResultCache(FakeRedis(), ttl=60, max_bytes=300)
+
+    def test_key_normalizes_whitespace(self, cache):
+        """测试仅空白或全角半角不同的文本使用同一个键"""
+        assert normalize(" 测试\n\n内容　ＡＢＣ ") == "测试 内容 ABC"
+        assert cache.key("测试 内容", max_len=3) == cache.key("测试\n内容 ", max_len=3)
+        assert cache.key("测试内容", max_len=3) != cache.key("测试内容", max_len=5)
+
+    def test_hit_rate_and_time_saved(self, cache):
+        """测试命中率和节省时间统计"""
+        key = cache.key("内容")
+        assert cache.get(key) is None
+
+        cache.set(key, {'summary': "摘要", 'title': "标题", 'time_use': 2.5})
+        assert cache.get(key)['summary'] == "摘要"
+        cache.get(key)
+
+        stats = cache.stats()
+        assert stats['hits'] == 2 and stats['misses'] == 1
+        assert stats['hit_rate'] == pytest.approx(2 / 3, abs=1e-3)
+        assert stats['saved_seconds'] == 5.0
+        assert stats['entries'] == 1
+
+    def test_record_fallback(self, cache):
+        """测试未命中后查询其他来源的调用方自行记录命中"""
+        key = cache.key("内容")
+        assert cache.get(key, record=False) is None
+        cache.record({'summary': "摘要", 'title': "标题", 'time_use': 1.5})
+        assert cache.get(key, record=False) is None
+        cache.record(None)
+
+        stats = cache.stats()
+        assert stats['hits'] == 1 and stats['misses'] == 1
+        assert stats['saved_seconds'] == 1.5
+
+    def test_evicts_oldest_over_memory_cap(self, cache):
+        """测试超过字节上限时淘汰最早写入的条目"""
+        keys = [cache.key(f"内容{i}") for i in range(6)]
+        for key in keys:
+            cache.set(key, {'summary': "摘要" * 10, 'title': "标题", 'time_use': 1.0})
+
+        stats = cache.stats()
+        assert stats['bytes'] <= 300
+        assert 0 < stats['entries'] < 6
+        assert cache.get(keys[0]) is None
+        assert cache.get(keys[-1]) is not None
+
+    def test_overwrite_keeps_byte_count(self, cache):
+        """测试覆盖同一条目不重复计算字节数"""
+        key = cache.key("内容")
+        for _ in range(3):
+            cache.set(key, {'summary': "摘要", 'title': "标题", 'time_use': 1.0})
+
+        assert cache.stats()['entries'] == 1
+        assert cache.stats()['bytes'] < 100
+
+    def test_redis_unavailable_is_miss(self):
+        """测试Redis不可用时视为未命中"""
+        class BrokenRedis:
+            def __getattr__(self, name):
+                def fail(*args, **kwargs):
+                    raise redis.exceptions.ConnectionError("down")
+                return fail
+
+        cache = ResultCache(BrokenRedis())
+        assert cache.get(cache.key("内容")) is None
+        cache.set(cache.key("内容"), {'summary': "摘要", 'title': "标题", 'time_use': 1.0})
+        assert cache.stats() is None
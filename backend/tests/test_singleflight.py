@@ -0,0 +1,91 @@
+"""
+测试SingleFlight模块
+"""
+import threading
+import time
+
+import pytest
+import redis
+
+from SingleFlight import RedisSingleFlight, make_key
+from tests.test_helper import FakeRedis
+
+
+class TestSingleFlight:
+    """测试跨worker的相同请求合并"""
+
+    def test_make_key(self):
+        """测试合并键由内容和参数决定"""
+        assert make_key('summary', '内容', max_len=150) == make_key('summary', '内容', max_len=150)
+        assert make_key('summary', '内容', max_len=150) != make_key('summary', '内容', max_len=100)
+        assert make_key('summary', '内容') != make_key('title', '内容')
+
+    def test_concurrent_workers_share_result(self):
+        """测试并发的相同请求只调用一次GPU节点"""
+        client = FakeRedis()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def work():
+            calls.append(1)
+            release.wait(2)
+            return {'ret0': '摘要'}
+
+        def worker():
+            # 每个worker使用独立的实例，只共享Redis
+            results.append(RedisSingleFlight(client, poll_interval=0.01).do('k', work))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        time.sleep(0.2)
+        release.set()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert results == [{'ret0': '摘要'}] * 4
+
+    def test_no_result_kept_after_completion(self):
+        """测试计算完成后不缓存结果"""
+        flight = RedisSingleFlight(FakeRedis())
+        counter = iter(range(10))
+
+        assert flight.do('k', lambda: next(counter)) == 0
+        assert flight.do('k', lambda: next(counter)) == 1
+
+    def test_leader_error_propagates(self):
+        """测试计算失败时等待者收到错误"""
+        client = FakeRedis()
+        flight = RedisSingleFlight(client, poll_interval=0.01)
+        client.set('zhiwen:flight:lock:k', 'other')
+
+        def leader_fails():
+            time.sleep(0.05)
+            client.set('zhiwen:flight:lock:k:other', '{"error": "GPU节点错误"}')
+            client.delete('zhiwen:flight:lock:k')
+
+        threading.Thread(target=leader_fails).start()
+        with pytest.raises(RuntimeError, match='GPU节点错误'):
+            flight.do('k', lambda: 'unused')
+
+    def test_expired_lock_not_released(self):
+        """测试锁过期后被其他worker抢到时，原持有者结束计算不会删除新持有者的锁"""
+        client = FakeRedis()
+        flight = RedisSingleFlight(client)
+
+        def slow():
+            # 模拟锁在计算期间过期并被其他worker抢到
+            client.set('zhiwen:flight:lock:k', 'next-leader')
+            return 'done'
+
+        assert flight.do('k', slow) == 'done'
+        assert client.get('zhiwen:flight:lock:k') == b'next-leader'
+
+    def test_redis_unavailable_falls_back(self):
+        """测试Redis不可用时直接计算"""
+        client = FakeRedis()
+        client.set = lambda *args, **kwargs: (_ for _ in ()).throw(redis.exceptions.ConnectionError())
+
+        assert RedisSingleFlight(client).do('k', lambda: 'direct') == 'direct'
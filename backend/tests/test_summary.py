@@ -4,7 +4,8 @@
 import pytest
 import json
 import requests_mock
-from Summary import summary, title
+from Summary import summary, title, batch, make_deadline, INTERACTIVE, BATCH
+from GpuClient import GpuNodeError
 from Common import Config
 
 class TestSummary:
@@ -69,3 +70,70 @@ class TestSummary:
             assert result["ret1"] == "测试标题2"
             assert "ret2" in result
             assert result["ret2"] == "测试标题3"
+
+    def test_priority_header(self):
+        """测试调度优先级通过X-Priority请求头传递"""
+        with requests_mock.Mocker() as m:
+            gpu_url = list(Config.GPU_Node.values())[0]
+            m.post(f"{gpu_url}/summarize", json={"summary": ["摘要1", "摘要2", "摘要3"]})
+            m.post(f"{gpu_url}/title", json={"title": ["标题1", "标题2", "标题3"]})
+
+            summary("测试文本", 100)
+            assert m.request_history[-1].headers['X-Priority'] == INTERACTIVE
+
+            title("测试文本", priority=BATCH)
+            assert m.request_history[-1].headers['X-Priority'] == BATCH
+
+    def test_deadline_header(self):
+        """测试截止时间以剩余毫秒数传递"""
+        with requests_mock.Mocker() as m:
+            gpu_url = list(Config.GPU_Node.values())[0]
+            m.post(f"{gpu_url}/title", json={"title": ["标题1", "标题2", "标题3"]})
+
+            title("测试文本", deadline=make_deadline(10), allow_partial=True)
+
+            headers = m.request_history[-1].headers
+            margin = Config.GPU_DEADLINE_MARGIN * 1000
+            assert 9000 - margin < int(headers['X-Deadline-Ms']) <= 10000 - margin
+            assert headers['X-Allow-Partial'] == '1'
+            assert 9 < m.request_history[-1].timeout[1] <= 10
+
+    def test_partial_title(self):
+        """测试读取X-Partial响应头标记部分解码的标题"""
+        with requests_mock.Mocker() as m:
+            gpu_url = list(Config.GPU_Node.values())[0]
+            m.post(f"{gpu_url}/title", json={"title": ["标题1", "标题2", "标题3"]}, headers={'X-Partial': '1'})
+            assert title("测试文本", allow_partial=True)['partial'] is True
+
+            m.post(f"{gpu_url}/title", json={"title": ["标题1", "标题2", "标题3"]}, headers={'X-Partial': '0'})
+            assert 'partial' not in title("测试文本")
+
+    def test_batch_function(self):
+        """测试批量请求返回每篇文档的结果，单篇失败返回异常"""
+        with requests_mock.Mocker() as m:
+            gpu_url = list(Config.GPU_Node.values())[0]
+            m.post(f"{gpu_url}/batch", json={"results": [
+                {"summary": ["摘要1", "摘要2", "摘要3"], "title": ["标题1", "标题2", "标题3"]},
+                {"error": "Text cannot be empty or whitespace only"},
+            ]})
+
+            result = batch(["文本一", " "])
+
+            assert result[0] == ({'ret0': "摘要1", 'ret1': "摘要2", 'ret2': "摘要3"},
+                                 {'ret0': "标题1", 'ret1': "标题2", 'ret2': "标题3"})
+            assert isinstance(result[1], GpuNodeError)
+            assert m.request_history[-1].headers['X-Priority'] == BATCH
+
+    def test_batch_read_timeout_follows_deadline(self):
+        """测试批量请求实际传给requests的读取超时随GPU_BATCH_DEADLINE延长，不受GPU_READ_TIMEOUT限制"""
+        with requests_mock.Mocker() as m:
+            m.post(f"{list(Config.GPU_Node.values())[0]}/batch", json={"results": []})
+
+            batch(["内容"], deadline=make_deadline(Config.GPU_BATCH_DEADLINE))
+
+            request = m.request_history[0]
+            connect_timeout, read_timeout = request.timeout
+            assert connect_timeout == Config.GPU_CONNECT_TIMEOUT
+            assert Config.GPU_BATCH_DEADLINE - 1 < read_timeout <= Config.GPU_BATCH_DEADLINE
+            # 节点的截止时间仍早于本地读取超时
+            assert int(request.headers['X-Deadline-Ms']) < read_timeout * 1000
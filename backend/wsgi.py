@@ -0,0 +1,8 @@
+"""
+uwsgi入口
+启动时先创建新增的表和列，再加载接口服务；导入app模块本身不修改数据库
+"""
+import Dbconn
+from app import app
+
+Dbconn.init()
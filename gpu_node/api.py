@@ -1,9 +1,19 @@
+import functools
+import hmac
+
 from core import generate_summary
 from flask_cors import CORS
 from flask import Flask, jsonify, request
-from pynvml import *
 
-from core import generator
+from core.device_stats import DeviceSampler
+from core.singleflight import SingleFlight, make_key
+from core.scheduler import PriorityScheduler
+from core.registry import ModelRegistry
+from core.deadline import Deadline, DeadlineExceeded
+from core.codec import decode_body, respond
+from core.title import MODEL_PATH, VOCAB_PATH
+from core.title.title import TitleGenerator
+from config import Config
 
 app = Flask(__name__)
 
@@ -34,16 +44,78 @@ CORS_CONFIG = {
 
 CORS(app, resources=CORS_CONFIG)
 
+# 设备状态由后台线程采样，接口只读取缓存
+device_sampler = DeviceSampler(
+    interval=Config.DEVICE_SAMPLE_INTERVAL,
+    history=Config.DEVICE_SAMPLE_HISTORY,
+    window=Config.DEVICE_SAMPLE_WINDOW
+)
+device_sampler.start()
+
+# 合并并发的相同请求
+flight = SingleFlight()
+
+# 交互请求和批量请求分道调度，优先级由后端通过X-Priority请求头指定
+scheduler = PriorityScheduler(
+    policy=Config.SCHEDULER_POLICY,
+    weights=Config.SCHEDULER_WEIGHTS,
+    workers=Config.SCHEDULER_WORKERS
+)
+
+# 标题模型注册表，启动时加载的模型作为默认模型；
+# 模型只由注册表持有，不保存模块级引用，被替换或淘汰后才能释放显存
+registry = ModelRegistry(
+    loader=lambda model_path, vocab_path: TitleGenerator(model_path=model_path, vocab_path=vocab_path,
+                                                         device=Config.MODEL_DEVICE),
+    max_bytes=Config.MODEL_REGISTRY_MAX_BYTES,
+    warmup_text=Config.MODEL_WARMUP_TEXT,
+    drain_timeout=Config.MODEL_DRAIN_TIMEOUT
+)
+registry.register(Config.DEFAULT_MODEL_NAME, registry.loader(MODEL_PATH, VOCAB_PATH), activate=True,
+                  source=MODEL_PATH)
+
+
+def admin_required(func):
+    """模型管理接口需要在Authorization请求头中携带Config.ADMIN_TOKEN，未配置令牌时禁用"""
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        token = request.headers.get('Authorization', '')
+        if token.startswith('Bearer '):
+            token = token[len('Bearer '):]
+        if not Config.ADMIN_TOKEN or not hmac.compare_digest(token.encode(), Config.ADMIN_TOKEN.encode()):
+            return jsonify({"error": "Unauthorized"}), 401
+        return func(*args, **kwargs)
+
+    return inner
+
+
+def _schedule(text, fn):
+    """按请求优先级排队执行，同一车道内短文本优先"""
+    return scheduler.run(request.headers.get('X-Priority'), len(text), fn)
+
+
+def _title(model, text, sentences, deadline, allow_partial):
+    """
+    生成标题
+    Returns:
+        (titles, partial): 允许部分结果时超时不抛出异常，生成结束时已超时说明只解码了一部分；
+        由执行计算的请求判断，共享结果的请求使用相同的标记
+    """
+    titles = model.generate(text, sentences, deadline=deadline, allow_partial=allow_partial)
+    return titles, allow_partial and deadline is not None and deadline.expired()
+
 
 @app.route('/title', methods=['POST'])
 def title():
     """
     RESTful标题接口
+    请求体可以是JSON或msgpack（按Content-Type），可用gzip/zstd压缩
 
     请求格式：
         {
             "text": "需要摘要的文本内容",
-            "sentences": 可选参数，标题数（默认3）
+            "sentences": 可选参数，标题数（默认3）,
+            "model": 可选参数，模型名（默认当前激活模型）
         }
 
     响应格式：
@@ -53,20 +125,34 @@ def title():
     """
     try:
         # 参数验证
-        data = request.get_json()
+        data = decode_body(request, Config.MAX_BODY_BYTES)
         if not data or 'text' not in data:
             return jsonify({"error": "Missing required parameter 'text'"}), 400
 
         text = data['text']
         sentences = int(data.get('sentences', 3))
 
-        # 生成摘要
-        title = generator.generate(text, sentences)
+        # 截止时间由后端传入，交互请求可要求超时时返回已解码的部分候选
+        deadline = Deadline.from_headers(request.headers)
+        allow_partial = request.headers.get('X-Allow-Partial') == '1'
+
+        # 生成标题，相同的并发请求共享同一次计算；车道对应不同的截止时间，
+        # 合并键包含车道和是否接受部分结果，批量请求不会拿到交互请求的部分结果或超时错误
+        with registry.acquire(data.get('model')) as (model_name, model):
+            (title, partial), shared = flight.do(
+                make_key('title', text, sentences=sentences, model=model_name, partial=allow_partial,
+                         lane=request.headers.get('X-Priority')),
+                lambda: _schedule(text, lambda: _title(model, text, sentences, deadline, allow_partial)))
         result = {
             "title": title
         }
-        return jsonify(result), 200
+        return respond(request, result, 200, {'X-Coalesced': str(int(shared)), 'X-Model': model_name,
+                                              'X-Partial': str(int(partial))})
 
+    except DeadlineExceeded as e:
+        return jsonify({"error": str(e)}), 504
+    except KeyError as e:
+        return jsonify({"error": f"Unknown model {e}"}), 404
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     except Exception:
@@ -77,6 +163,7 @@ def title():
 def summarize():
     """
     RESTful文本摘要接口
+    请求体可以是JSON或msgpack（按Content-Type），可用gzip/zstd压缩
 
     请求格式：
         {
@@ -91,10 +178,7 @@ def summarize():
         }
     """
     try:
-        if request.headers.get('Content-Type', '').lower() != 'application/json':
-            return jsonify({"error": "Content-Type must be application/json"}), 400
-
-        data = request.get_json()
+        data = decode_body(request, Config.MAX_BODY_BYTES)
         if not data or 'text' not in data:
             return jsonify({"error": "Missing required parameter 'text'"}), 400
 
@@ -110,12 +194,18 @@ def summarize():
         if sentences <= 0:
             return jsonify({"error": "Sentences count must be a positive integer"}), 400
 
-        summary = generate_summary(text, sentences)
-        return jsonify({
+        deadline = Deadline.from_headers(request.headers)
+        summary, shared = flight.do(make_key('summarize', text, sentences=sentences,
+                                             lane=request.headers.get('X-Priority')),
+                                    lambda: _schedule(text, lambda: generate_summary(text, sentences,
+                                                                                     deadline=deadline)))
+        return respond(request, {
             "summary": summary,
             "sentence_count": len(summary)
-        }), 200
+        }, 200, {'X-Coalesced': str(int(shared))})
 
+    except DeadlineExceeded as e:
+        return jsonify({"error": str(e)}), 504
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
@@ -123,59 +213,131 @@ def summarize():
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route('/nvidia_info', methods=['GET'])
-def nvidia_info():
-    nvidia_dict = {
-        "state": True,
-        "nvidia_version": "",
-        "nvidia_count": 0,
-        "gpus": []
+def _batch_item(model, text, sentences, deadline):
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("Text cannot be empty or whitespace only")
+    return {
+        "summary": generate_summary(text.strip(), sentences, deadline=deadline),
+        "title": model.generate(text, sentences, deadline=deadline),
     }
+
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """
+    批量标题+摘要接口，压缩包等批量任务一次请求处理多篇文档
+    每篇文档单独进入调度队列（交互请求仍可插队），单篇失败不影响其他文档
+
+    请求格式：
+        {
+            "texts": ["文本1", "文本2", ...],
+            "sentences": 可选参数，标题数和摘要句子数（默认3）,
+            "model": 可选参数，模型名（默认当前激活模型）
+        }
+
+    响应格式：
+        {
+            "results": [{"title": [...], "summary": [...]} 或 {"error": "错误信息"}, ...]
+        }
+    """
     try:
-        # 初始化NVML
-        nvmlInit()
-        nvidia_dict["nvidia_version"] = nvmlSystemGetDriverVersion()
-        nvidia_dict["nvidia_count"] = nvmlDeviceGetCount()
-        
-        for i in range(nvidia_dict["nvidia_count"]):
-            handle = nvmlDeviceGetHandleByIndex(i)
-            memory_info = nvmlDeviceGetMemoryInfo(handle)
-            
-            # 显存占用率 (新增)
-            memory_usage = round(memory_info.used / memory_info.total * 100, 1)
-            
-            # GPU计算单元利用率 (新增)
-            utilization = nvmlDeviceGetUtilizationRates(handle)
-            gpu_usage = utilization.gpu
-            
-            # 温度、功率状态等原有数据
-            gpu = {
-                "gpu_name": nvmlDeviceGetName(handle),
-                "total": memory_info.total,
-                "free": memory_info.free,
-                "used": memory_info.used,
-                "memory_usage_percent": memory_usage,  # 显存占用百分比
-                "gpu_usage_percent": gpu_usage,        # GPU计算核心占用率
-                "temperature": f"{nvmlDeviceGetTemperature(handle, 0)}℃",
-                "powerStatus": nvmlDeviceGetPowerState(handle)
-            }
-            nvidia_dict['gpus'].append(gpu)
-            
-    except NVMLError as e:
-        nvidia_dict["state"] = False
-        # 可选：记录错误日志
-        app.logger.error(f"NVML error: {str(e)}")
+        data = decode_body(request, Config.MAX_BODY_BYTES)
+        texts = data.get('texts') if isinstance(data, dict) else None
+        if not isinstance(texts, list) or not texts:
+            return jsonify({"error": "Missing required parameter 'texts'"}), 400
+        if len(texts) > Config.MAX_BATCH_SIZE:
+            return jsonify({"error": f"At most {Config.MAX_BATCH_SIZE} texts per batch"}), 400
+        sentences = int(data.get('sentences', 3))
+
+        deadline = Deadline.from_headers(request.headers)
+        lane = request.headers.get('X-Priority')
+        with registry.acquire(data.get('model')) as (model_name, model):
+            futures = [scheduler.submit(lane, len(text) if isinstance(text, str) else 0,
+                                        lambda text=text: _batch_item(model, text, sentences, deadline))
+                       for text in texts]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append({"error": str(e) or type(e).__name__})
+        return respond(request, {"results": results}, 200, {'X-Model': model_name})
+
+    except KeyError as e:
+        return jsonify({"error": f"Unknown model {e}"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        nvidia_dict["state"] = False
-        # 可选：记录通用错误日志
-        # app.logger.error(f"Unexpected error: {str(e)}")
-    finally:
-        try:
-            nvmlShutdown()
-        except:
-            pass
-    # print(nvidia_dict)
-    return nvidia_dict
+        app.logger.error(f"Batch generation failed: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route('/nvidia_info', methods=['GET'])
+def nvidia_info():
+    """
+    返回后台采样器缓存的设备状态快照及短窗口平均值（时间单位：微秒）
+    """
+    return jsonify(device_sampler.snapshot())
+
+
+@app.route('/models', methods=['GET'])
+def models():
+    """
+    已驻留模型、正在加载和排空中的模型
+    """
+    return jsonify(registry.status())
+
+
+@app.route('/models/load', methods=['POST'])
+@admin_required
+def load_model():
+    """
+    后台加载并预热checkpoint，完成后按需切换流量；加载前先淘汰非激活模型腾出内存
+    需要管理令牌：Authorization: Bearer <ADMIN_TOKEN>
+
+    请求格式：
+        {
+            "name": "模型名",
+            "model_path": "checkpoint目录",
+            "vocab_path": 可选参数，词表目录（默认内置词表）,
+            "activate": 可选参数，加载完成后是否切换默认流量（默认true）
+        }
+    """
+    data = request.get_json()
+    if not data or 'name' not in data or 'model_path' not in data:
+        return jsonify({"error": "Missing required parameter 'name' or 'model_path'"}), 400
+    try:
+        registry.load(data['name'], data['model_path'], data.get('vocab_path', VOCAB_PATH),
+                      activate=bool(data.get('activate', True)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(registry.status()), 202
+
+
+@app.route('/models/activate', methods=['POST'])
+@admin_required
+def activate_model():
+    """
+    把默认流量切换到已驻留的模型
+    需要管理令牌：Authorization: Bearer <ADMIN_TOKEN>
+    """
+    data = request.get_json()
+    if not data or 'name' not in data:
+        return jsonify({"error": "Missing required parameter 'name'"}), 400
+    try:
+        registry.activate(data['name'])
+    except KeyError as e:
+        return jsonify({"error": f"Unknown model {e}"}), 404
+    return jsonify(registry.status()), 200
+
+
+@app.route('/lane_stats', methods=['GET'])
+def lane_stats():
+    """
+    各优先级车道的排队数和延迟分位数
+    """
+    return jsonify(scheduler.stats())
+
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=3000, debug=True)
@@ -0,0 +1,29 @@
+import os
+
+
+class Config:
+    # 设备状态采样
+    DEVICE_SAMPLE_INTERVAL = 1.0  # 采样间隔（秒）
+    DEVICE_SAMPLE_HISTORY = 120  # 环形缓冲区保留的样本数
+    DEVICE_SAMPLE_WINDOW = 10  # 短窗口平均使用的样本数
+
+    # 优先级调度：'strict' 严格优先级，'weighted' 加权轮转
+    SCHEDULER_POLICY = 'weighted'
+    SCHEDULER_WEIGHTS = {'interactive': 8, 'batch': 1}
+    SCHEDULER_WORKERS = 1  # 同时执行的生成任务数
+
+    # 模型注册表
+    DEFAULT_MODEL_NAME = 'default'
+    MODEL_REGISTRY_MAX_BYTES = 4 * 1024 ** 3  # 驻留模型总大小上限
+    MODEL_WARMUP_TEXT = "人工智能是计算机科学的一个分支。"
+    MODEL_DEVICE = "cuda:0"
+    MODEL_DRAIN_TIMEOUT = 30  # 加载前等待被淘汰的模型排空的最长时间（秒）
+
+    # 模型管理接口（/models/load、/models/activate）的令牌，未设置时这两个接口不可用
+    ADMIN_TOKEN = os.environ.get('GPU_NODE_ADMIN_TOKEN')
+
+    # 请求体解压后的最大字节数
+    MAX_BODY_BYTES = 32 * 1024 * 1024
+
+    # /batch接口单次请求的最大文档数
+    MAX_BATCH_SIZE = 128
@@ -1,2 +1,2 @@
 from .summary import generate_summary
-from .title import generator
+from .title import load_generator
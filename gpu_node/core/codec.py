@@ -0,0 +1,87 @@
+"""
+请求/响应编码
+按Content-Type协商请求体格式：application/json（前端和测试使用）或application/msgpack
+（后端客户端使用，中文文本无需转义）；大文本请求体可使用Content-Encoding: gzip或zstd压缩。
+请求头Accept包含application/msgpack时响应也使用msgpack，否则返回JSON。
+msgpack和zstandard为可选依赖，未安装时只支持JSON和gzip。
+"""
+import io
+import json
+import zlib
+
+from flask import Response, jsonify
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+MSGPACK_TYPES = (MSGPACK, 'application/x-msgpack')
+
+
+def _gunzip(raw, limit):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(raw, limit + 1)
+    if len(data) > limit:
+        raise ValueError("Decompressed body too large")
+    return data
+
+
+def _unzstd(raw, limit):
+    if zstandard is None:
+        raise ValueError("Content-Encoding 'zstd' is not supported")
+    data = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(raw)).read(limit + 1)
+    if len(data) > limit:
+        raise ValueError("Decompressed body too large")
+    return data
+
+
+def decode_body(request, limit):
+    """
+    解码请求体
+    Args:
+        limit: 解压后的最大字节数，防止压缩炸弹
+    Raises:
+        ValueError: 不支持的Content-Type/Content-Encoding或请求体格式错误
+    """
+    raw = request.get_data()
+    encoding = (request.headers.get('Content-Encoding') or 'identity').lower()
+    if encoding == 'gzip':
+        raw = _gunzip(raw, limit)
+    elif encoding == 'zstd':
+        raw = _unzstd(raw, limit)
+    elif encoding != 'identity':
+        raise ValueError(f"Unsupported Content-Encoding '{encoding}'")
+
+    if request.mimetype in MSGPACK_TYPES:
+        if msgpack is None:
+            raise ValueError("Content-Type 'application/msgpack' is not supported")
+        try:
+            return msgpack.unpackb(raw, raw=False)
+        except Exception as e:
+            raise ValueError(f"Invalid msgpack body: {e}")
+    if request.mimetype == JSON:
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON body: {e}")
+    raise ValueError("Content-Type must be application/json or application/msgpack")
+
+
+def accepts_msgpack(request):
+    return msgpack is not None and any(m in MSGPACK_TYPES for m in request.accept_mimetypes.values())
+
+
+def respond(request, payload, status=200, headers=None):
+    """按请求的Accept头编码响应"""
+    if accepts_msgpack(request):
+        return Response(msgpack.packb(payload, use_bin_type=True), status=status, headers=headers,
+                        mimetype=MSGPACK)
+    return jsonify(payload), status, headers or {}
@@ -0,0 +1,45 @@
+"""
+请求截止时间
+后端通过X-Deadline-Ms请求头传递剩余时间（毫秒，相对值可避免两端时钟不一致），
+解码循环和摘要生成在各步骤之间检查，超时后立即停止，不再为已放弃的请求计算。
+"""
+import time
+
+
+class DeadlineExceeded(Exception):
+    """请求已超过截止时间"""
+
+
+class Deadline:
+    """
+    截止时间
+    Args:
+        timeout: 剩余秒数，None表示不限
+    """
+
+    def __init__(self, timeout=None, clock=time.monotonic):
+        self.clock = clock
+        self.at = None if timeout is None else clock() + timeout
+
+    @classmethod
+    def from_headers(cls, headers):
+        """从请求头解析截止时间，没有或格式错误时返回None"""
+        value = headers.get('X-Deadline-Ms')
+        if value is None:
+            return None
+        try:
+            return cls(int(value) / 1000)
+        except ValueError:
+            return None
+
+    def remaining(self):
+        if self.at is None:
+            return None
+        return self.at - self.clock()
+
+    def expired(self):
+        return self.at is not None and self.clock() >= self.at
+
+    def check(self, stage="request"):
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
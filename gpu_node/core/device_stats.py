@@ -0,0 +1,180 @@
+"""
+设备状态后台采样
+由后台线程按固定间隔轮询NVML（无GPU时回退到psutil），结果写入环形缓冲区，
+接口只读取缓存的快照，不再在每次请求时初始化/关闭NVML。
+"""
+import threading
+import time
+from collections import deque
+
+import psutil
+
+
+class NvmlProvider:
+    """基于NVML的GPU状态采集，nvml参数可注入假实现用于测试"""
+    source = "nvml"
+
+    def __init__(self, nvml=None):
+        if nvml is None:
+            import pynvml as nvml
+        self.nvml = nvml
+
+    def open(self):
+        self.nvml.nvmlInit()
+
+    def close(self):
+        try:
+            self.nvml.nvmlShutdown()
+        except Exception:
+            pass
+
+    def read(self):
+        nvml = self.nvml
+        info = {
+            "nvidia_version": nvml.nvmlSystemGetDriverVersion(),
+            "nvidia_count": nvml.nvmlDeviceGetCount(),
+            "gpus": []
+        }
+        for i in range(info["nvidia_count"]):
+            handle = nvml.nvmlDeviceGetHandleByIndex(i)
+            memory_info = nvml.nvmlDeviceGetMemoryInfo(handle)
+            utilization = nvml.nvmlDeviceGetUtilizationRates(handle)
+            info["gpus"].append({
+                "gpu_name": nvml.nvmlDeviceGetName(handle),
+                "total": memory_info.total,
+                "free": memory_info.free,
+                "used": memory_info.used,
+                "memory_usage_percent": round(memory_info.used / memory_info.total * 100, 1),  # 显存占用百分比
+                "gpu_usage_percent": utilization.gpu,  # GPU计算核心占用率
+                "temperature": f"{nvml.nvmlDeviceGetTemperature(handle, 0)}℃",
+                "powerStatus": nvml.nvmlDeviceGetPowerState(handle)
+            })
+        return info
+
+
+class PsutilProvider:
+    """无GPU时的回退采集，只提供CPU和内存占用"""
+    source = "psutil"
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self):
+        return {
+            "nvidia_version": "",
+            "nvidia_count": 0,
+            "gpus": []
+        }
+
+
+class DeviceSampler:
+    """
+    后台设备采样器
+    Args:
+        provider: 采集器，默认优先NVML，初始化失败时回退到psutil
+        interval: 采样间隔（秒）
+        history: 环形缓冲区容量
+        window: 短窗口平均使用的样本数
+    """
+
+    def __init__(self, provider=None, interval=1.0, history=120, window=10, fallback=None):
+        self.provider = provider
+        self.fallback = fallback or PsutilProvider()
+        self.interval = interval
+        self.window = window
+        self.samples = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._opened = False
+
+    def _open(self):
+        if self._opened:
+            return
+        try:
+            if self.provider is None:
+                self.provider = NvmlProvider()
+            self.provider.open()
+        except Exception:
+            # 没有GPU或驱动不可用
+            self.provider = self.fallback
+            self.provider.open()
+        self._opened = True
+
+    def sample_once(self):
+        """采集一次并写入缓冲区"""
+        self._open()
+        start = time.perf_counter()
+        sample = {"state": True, "source": self.provider.source}
+        try:
+            sample.update(self.provider.read())
+        except Exception as e:
+            sample.update({"state": False, "error": str(e), "nvidia_version": "", "nvidia_count": 0, "gpus": []})
+        if self.provider.source != "nvml":
+            sample["state"] = False
+        sample["cpu_percent"] = psutil.cpu_percent(None)
+        sample["mem_percent"] = psutil.virtual_memory().percent
+        sample["sample_cost_us"] = int((time.perf_counter() - start) * 1000000)
+        sample["sampled_at"] = time.time()
+        sample["_mono"] = time.monotonic()
+        with self._lock:
+            self.samples.append(sample)
+        return sample
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sample_once()
+            except Exception:
+                pass
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="device-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        if self._opened:
+            self.provider.close()
+            self._opened = False
+
+    def snapshot(self):
+        """
+        返回最新样本及短窗口平均值，时间相关字段单位为微秒
+        """
+        with self._lock:
+            recent = list(self.samples)[-self.window:]
+        if not recent:
+            recent = [self.sample_once()]
+
+        latest = dict(recent[-1])
+        mono = latest.pop("_mono")
+        latest["age_us"] = int((time.monotonic() - mono) * 1000000)
+
+        gpu_usage = []
+        memory_usage = []
+        for i in range(len(latest["gpus"])):
+            values = [s["gpus"][i] for s in recent if len(s["gpus"]) > i]
+            gpu_usage.append(round(sum(v["gpu_usage_percent"] for v in values) / len(values), 1))
+            memory_usage.append(round(sum(v["memory_usage_percent"] for v in values) / len(values), 1))
+
+        latest["window"] = {
+            "samples": len(recent),
+            "span_us": int((mono - recent[0]["_mono"]) * 1000000),
+            "sample_cost_us": int(sum(s["sample_cost_us"] for s in recent) / len(recent)),
+            "gpu_usage_percent": gpu_usage,
+            "memory_usage_percent": memory_usage,
+            "cpu_percent": round(sum(s["cpu_percent"] for s in recent) / len(recent), 1),
+            "mem_percent": round(sum(s["mem_percent"] for s in recent) / len(recent), 1),
+        }
+        return latest
@@ -0,0 +1,231 @@
+"""
+模型注册表
+支持后台加载并预热新checkpoint后原子切换流量，旧版本在处理中的请求完成后再释放；
+多个命名模型可同时驻留，按显存占用上限进行LRU淘汰，请求可按名称选择模型做A/B对比。
+加载新模型前先淘汰并等待排空，使新旧模型同时驻留时的峰值也不超过上限。
+"""
+import gc
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def _param_bytes(generator):
+    """估算模型参数占用的字节数"""
+    try:
+        return sum(p.numel() * p.element_size() for p in generator.model.parameters())
+    except Exception:
+        return 0
+
+
+def _release(name):
+    """
+    释放模型占用的显存
+    调用前注册表已去掉对模型的所有引用；先回收模型对象（含循环引用），缓存的显存块才能归还给驱动
+    """
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+
+
+class _Entry:
+    def __init__(self, name, generator, size, source=None):
+        self.name = name
+        self.generator = generator
+        self.size = size
+        self.source = source
+        self.inflight = 0
+        self.retired = False
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+
+
+class ModelRegistry:
+    """
+    命名模型注册表
+    Args:
+        loader: loader(model_path, vocab_path) 返回生成器对象
+        max_bytes: 驻留模型的总字节上限，None表示不限制
+        warmup_text: 加载后用于预热的文本
+        sizer: 估算模型大小的函数
+        releaser: 模型被淘汰并排空后以模型名调用的释放函数，调用时注册表已不再引用该模型
+        drain_timeout: 加载前等待被淘汰的模型排空的最长时间（秒）
+    """
+
+    def __init__(self, loader=None, max_bytes=None, warmup_text="预热", sizer=_param_bytes, releaser=_release,
+                 drain_timeout=30):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.warmup_text = warmup_text
+        self.sizer = sizer
+        self.releaser = releaser
+        self.drain_timeout = drain_timeout
+        self.active = None
+        self._entries = OrderedDict()
+        self._retired = []
+        self._loading = {}
+        # 模型释放时通知等待腾出内存的加载线程
+        self._lock = threading.Condition()
+
+    def register(self, name, generator, activate=False, source=None):
+        """注册已加载的模型，同名旧版本退役并在排空后释放"""
+        entry = _Entry(name, generator, self.sizer(generator), source)
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None:
+                self._retire(old)
+            self._entries[name] = entry
+            if activate or self.active is None:
+                self.active = name
+            self._evict()
+        return entry
+
+    def load(self, name, model_path, vocab_path, activate=True, background=True):
+        """
+        加载checkpoint并预热，完成后注册；background为True时在后台线程中进行
+        """
+        with self._lock:
+            if self._loading.get(name) == 'loading':
+                raise ValueError(f"Model '{name}' is already loading")
+            self._loading[name] = 'loading'
+
+        def work():
+            try:
+                self._reserve(name)
+                generator = self.loader(model_path, vocab_path)
+                if self.warmup_text:
+                    generator.generate(self.warmup_text, 1)
+                self.register(name, generator, activate=activate, source=model_path)
+            except Exception as e:
+                with self._lock:
+                    self._loading[name] = f"failed: {e}"
+            else:
+                with self._lock:
+                    self._loading.pop(name, None)
+
+        if background:
+            thread = threading.Thread(target=work, name=f"model-load-{name}", daemon=True)
+            thread.start()
+            return thread
+        work()
+        return None
+
+    def _reserve(self, name):
+        """
+        加载前腾出内存：按LRU淘汰非激活模型，并等待被淘汰的模型排空释放
+        新模型的大小按同名旧版本估算，没有时按激活模型估算（同一结构的checkpoint大小相同）
+        Raises:
+            MemoryError: 淘汰所有非激活模型并等待排空后仍放不下
+        """
+        if self.max_bytes is None:
+            return
+        deadline = time.monotonic() + self.drain_timeout
+        with self._lock:
+            same = self._entries.get(name) or self._entries.get(self.active)
+            size = same.size if same is not None else 0
+            # 同名的非激活旧版本加载后会被替换，最先淘汰
+            if name in self._entries and name != self.active:
+                self._retire(self._entries.pop(name))
+            for other in list(self._entries):
+                if self._resident_bytes() + size <= self.max_bytes:
+                    break
+                if other != self.active:
+                    self._retire(self._entries.pop(other))
+            while self._resident_bytes() + size > self.max_bytes:
+                remaining = deadline - time.monotonic()
+                if not self._retired or remaining <= 0:
+                    raise MemoryError(f"Not enough memory to load '{name}': "
+                                      f"{self._resident_bytes()} + {size} > {self.max_bytes} bytes")
+                self._lock.wait(remaining)
+
+    def activate(self, name):
+        """把默认流量原子切换到指定模型"""
+        with self._lock:
+            if name not in self._entries:
+                raise KeyError(name)
+            self.active = name
+
+    @contextmanager
+    def acquire(self, name=None):
+        """
+        获取模型用于一次请求，期间模型不会被释放
+        Yields:
+            (name, generator)
+        """
+        with self._lock:
+            name = name or self.active
+            entry = self._entries.get(name)
+            if entry is None:
+                raise KeyError(name)
+            entry.inflight += 1
+            entry.last_used = time.time()
+            self._entries.move_to_end(name)
+        try:
+            yield name, entry.generator
+        finally:
+            with self._lock:
+                entry.inflight -= 1
+                if entry.retired and entry.inflight == 0:
+                    self._free(entry)
+
+    def _retire(self, entry):
+        entry.retired = True
+        if entry.inflight == 0:
+            self._free(entry)
+        else:
+            self._retired.append(entry)
+
+    def _free(self, entry):
+        if entry in self._retired:
+            self._retired.remove(entry)
+        entry.generator = None
+        self.releaser(entry.name)
+        self._lock.notify_all()
+
+    def _resident_bytes(self):
+        return sum(e.size for e in self._entries.values()) + sum(e.size for e in self._retired)
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        for name in list(self._entries):
+            if self._resident_bytes() <= self.max_bytes:
+                break
+            if name == self.active:
+                continue
+            self._retire(self._entries.pop(name))
+
+    def status(self):
+        with self._lock:
+            models = [{
+                "name": e.name,
+                "active": e.name == self.active,
+                "state": "ready",
+                "source": e.source,
+                "inflight": e.inflight,
+                "bytes": e.size,
+                "loaded_at": e.loaded_at,
+                "last_used": e.last_used,
+            } for e in self._entries.values()]
+            models += [{
+                "name": e.name,
+                "active": False,
+                "state": "draining",
+                "source": e.source,
+                "inflight": e.inflight,
+                "bytes": e.size,
+                "loaded_at": e.loaded_at,
+                "last_used": e.last_used,
+            } for e in self._retired]
+            return {
+                "active": self.active,
+                "resident_bytes": self._resident_bytes(),
+                "max_bytes": self.max_bytes,
+                "models": models,
+                "loading": dict(self._loading),
+            }
@@ -0,0 +1,148 @@
+"""
+优先级调度
+请求按优先级分道排队（交互请求/批量请求），道间按严格优先级或加权轮转调度，
+道内按文本长度短作业优先，避免批量任务拖慢单篇交互请求。
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return round(values[index], 2)
+
+
+class _Lane:
+    def __init__(self, name, weight, history):
+        self.name = name
+        self.weight = weight
+        self.current = 0
+        self.heap = []
+        self.completed = 0
+        self.wait_ms = deque(maxlen=history)
+        self.total_ms = deque(maxlen=history)
+
+
+class PriorityScheduler:
+    """
+    分道优先级调度器
+    Args:
+        lanes: 车道名，按优先级从高到低排列
+        policy: 'strict' 严格优先级；'weighted' 按weights加权轮转
+        weights: 各车道权重（weighted策略使用）
+        workers: 执行线程数
+        history: 每个车道保留的延迟样本数
+    """
+
+    def __init__(self, lanes=(INTERACTIVE, BATCH), policy='weighted', weights=None, workers=1, history=1000):
+        if policy not in ('strict', 'weighted'):
+            raise ValueError(f"Unknown scheduling policy '{policy}'")
+        weights = weights or {}
+        self.policy = policy
+        self.lanes = [_Lane(name, weights.get(name, 1), history) for name in lanes]
+        self._by_name = {lane.name: lane for lane in self.lanes}
+        self.default_lane = lanes[0]
+        self.workers = workers
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def lane_of(self, name):
+        """未知或缺省的优先级归入最高优先级车道"""
+        return name if name in self._by_name else self.default_lane
+
+    def submit(self, lane, cost, fn):
+        """
+        提交任务
+        Args:
+            lane: 车道名
+            cost: 作业代价（如文本长度），同一车道内小的先执行
+            fn: 无参可调用对象
+        Returns:
+            Future
+        """
+        future = Future()
+        with self._cond:
+            self._ensure_workers()
+            heapq.heappush(self._by_name[self.lane_of(lane)].heap,
+                           (cost, next(self._seq), time.monotonic(), fn, future))
+            self._cond.notify()
+        return future
+
+    def run(self, lane, cost, fn):
+        """提交任务并等待结果"""
+        return self.submit(lane, cost, fn).result()
+
+    def _ensure_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"scheduler-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _pick(self):
+        ready = [lane for lane in self.lanes if lane.heap]
+        if not ready:
+            return None
+        if self.policy == 'strict':
+            return ready[0]
+        # 平滑加权轮转
+        total = sum(lane.weight for lane in ready)
+        for lane in ready:
+            lane.current += lane.weight
+        chosen = max(ready, key=lambda lane: lane.current)
+        chosen.current -= total
+        return chosen
+
+    def _work(self):
+        while True:
+            with self._cond:
+                lane = self._pick()
+                while lane is None:
+                    self._cond.wait()
+                    lane = self._pick()
+                cost, _, enqueued, fn, future = heapq.heappop(lane.heap)
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.monotonic()
+            try:
+                result = fn()
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finished = time.monotonic()
+
+            with self._cond:
+                lane.completed += 1
+                lane.wait_ms.append((started - enqueued) * 1000)
+                lane.total_ms.append((finished - enqueued) * 1000)
+
+    def queue_depth(self):
+        with self._cond:
+            return sum(len(lane.heap) for lane in self.lanes)
+
+    def stats(self):
+        """各车道排队数和延迟分位数（毫秒）"""
+        with self._cond:
+            lanes = {}
+            for lane in self.lanes:
+                lanes[lane.name] = {
+                    "queued": len(lane.heap),
+                    "completed": lane.completed,
+                    "wait_p50_ms": _percentile(lane.wait_ms, 50),
+                    "wait_p95_ms": _percentile(lane.wait_ms, 95),
+                    "latency_p50_ms": _percentile(lane.total_ms, 50),
+                    "latency_p95_ms": _percentile(lane.total_ms, 95),
+                }
+        return {"policy": self.policy, "lanes": lanes}
@@ -0,0 +1,76 @@
+"""
+相同请求合并（single-flight）
+同一时刻内容和参数完全相同的请求只执行一次计算，其余请求等待并共享结果。
+与缓存不同，计算结束后不保留结果。
+"""
+import hashlib
+import json
+import threading
+
+
+def make_key(kind, text, **params):
+    """根据接口类型、文本内容哈希和参数生成合并键"""
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return f"{kind}:{digest}:{json.dumps(params, sort_keys=True)}"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """进程内请求合并"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """
+        执行fn，若已有相同key的计算正在进行则等待其结果
+        Returns:
+            (result, shared): shared为True表示结果来自其他请求的计算
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            inflight = len(self._calls)
+        return {
+            "inflight": inflight,
+            "executed": self.executed,
+            "shared": self.shared
+        }
@@ -1,15 +1,78 @@
+from heapq import nlargest
+from itertools import count
+
 import jiagu
+from jiagu import utils
+
+from .deadline import DeadlineExceeded
+
+# 与jiagu.summarize使用的Summarize(tol=0.0001)相同的迭代参数
+MAX_ITER = 100
+TOL = 0.0001
+
+_stop_words = None
+
+
+def _stopwords():
+    global _stop_words
+    if _stop_words is None:
+        with open(utils.default_stopwords_file(), 'r', encoding='utf-8') as f:
+            _stop_words = {word.strip() for word in f}
+    return _stop_words
+
+
+def _summarize(text, n, deadline):
+    """
+    与jiagu.summarize相同的TextRank抽取，分词、构建相似度矩阵和迭代排序的各步之间检查截止时间，
+    超时后立即停止，不再为已放弃的请求计算（相似度矩阵的耗时随句子数平方增长）
+    """
+    text = utils.as_text(text.replace('\n', '').replace('\r', ''))
+    stop_words = _stopwords()
+    sentences, sents = [], []
+    for sentence in utils.cut_sentences(text):
+        deadline.check("summary segmentation")
+        sentences.append(sentence)
+        sents.append([word for word in jiagu.seg(sentence) if word and word not in stop_words])
+
+    num = len(sents)
+    graph = []
+    for i in range(num):
+        deadline.check("summary similarity")
+        graph.append([0.0 if i == j else utils.sentences_similarity(sents[i], sents[j]) for j in range(num)])
+
+    scores = [0.5] * num
+    old_scores = [0.0] * num
+    denominator = utils.get_degree(graph)
+    iterations = 0
+    while utils.different(scores, old_scores, TOL):
+        deadline.check("summary ranking")
+        old_scores = list(scores)
+        for i in range(num):
+            scores[i] = utils.get_score(graph, denominator, i)
+        iterations += 1
+        if iterations > MAX_ITER:
+            break
+
+    selected = nlargest(n, zip(scores, count()))
+    return [sentences[selected[i][1]] for i in range(n)]
 
 
-def generate_summary(text: str, sentences_count: int = 3) -> list:
+def generate_summary(text: str, sentences_count: int = 3, deadline=None) -> list:
     if not text.strip():
         raise ValueError("Text cannot be empty")
+    if deadline is not None:
+        deadline.check("summarization")
 
     try:
-        sentences = jiagu.summarize(text, sentences_count)
+        if deadline is None:
+            sentences = jiagu.summarize(text, sentences_count)
+        else:
+            sentences = _summarize(text, sentences_count, deadline)
         if not sentences:
             return ["No meaningful summary could be generated"]
         return sentences
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise RuntimeError(f"Summary generation failed: {str(e)}")
 
@@ -19,4 +82,4 @@ if __name__ == '__main__':
         summary = generate_summary(sample_text, 5)
         print("生成的摘要:", summary)
     except Exception as e:
-        print("错误:", str(e))
\ No newline at end of file
+        print("错误:", str(e))
@@ -1,7 +1,16 @@
+import os
+
 from .title import TitleGenerator
 
-generator = TitleGenerator(
-        model_path="core/title/checkpoint-1079962",
-        vocab_path="core/title/vocab",
-        device="cuda:0"  # 使用第一个GPU
-    )
+# 模型文件相对本文件定位，不依赖进程的工作目录（backend内嵌推理时工作目录不同）
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(MODEL_DIR, "checkpoint-1079962")
+VOCAB_PATH = os.path.join(MODEL_DIR, "vocab")
+
+
+def load_generator(model_path=MODEL_PATH, vocab_path=VOCAB_PATH, device="cuda:0"):
+    """
+    加载标题模型（默认使用第一个GPU）
+    不在模块级保存实例：模型由调用方（如模型注册表）持有，被替换后才能释放显存
+    """
+    return TitleGenerator(model_path=model_path, vocab_path=vocab_path, device=device)
@@ -4,6 +4,8 @@ from .model import GPT2LMHeadModel
 from transformers import BertTokenizer
 import copy
 
+from ..deadline import DeadlineExceeded
+
 
 def _top_k_top_p_filtering(logits, top_k, top_p, filter_value=-float("Inf")):
     """
@@ -64,17 +66,19 @@ class TitleGenerator:
         self.top_p = top_p
         self.max_len = max_len
 
-    def generate(self, content, num_titles=3):
+    def generate(self, content, num_titles=3, deadline=None, allow_partial=False):
         """最终生成函数
         Args:
             content: 输入文本内容
             num_titles: 需要生成的标题数量
+            deadline: 可选的截止时间，每个解码步之间检查
+            allow_partial: 超时时是否返回已解码部分的候选标题
         Returns:
             List[str]: 生成的标题列表
         """
-        return self._predict_one_sample(content, num_titles)
+        return self._predict_one_sample(content, num_titles, deadline=deadline, allow_partial=allow_partial)
 
-    def _predict_one_sample(self, content, batch_size):
+    def _predict_one_sample(self, content, batch_size, deadline=None, allow_partial=False):
         """修改后的预测函数"""
         content_tokens = self.tokenizer.tokenize(content)
         if len(content_tokens) > self.max_len - 3 - self.generate_max_len:
@@ -101,6 +105,12 @@ class TitleGenerator:
 
         with torch.no_grad():
             for _ in range(self.generate_max_len):
+                if deadline is not None and deadline.expired():
+                    # 已有部分结果且允许返回时提前结束，否则放弃本次请求
+                    if allow_partial and generated:
+                        break
+                    raise DeadlineExceeded("Deadline exceeded during title decoding")
+
                 outputs = self.model(input_ids=input_tensors, token_type_ids=token_type_tensors)
                 next_token_logits = outputs[0][:, -1, :]
 
@@ -4,7 +4,9 @@ import sys
 import pytest
 import tempfile
 from unittest.mock import Mock, patch
+import api
 from api import app  # 假设 create_app 是创建 Flask 应用的函数
+from config import Config
 
 # 添加项目根目录到Python路径
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -20,6 +22,57 @@ SAMPLE_SHORT_TEXT = "这是一个简短的测试文本。"
 
 SAMPLE_EMPTY_TEXT = ""
 
+class FakeNvml:
+    """假的NVML实现，用于在无GPU环境下测试设备采样"""
+
+    def __init__(self, count=1, gpu_usage=50, used=2147483648, total=10737418240, fail_init=False):
+        self.count = count
+        self.gpu_usage = gpu_usage
+        self.used = used
+        self.total = total
+        self.fail_init = fail_init
+        self.init_calls = 0
+        self.shutdown_calls = 0
+
+    def nvmlInit(self):
+        self.init_calls += 1
+        if self.fail_init:
+            raise RuntimeError("NVML not available")
+
+    def nvmlShutdown(self):
+        self.shutdown_calls += 1
+
+    def nvmlSystemGetDriverVersion(self):
+        return "525.60.11"
+
+    def nvmlDeviceGetCount(self):
+        return self.count
+
+    def nvmlDeviceGetHandleByIndex(self, index):
+        return index
+
+    def nvmlDeviceGetMemoryInfo(self, handle):
+        return Mock(total=self.total, free=self.total - self.used, used=self.used)
+
+    def nvmlDeviceGetUtilizationRates(self, handle):
+        return Mock(gpu=self.gpu_usage)
+
+    def nvmlDeviceGetName(self, handle):
+        return "GeForce RTX 3080"
+
+    def nvmlDeviceGetTemperature(self, handle, sensor):
+        return 45
+
+    def nvmlDeviceGetPowerState(self, handle):
+        return 0
+
+
+def default_model():
+    """注册表中的默认标题模型（模块中不再保存模型的引用）"""
+    with api.registry.acquire(Config.DEFAULT_MODEL_NAME) as (_, model):
+        return model
+
+
 # 测试配置
 TEST_CONFIG = {
     'TESTING': True,
@@ -62,11 +115,11 @@ def _auto_patch_dependencies(monkeypatch):
     monkeypatch.setattr(app, 'before_request_funcs', {})
 
     # 模拟核心业务逻辑
-    def mock_generate_summary(text, sentences):
+    def mock_generate_summary(text, sentences, **kwargs):
         return ["测试摘要" for _ in range(sentences)]
 
-    def mock_generate(text, sentences):
+    def mock_generate(text, sentences, **kwargs):
         return "测试标题"
 
     monkeypatch.setattr('core.generate_summary', mock_generate_summary)
-    monkeypatch.setattr('core.generator.generate', mock_generate)
+    monkeypatch.setattr(default_model(), 'generate', mock_generate)
@@ -11,8 +11,10 @@ import os
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import api
 from api import app
-from .conftest import SAMPLE_TEXT, SAMPLE_SHORT_TEXT, TEST_CONFIG
+from core.device_stats import DeviceSampler, NvmlProvider
+from .conftest import SAMPLE_TEXT, SAMPLE_SHORT_TEXT, TEST_CONFIG, FakeNvml, default_model
 
 
 class TestAPIEndpoints:
@@ -37,7 +39,7 @@ class TestAPIEndpoints:
             assert 'summary' in data
             assert data['summary'] == ["这是生成的摘要。"]  # 断言列表
             assert data['sentence_count'] == 1  # 根据返回列表长度断言
-            mock_generate.assert_called_once_with(SAMPLE_TEXT, 2)
+            mock_generate.assert_called_once_with(SAMPLE_TEXT, 2, deadline=None)
 
     @pytest.mark.api
     def test_summarize_endpoint_default_sentences(self, client):
@@ -48,7 +50,7 @@ class TestAPIEndpoints:
             assert response.status_code == 200
             data = response.get_json()
             assert data['sentence_count'] == 3  # 断言句子数正确
-            mock_generate.assert_called_once_with(SAMPLE_TEXT, 3)  # 验证默认参数3
+            mock_generate.assert_called_once_with(SAMPLE_TEXT, 3, deadline=None)  # 验证默认参数3
     
     @pytest.mark.api
     def test_summarize_endpoint_missing_text(self, client):
@@ -99,7 +101,7 @@ class TestAPIEndpoints:
     @pytest.mark.api
     def test_title_endpoint_success(self, client):
         """测试标题生成接口正常情况"""
-        with patch('api.generator.generate') as mock_generate:
+        with patch.object(default_model(), 'generate') as mock_generate:
             mock_generate.return_value = ["生成的标题1", "生成的标题2"]
             
             response = client.post('/title', 
@@ -109,18 +111,32 @@ class TestAPIEndpoints:
             data = response.get_json()
             assert 'title' in data
             assert data['title'] == ["生成的标题1", "生成的标题2"]
-            mock_generate.assert_called_once_with(SAMPLE_TEXT, 2)
+            mock_generate.assert_called_once_with(SAMPLE_TEXT, 2, deadline=None, allow_partial=False)
     
     @pytest.mark.api
     def test_title_endpoint_default_sentences(self, client):
         """测试标题生成接口默认句子数"""
-        with patch('api.generator.generate') as mock_generate:
+        with patch.object(default_model(), 'generate') as mock_generate:
             mock_generate.return_value = ["默认标题"]
             
             response = client.post('/title', json={'text': SAMPLE_TEXT})
             
             assert response.status_code == 200
-            mock_generate.assert_called_once_with(SAMPLE_TEXT, 3)
+            mock_generate.assert_called_once_with(SAMPLE_TEXT, 3, deadline=None, allow_partial=False)
+
+    @pytest.mark.api
+    def test_title_endpoint_partial_flag(self, client):
+        """测试超时返回的部分标题由X-Partial响应头标记"""
+        with patch.object(default_model(), 'generate') as mock_generate:
+            mock_generate.return_value = ["部分标题"]
+
+            response = client.post('/title', json={'text': SAMPLE_TEXT},
+                                   headers={'X-Deadline-Ms': '0', 'X-Allow-Partial': '1'})
+            assert response.status_code == 200
+            assert response.headers['X-Partial'] == '1'
+
+            response = client.post('/title', json={'text': SAMPLE_TEXT}, headers={'X-Deadline-Ms': '60000'})
+            assert response.headers['X-Partial'] == '0'
     
     @pytest.mark.api
     def test_title_endpoint_missing_text(self, client):
@@ -135,7 +151,7 @@ class TestAPIEndpoints:
     @pytest.mark.api
     def test_title_endpoint_value_error(self, client):
         """测试标题生成接口值错误处理"""
-        with patch('api.generator.generate') as mock_generate:
+        with patch.object(default_model(), 'generate') as mock_generate:
             mock_generate.side_effect = ValueError("Invalid title count")
             
             response = client.post('/title', 
@@ -149,7 +165,7 @@ class TestAPIEndpoints:
     @pytest.mark.api
     def test_title_endpoint_internal_error(self, client):
         """测试标题生成接口内部错误处理"""
-        with patch('api.generator.generate') as mock_generate:
+        with patch.object(default_model(), 'generate') as mock_generate:
             mock_generate.side_effect = Exception("Internal error")
             
             response = client.post('/title', json={'text': SAMPLE_TEXT})
@@ -162,65 +178,120 @@ class TestAPIEndpoints:
     @pytest.mark.api
     def test_nvidia_info_endpoint_success(self, client):
         """测试NVIDIA信息接口正常情况"""
-        with patch('api.nvmlInit'), \
-             patch('api.nvmlSystemGetDriverVersion', return_value="525.60.11"), \
-             patch('api.nvmlDeviceGetCount', return_value=1), \
-             patch('api.nvmlDeviceGetHandleByIndex') as mock_handle, \
-             patch('api.nvmlDeviceGetMemoryInfo') as mock_memory, \
-             patch('api.nvmlDeviceGetName', return_value="GeForce RTX 3080"), \
-             patch('api.nvmlDeviceGetTemperature', return_value=45), \
-             patch('api.nvmlDeviceGetPowerState', return_value=0), \
-             patch('api.nvmlShutdown'):
-            
-            # 模拟内存信息
-            mock_memory_info = Mock()
-            mock_memory_info.total = 10737418240  # 10GB
-            mock_memory_info.free = 8589934592    # 8GB
-            mock_memory_info.used = 2147483648    # 2GB
-            mock_memory.return_value = mock_memory_info
-            
+        fake = FakeNvml()
+        sampler = DeviceSampler(provider=NvmlProvider(fake))
+        sampler.sample_once()
+
+        with patch('api.device_sampler', sampler):
             response = client.get('/nvidia_info')
-            
-            assert response.status_code == 200
-            data = response.get_json()
-            assert data['state'] is True
-            assert data['nvidia_version'] == "525.60.11"
-            assert data['nvidia_count'] == 1
-            assert len(data['gpus']) == 1
-            
-            gpu = data['gpus'][0]
-            assert gpu['gpu_name'] == "GeForce RTX 3080"
-            assert gpu['total'] == 10737418240
-            assert gpu['free'] == 8589934592
-            assert gpu['used'] == 2147483648
-            assert gpu['temperature'] == "45℃"
-            assert gpu['powerStatus'] == 0
-    
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['state'] is True
+        assert data['nvidia_version'] == "525.60.11"
+        assert data['nvidia_count'] == 1
+        assert len(data['gpus']) == 1
+
+        gpu = data['gpus'][0]
+        assert gpu['gpu_name'] == "GeForce RTX 3080"
+        assert gpu['total'] == 10737418240
+        assert gpu['free'] == 8589934592
+        assert gpu['used'] == 2147483648
+        assert gpu['temperature'] == "45℃"
+        assert gpu['powerStatus'] == 0
+
+        # 请求不再初始化NVML
+        assert fake.init_calls == 1
+        assert 'age_us' in data
+        assert data['window']['gpu_usage_percent'] == [50]
+
     @pytest.mark.api
     def test_nvidia_info_endpoint_nvml_error(self, client):
-        """测试NVIDIA信息接口NVML错误"""
-        with patch('api.nvmlInit') as mock_init:
-            from pynvml import NVMLError
-            mock_init.side_effect = NVMLError("NVML not available")
-            
+        """测试NVIDIA信息接口NVML不可用时回退"""
+        sampler = DeviceSampler(provider=NvmlProvider(FakeNvml(fail_init=True)))
+
+        with patch('api.device_sampler', sampler):
             response = client.get('/nvidia_info')
-            
-            assert response.status_code == 200
-            data = response.get_json()
-            assert data['state'] is False
-    
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['state'] is False
+        assert data['source'] == 'psutil'
+        assert data['gpus'] == []
+
     @pytest.mark.api
     def test_nvidia_info_endpoint_general_error(self, client):
-        """测试NVIDIA信息接口一般错误"""
-        with patch('api.nvmlInit') as mock_init:
-            mock_init.side_effect = Exception("General error")
-            
+        """测试NVIDIA信息接口采集出错"""
+        fake = FakeNvml()
+        fake.nvmlDeviceGetCount = Mock(side_effect=Exception("General error"))
+        sampler = DeviceSampler(provider=NvmlProvider(fake))
+
+        with patch('api.device_sampler', sampler):
             response = client.get('/nvidia_info')
-            
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['state'] is False
+
+    @pytest.mark.api
+    def test_title_endpoint_model_selection(self, client):
+        """测试按名称选择模型"""
+        candidate = Mock()
+        candidate.generate.return_value = ["候选模型标题"]
+        api.registry.register('candidate', candidate)
+        try:
+            response = client.post('/title', json={'text': SAMPLE_TEXT, 'model': 'candidate'})
             assert response.status_code == 200
-            data = response.get_json()
-            assert data['state'] is False
-    
+            assert response.get_json()['title'] == ["候选模型标题"]
+            assert response.headers['X-Model'] == 'candidate'
+
+            response = client.post('/title', json={'text': SAMPLE_TEXT, 'model': 'missing'})
+            assert response.status_code == 404
+
+            models = client.get('/models').get_json()
+            assert models['active'] == 'default'
+            assert 'candidate' in [m['name'] for m in models['models']]
+        finally:
+            with api.registry._lock:
+                api.registry._entries.pop('candidate', None)
+
+    @pytest.mark.api
+    def test_model_management_requires_token(self, client):
+        """测试模型加载和切换接口需要管理令牌，未配置令牌时禁用"""
+        with patch('api.Config.ADMIN_TOKEN', None):
+            response = client.post('/models/activate', json={'name': 'default'})
+            assert response.status_code == 401
+
+        with patch('api.Config.ADMIN_TOKEN', 'secret'), patch.object(api.registry, 'load') as mock_load:
+            response = client.post('/models/load', json={'name': 'v2', 'model_path': 'ckpt'},
+                                   headers={'Authorization': 'Bearer wrong'})
+            assert response.status_code == 401
+            mock_load.assert_not_called()
+
+            response = client.post('/models/load', json={'name': 'v2', 'model_path': 'ckpt'},
+                                   headers={'Authorization': 'Bearer secret'})
+            assert response.status_code == 202
+            mock_load.assert_called_once()
+
+            response = client.post('/models/activate', json={'name': 'default'},
+                                   headers={'Authorization': 'Bearer secret'})
+            assert response.status_code == 200
+
+    @pytest.mark.api
+    def test_lane_stats_endpoint(self, client):
+        """测试按X-Priority分道统计"""
+        with patch('api.generate_summary') as mock_generate:
+            mock_generate.return_value = ["批量摘要"]
+            before = client.get('/lane_stats').get_json()['lanes']['batch']['completed']
+
+            response = client.post('/summarize', json={'text': SAMPLE_TEXT},
+                                   headers={'X-Priority': 'batch'})
+            assert response.status_code == 200
+
+        data = client.get('/lane_stats').get_json()
+        assert data['lanes']['batch']['completed'] == before + 1
+        assert 'latency_p95_ms' in data['lanes']['interactive']
+
     @pytest.mark.api
     def test_invalid_endpoint(self, client):
         """测试无效端点"""
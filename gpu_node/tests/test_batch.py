@@ -0,0 +1,50 @@
+"""
+批量接口单元测试
+测试/batch接口
+"""
+import pytest
+import msgpack
+from unittest.mock import patch
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from .conftest import SAMPLE_TEXT, SAMPLE_SHORT_TEXT
+
+
+class TestBatch:
+    """批量接口测试类"""
+
+    @pytest.mark.api
+    def test_batch_results_in_order(self, client):
+        """测试按输入顺序返回每篇文档的标题和摘要"""
+        with patch('api.generate_summary', side_effect=lambda text, n, deadline=None: [text[:4]] * n):
+            response = client.post('/batch', json={'texts': [SAMPLE_TEXT, SAMPLE_SHORT_TEXT], 'sentences': 2},
+                                   headers={'X-Priority': 'batch'})
+
+        assert response.status_code == 200
+        results = response.get_json()['results']
+        assert [r['summary'] for r in results] == [[SAMPLE_TEXT[:4]] * 2, [SAMPLE_SHORT_TEXT[:4]] * 2]
+        assert all(r['title'] == "测试标题" for r in results)
+
+    @pytest.mark.api
+    def test_item_failure_isolated(self, client):
+        """测试单篇失败只影响该文档"""
+        with patch('api.generate_summary', return_value=["摘要"]):
+            response = client.post('/batch', data=msgpack.packb({'texts': [SAMPLE_TEXT, "  "]}),
+                                   headers={'Content-Type': 'application/msgpack',
+                                            'Accept': 'application/msgpack'})
+
+        results = msgpack.unpackb(response.data)['results']
+        assert results[0]['summary'] == ["摘要"]
+        assert 'error' in results[1]
+
+    @pytest.mark.api
+    def test_batch_validation(self, client):
+        """测试参数校验"""
+        assert client.post('/batch', json={'texts': []}).status_code == 400
+        assert client.post('/batch', json={'text': SAMPLE_TEXT}).status_code == 400
+        with patch('api.Config.MAX_BATCH_SIZE', 1):
+            assert client.post('/batch', json={'texts': [SAMPLE_TEXT] * 2}).status_code == 400
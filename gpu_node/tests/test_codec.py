@@ -0,0 +1,76 @@
+"""
+传输编码单元测试
+测试core.codec模块及接口的msgpack/压缩请求体协商
+"""
+import gzip
+import json
+import pytest
+import msgpack
+import zstandard
+from unittest.mock import patch
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from .conftest import SAMPLE_TEXT
+
+MSGPACK_HEADERS = {'Content-Type': 'application/msgpack', 'Accept': 'application/msgpack'}
+
+
+class TestCodec:
+    """传输编码测试类"""
+
+    @pytest.mark.api
+    def test_msgpack_round_trip(self, client):
+        """测试msgpack请求体和响应"""
+        with patch('api.generate_summary', return_value=["摘要一。", "摘要二。"]):
+            response = client.post('/summarize', data=msgpack.packb({'text': SAMPLE_TEXT, 'sentences': 2}),
+                                   headers=MSGPACK_HEADERS)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/msgpack'
+        assert msgpack.unpackb(response.data) == {'summary': ["摘要一。", "摘要二。"], 'sentence_count': 2}
+
+    @pytest.mark.api
+    def test_msgpack_request_json_response(self, client):
+        """测试未声明Accept时仍返回JSON"""
+        response = client.post('/title', data=msgpack.packb({'text': SAMPLE_TEXT}),
+                               content_type='application/msgpack')
+
+        assert response.status_code == 200
+        assert response.get_json() == {"title": "测试标题"}
+
+    @pytest.mark.api
+    @pytest.mark.parametrize('encoding, compress', [
+        ('gzip', gzip.compress),
+        ('zstd', lambda raw: zstandard.ZstdCompressor().compress(raw)),
+    ])
+    def test_compressed_body(self, client, encoding, compress):
+        """测试gzip/zstd压缩的请求体"""
+        body = compress(json.dumps({'text': SAMPLE_TEXT * 50}, ensure_ascii=False).encode('utf-8'))
+        response = client.post('/summarize', data=body, content_type='application/json',
+                               headers={'Content-Encoding': encoding})
+
+        assert response.status_code == 200
+
+    @pytest.mark.api
+    def test_decompression_limit(self, client):
+        """测试解压后超过上限的请求体被拒绝"""
+        body = gzip.compress(json.dumps({'text': "字" * 1000}).encode())
+        with patch('api.Config.MAX_BODY_BYTES', 100):
+            response = client.post('/summarize', data=body, content_type='application/json',
+                                   headers={'Content-Encoding': 'gzip'})
+
+        assert response.status_code == 400
+
+    @pytest.mark.api
+    def test_unsupported_encoding_rejected(self, client):
+        """测试不支持的编码返回400"""
+        response = client.post('/title', data=b'\x00', content_type='application/json',
+                               headers={'Content-Encoding': 'br'})
+        assert response.status_code == 400
+
+        response = client.post('/title', data=b'\xc1', headers=MSGPACK_HEADERS)
+        assert response.status_code == 400
@@ -0,0 +1,137 @@
+"""
+截止时间单元测试
+测试core.deadline模块及解码循环的超时处理
+"""
+import pytest
+import torch
+from unittest.mock import patch
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import app
+from core.deadline import Deadline, DeadlineExceeded
+import core.summary as summary_module
+from core.summary import generate_summary
+from core.title.title import TitleGenerator
+from .conftest import SAMPLE_TEXT, TEST_CONFIG
+
+SPECIAL_IDS = {"[Content]": 1, "[Title]": 2, "[UNK]": 3, "[SEP]": 4, "[CLS]": 5}
+
+
+class FakeTokenizer:
+    """按字切分的假tokenizer"""
+
+    def tokenize(self, text):
+        return list(text[:20])
+
+    def convert_tokens_to_ids(self, tokens):
+        if isinstance(tokens, str):
+            return SPECIAL_IDS.get(tokens, 10)
+        return [SPECIAL_IDS.get(token, 10) for token in tokens]
+
+    def convert_ids_to_tokens(self, ids):
+        return ["字" for _ in ids]
+
+
+class FakeModel:
+    """总是倾向于生成同一个非结束符的假模型"""
+
+    def __init__(self):
+        self.steps = 0
+
+    def __call__(self, input_ids, token_type_ids):
+        self.steps += 1
+        logits = torch.zeros(input_ids.size(0), input_ids.size(1), 20)
+        logits[:, :, 10] = 100.0
+        return (logits,)
+
+
+def _expire_after(checks):
+    """第checks次检查时超时的截止时间"""
+    state = {'n': 0}
+
+    def clock():
+        # 第一次读取时钟是在创建截止时间时
+        state['n'] += 1
+        return 0 if state['n'] <= checks else 1
+
+    return Deadline(1, clock=clock)
+
+
+@pytest.fixture
+def generator():
+    with patch('core.title.title.torch.cuda.is_available', return_value=False), \
+            patch('core.title.title.BertTokenizer'), \
+            patch('core.title.title.GPT2LMHeadModel'):
+        generator = TitleGenerator(model_path="test_model_path", vocab_path="test_vocab_path", device="cpu")
+    generator.tokenizer = FakeTokenizer()
+    generator.model = FakeModel()
+    return generator
+
+
+class TestDeadline:
+    """截止时间测试类"""
+
+    @pytest.mark.unit
+    def test_from_headers(self):
+        """测试从请求头解析剩余时间"""
+        deadline = Deadline.from_headers({'X-Deadline-Ms': '5000'})
+        assert 4 < deadline.remaining() <= 5
+        assert not deadline.expired()
+
+        assert Deadline.from_headers({}) is None
+        assert Deadline.from_headers({'X-Deadline-Ms': 'soon'}) is None
+
+    @pytest.mark.unit
+    def test_expired_check_raises(self):
+        """测试超时后check抛出异常"""
+        with pytest.raises(DeadlineExceeded):
+            Deadline(0).check()
+        with pytest.raises(DeadlineExceeded):
+            generate_summary(SAMPLE_TEXT, 3, deadline=Deadline(0))
+
+    @pytest.mark.unit
+    def test_summary_matches_jiagu(self):
+        """测试带截止时间的摘要与jiagu.summarize的结果相同"""
+        assert generate_summary(SAMPLE_TEXT, 3, deadline=Deadline(60)) == generate_summary(SAMPLE_TEXT, 3)
+
+    @pytest.mark.unit
+    def test_summary_stops_when_expired(self):
+        """测试摘要在各步骤之间检查截止时间，超时后不再继续计算"""
+        similarity_fn = summary_module.utils.sentences_similarity
+        with patch('core.summary.utils.sentences_similarity', wraps=similarity_fn) as similarity:
+            with pytest.raises(DeadlineExceeded, match="similarity"):
+                # 开始前和每个句子分词前各检查一次，之后在第一行相似度计算前超时
+                sentences = len(list(summary_module.utils.cut_sentences(SAMPLE_TEXT.replace('\n', ''))))
+                generate_summary(SAMPLE_TEXT, 3, deadline=_expire_after(sentences + 2))
+        similarity.assert_not_called()
+
+    @pytest.mark.unit
+    def test_decode_stops_when_expired(self, generator):
+        """测试解码循环在超时后立即停止"""
+        with pytest.raises(DeadlineExceeded):
+            generator.generate(SAMPLE_TEXT, 3, deadline=_expire_after(3))
+
+        assert generator.model.steps == 2
+
+    @pytest.mark.unit
+    def test_decode_returns_partial_candidates(self, generator):
+        """测试允许时超时返回已解码的部分候选"""
+        titles = generator.generate(SAMPLE_TEXT, 3, deadline=_expire_after(4),
+                                    allow_partial=True)
+
+        assert titles == ["字字字"] * 3
+        assert generator.model.steps == 3
+
+    @pytest.mark.api
+    def test_expired_request_returns_504(self):
+        """测试已超时的请求不再计算"""
+        app.config.update(TEST_CONFIG)
+        with app.test_client() as client:
+            response = client.post('/summarize', json={'text': SAMPLE_TEXT},
+                                   headers={'X-Deadline-Ms': '0'})
+
+        assert response.status_code == 504
@@ -0,0 +1,84 @@
+"""
+设备采样单元测试
+测试core.device_stats模块
+"""
+import pytest
+import time
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.device_stats import DeviceSampler, NvmlProvider, PsutilProvider
+from .conftest import FakeNvml
+
+
+class TestDeviceSampler:
+    """设备采样器测试类"""
+
+    @pytest.mark.unit
+    def test_ring_buffer_bounded(self):
+        """测试环形缓冲区容量"""
+        sampler = DeviceSampler(provider=NvmlProvider(FakeNvml()), history=5)
+        for _ in range(12):
+            sampler.sample_once()
+
+        assert len(sampler.samples) == 5
+
+    @pytest.mark.unit
+    def test_nvml_initialized_once(self):
+        """测试多次采样只初始化一次NVML"""
+        fake = FakeNvml()
+        sampler = DeviceSampler(provider=NvmlProvider(fake))
+        for _ in range(3):
+            sampler.sample_once()
+        sampler.stop()
+
+        assert fake.init_calls == 1
+        assert fake.shutdown_calls == 1
+
+    @pytest.mark.unit
+    def test_window_average(self):
+        """测试短窗口平均值"""
+        fake = FakeNvml(count=2)
+        sampler = DeviceSampler(provider=NvmlProvider(fake), window=2)
+        fake.gpu_usage = 10
+        sampler.sample_once()
+        fake.gpu_usage = 30
+        sampler.sample_once()
+        fake.gpu_usage = 50
+        sampler.sample_once()
+
+        snapshot = sampler.snapshot()
+
+        assert snapshot['window']['samples'] == 2
+        assert snapshot['window']['gpu_usage_percent'] == [40, 40]
+        assert snapshot['window']['memory_usage_percent'] == [20.0, 20.0]
+        assert snapshot['window']['span_us'] >= 0
+        assert snapshot['age_us'] >= 0
+
+    @pytest.mark.unit
+    def test_fallback_without_gpu(self):
+        """测试NVML不可用时回退到psutil"""
+        sampler = DeviceSampler(provider=NvmlProvider(FakeNvml(fail_init=True)))
+        snapshot = sampler.snapshot()
+
+        assert isinstance(sampler.provider, PsutilProvider)
+        assert snapshot['state'] is False
+        assert snapshot['nvidia_count'] == 0
+        assert 0 <= snapshot['cpu_percent'] <= 100
+
+    @pytest.mark.unit
+    def test_background_thread(self):
+        """测试后台线程持续采样"""
+        sampler = DeviceSampler(provider=NvmlProvider(FakeNvml()), interval=0.01)
+        sampler.start()
+        try:
+            deadline = time.time() + 2
+            while len(sampler.samples) < 3 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            sampler.stop()
+
+        assert len(sampler.samples) >= 3
@@ -12,7 +12,7 @@ from unittest.mock import patch, Mock
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from api import app
-from .conftest import SAMPLE_TEXT, TEST_CONFIG
+from .conftest import SAMPLE_TEXT, TEST_CONFIG, default_model
 
 
 class TestIntegration:
@@ -40,7 +40,7 @@ class TestIntegration:
             assert 'summary' in summary_data
         
         # 模拟标题生成
-        with patch('core.generator.generate') as mock_title:
+        with patch.object(default_model(), 'generate') as mock_title:
             mock_title.return_value = ["生成的标题1", "生成的标题2"]
             
             title_response = client.post('/title', 
@@ -68,7 +68,7 @@ class TestIntegration:
     def test_multiple_requests_stability(self, client):
         """测试多个请求的稳定性"""
         with patch('core.generate_summary') as mock_summary, \
-             patch('core.generator.generate') as mock_title:
+             patch.object(default_model(), 'generate') as mock_title:
             
             mock_summary.return_value = "稳定性测试摘要。"
             mock_title.return_value = ["稳定性测试标题"]
@@ -116,7 +116,7 @@ class TestIntegration:
         large_text = SAMPLE_TEXT * 100
         
         with patch('core.generate_summary') as mock_summary, \
-             patch('core.generator.generate') as mock_title:
+             patch.object(default_model(), 'generate') as mock_title:
             
             mock_summary.return_value = "大文本摘要。"
             mock_title.return_value = ["大文本标题"]
@@ -137,7 +137,7 @@ class TestIntegration:
         unicode_text = "这是一个包含中文、English、数字123和emoji😀的测试文本。"
         
         with patch('api.generate_summary') as mock_summary, \
-             patch('api.generator.generate') as mock_title:
+             patch.object(default_model(), 'generate') as mock_title:
             
             mock_summary.return_value = "Unicode摘要结果。"
             mock_title.return_value = ["Unicode标题结果"]
@@ -0,0 +1,191 @@
+"""
+模型注册表单元测试
+测试core.registry模块
+"""
+import gc
+import pytest
+import sys
+import os
+import weakref
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.registry import ModelRegistry
+
+
+class FakeGenerator:
+    """假的标题生成器"""
+
+    def __init__(self, name, size=100):
+        self.name = name
+        self.size = size
+        self.calls = []
+
+    def generate(self, text, num_titles=3):
+        self.calls.append(text)
+        return [self.name] * num_titles
+
+
+def _registry(**kwargs):
+    released = []
+    registry = ModelRegistry(sizer=lambda g: g.size, releaser=released.append, **kwargs)
+    return registry, released
+
+
+class TestModelRegistry:
+    """模型注册表测试类"""
+
+    @pytest.mark.unit
+    def test_select_by_name(self):
+        """测试按名称选择模型，缺省使用激活模型"""
+        registry, _ = _registry()
+        registry.register('a', FakeGenerator('a'), activate=True)
+        registry.register('b', FakeGenerator('b'))
+
+        with registry.acquire() as (name, model):
+            assert name == 'a'
+        with registry.acquire('b') as (name, model):
+            assert model.generate("文本", 1) == ['b']
+        with pytest.raises(KeyError):
+            with registry.acquire('missing'):
+                pass
+
+    @pytest.mark.unit
+    def test_load_warms_and_switches(self):
+        """测试加载时预热并切换默认流量"""
+        loaded = FakeGenerator('v2')
+        registry, _ = _registry(loader=lambda model_path, vocab_path: loaded, warmup_text="预热")
+        registry.register('default', FakeGenerator('v1'), activate=True)
+
+        registry.load('v2', 'ckpt-v2', 'vocab', activate=True, background=False)
+
+        assert loaded.calls == ["预热"]
+        assert registry.active == 'v2'
+        assert registry.status()['loading'] == {}
+
+    @pytest.mark.unit
+    def test_replaced_model_drains_before_release(self):
+        """测试同名替换时旧版本排空后才释放"""
+        registry, released = _registry()
+        old = FakeGenerator('old')
+        registry.register('default', old, activate=True)
+
+        with registry.acquire() as (_, model):
+            registry.register('default', FakeGenerator('new'), activate=True)
+            # 处理中的请求仍使用旧版本
+            assert model is old
+            assert released == []
+            assert registry.status()['models'][-1]['state'] == 'draining'
+            with registry.acquire() as (_, current):
+                assert current.name == 'new'
+
+        assert released == ['default']
+
+    @pytest.mark.unit
+    def test_released_model_collected(self):
+        """测试释放函数调用时被淘汰的模型已没有引用，默认释放函数回收后对象不再存在"""
+        alive = []
+        registry = ModelRegistry(sizer=lambda g: g.size, max_bytes=250,
+                                 releaser=lambda name: alive.append(ref() is not None))
+        registry.register('a', FakeGenerator('a'), activate=True)
+        registry.register('b', FakeGenerator('b'))
+        with registry.acquire('b') as (_, model):
+            ref = weakref.ref(model)
+        del model
+
+        registry.register('c', FakeGenerator('c'))
+
+        assert alive == [False]
+
+        # 有循环引用的模型由默认释放函数回收
+        registry = ModelRegistry(sizer=lambda g: g.size)
+        cyclic = FakeGenerator('cyclic')
+        cyclic.self = cyclic
+        ref = weakref.ref(cyclic)
+        registry.register('default', cyclic, activate=True)
+        del cyclic
+        gc.disable()
+        try:
+            registry.register('default', FakeGenerator('new'), activate=True)
+            assert ref() is None
+        finally:
+            gc.enable()
+
+    @pytest.mark.unit
+    def test_lru_eviction_by_memory(self):
+        """测试超过内存上限时淘汰最久未使用的非激活模型"""
+        registry, released = _registry(max_bytes=250)
+        registry.register('a', FakeGenerator('a'))
+        b = FakeGenerator('b')
+        registry.register('b', b)
+        registry.register('c', FakeGenerator('c'))
+        registry.activate('c')
+        with registry.acquire('a'):
+            pass
+        registry.register('d', FakeGenerator('d'))
+
+        names = [m['name'] for m in registry.status()['models']]
+        # b最久未使用被淘汰，激活模型c不会被淘汰
+        assert released[0] == 'b'
+        assert 'c' in names and 'b' not in names
+        assert registry.status()['resident_bytes'] <= 250
+
+    @pytest.mark.unit
+    def test_failed_load_reported(self):
+        """测试加载失败记录在状态中"""
+        def loader(model_path, vocab_path):
+            raise OSError("checkpoint not found")
+
+        registry, _ = _registry(loader=loader)
+        registry.load('bad', 'missing', 'vocab', background=False)
+
+        assert registry.status()['loading']['bad'].startswith('failed')
+        assert registry.active is None
+
+    @pytest.mark.unit
+    def test_evicts_before_loading(self):
+        """测试加载新模型前先淘汰非激活模型，峰值不超过内存上限"""
+        peaks = []
+
+        def loader(model_path, vocab_path):
+            peaks.append(registry.status()['resident_bytes'])
+            return FakeGenerator(model_path)
+
+        registry, released = _registry(loader=loader, max_bytes=250, warmup_text=None)
+        a = FakeGenerator('a')
+        registry.register('a', a, activate=True)
+        b = FakeGenerator('b')
+        registry.register('b', b)
+
+        registry.load('c', 'c', 'vocab', activate=False, background=False)
+
+        # 加载c时只驻留激活模型a
+        assert released == ['b']
+        assert peaks == [100]
+        assert registry.status()['resident_bytes'] <= 250
+
+    @pytest.mark.unit
+    def test_load_waits_for_drain(self):
+        """测试被淘汰的模型仍在处理请求时，加载等待其排空；放不下时加载失败"""
+        registry, released = _registry(loader=lambda model_path, vocab_path: FakeGenerator(model_path),
+                                       max_bytes=250, warmup_text=None, drain_timeout=5)
+        registry.register('a', FakeGenerator('a'), activate=True)
+        b = FakeGenerator('b')
+        registry.register('b', b)
+
+        with registry.acquire('b'):
+            thread = registry.load('c', 'c', 'vocab', activate=False)
+            thread.join(0.2)
+            # b排空前不加载
+            assert thread.is_alive() and registry.status()['loading'] == {'c': 'loading'}
+        thread.join(5)
+        assert released == ['b']
+        assert 'c' in [m['name'] for m in registry.status()['models']]
+
+        small, _ = _registry(loader=lambda model_path, vocab_path: FakeGenerator(model_path),
+                             max_bytes=150, warmup_text=None)
+        small.register('a', FakeGenerator('a'), activate=True)
+        small.load('v2', 'v2', 'vocab', background=False)
+        assert small.status()['loading']['v2'].startswith('failed')
+        assert small.active == 'a'
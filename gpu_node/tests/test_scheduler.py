@@ -0,0 +1,97 @@
+"""
+优先级调度单元测试
+测试core.scheduler模块
+"""
+import pytest
+import threading
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.scheduler import PriorityScheduler, INTERACTIVE, BATCH
+
+
+def _fill(scheduler, jobs):
+    """先用一个阻塞任务占住执行线程，再按顺序提交jobs，返回执行顺序"""
+    gate = threading.Event()
+    order = []
+    scheduler.submit(INTERACTIVE, 0, lambda: gate.wait(2))
+    futures = [scheduler.submit(lane, cost, lambda name=name: order.append(name))
+               for lane, cost, name in jobs]
+    gate.set()
+    for future in futures:
+        future.result(timeout=2)
+    return order
+
+
+class TestPriorityScheduler:
+    """优先级调度器测试类"""
+
+    @pytest.mark.unit
+    def test_strict_priority(self):
+        """测试严格优先级下交互请求先于批量请求"""
+        scheduler = PriorityScheduler(policy='strict')
+        order = _fill(scheduler, [
+            (BATCH, 1, 'b1'),
+            (BATCH, 2, 'b2'),
+            (INTERACTIVE, 100, 'i1'),
+        ])
+
+        assert order == ['i1', 'b1', 'b2']
+
+    @pytest.mark.unit
+    def test_shortest_job_first_within_lane(self):
+        """测试同一车道内短作业优先"""
+        scheduler = PriorityScheduler(policy='strict')
+        order = _fill(scheduler, [
+            (BATCH, 500, 'long'),
+            (BATCH, 10, 'short'),
+            (BATCH, 100, 'medium'),
+        ])
+
+        assert order == ['short', 'medium', 'long']
+
+    @pytest.mark.unit
+    def test_weighted_share(self):
+        """测试加权轮转下批量请求不会被饿死"""
+        scheduler = PriorityScheduler(policy='weighted', weights={INTERACTIVE: 3, BATCH: 1})
+        jobs = [(INTERACTIVE, 1, 'i')] * 6 + [(BATCH, 1, 'b')] * 2
+        order = _fill(scheduler, jobs)
+
+        assert order[:4].count('b') == 1
+        assert order.count('b') == 2
+
+    @pytest.mark.unit
+    def test_unknown_lane_uses_default(self):
+        """测试未知优先级归入交互车道"""
+        scheduler = PriorityScheduler()
+
+        assert scheduler.lane_of(None) == INTERACTIVE
+        assert scheduler.lane_of('urgent') == INTERACTIVE
+        assert scheduler.lane_of(BATCH) == BATCH
+
+    @pytest.mark.unit
+    def test_exception_and_stats(self):
+        """测试异常传递和分道延迟统计"""
+        scheduler = PriorityScheduler()
+
+        def fail():
+            raise ValueError("bad input")
+
+        with pytest.raises(ValueError):
+            scheduler.run(BATCH, 1, fail)
+        assert scheduler.run(INTERACTIVE, 1, lambda: 42) == 42
+
+        stats = scheduler.stats()
+        assert stats['lanes'][INTERACTIVE]['completed'] == 1
+        assert stats['lanes'][BATCH]['completed'] == 1
+        assert stats['lanes'][BATCH]['queued'] == 0
+        assert stats['lanes'][INTERACTIVE]['latency_p95_ms'] >= 0
+
+    @pytest.mark.unit
+    def test_invalid_policy(self):
+        """测试无效调度策略"""
+        with pytest.raises(ValueError):
+            PriorityScheduler(policy='random')
@@ -0,0 +1,99 @@
+"""
+请求合并单元测试
+测试core.singleflight模块
+"""
+import pytest
+import threading
+import time
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.singleflight import SingleFlight, make_key
+from .conftest import SAMPLE_TEXT, SAMPLE_SHORT_TEXT
+
+
+class TestSingleFlight:
+    """请求合并测试类"""
+
+    @pytest.mark.unit
+    def test_make_key(self):
+        """测试合并键由内容和参数决定"""
+        assert make_key('title', SAMPLE_TEXT, sentences=3) == make_key('title', SAMPLE_TEXT, sentences=3)
+        assert make_key('title', SAMPLE_TEXT, sentences=3) != make_key('title', SAMPLE_TEXT, sentences=2)
+        assert make_key('title', SAMPLE_TEXT, sentences=3) != make_key('summarize', SAMPLE_TEXT, sentences=3)
+        assert make_key('title', SAMPLE_TEXT) != make_key('title', SAMPLE_SHORT_TEXT)
+
+    @pytest.mark.unit
+    def test_concurrent_calls_share_result(self):
+        """测试并发的相同请求只计算一次"""
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def work():
+            calls.append(1)
+            release.wait(2)
+            return ["标题"]
+
+        def request():
+            results.append(flight.do('k', work))
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for t in threads:
+            t.start()
+        # 等待所有请求挂到同一计算上
+        deadline = time.time() + 2
+        while flight.shared < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert [r[0] for r in results] == [["标题"]] * 5
+        assert sorted(r[1] for r in results) == [False, True, True, True, True]
+        assert flight.stats()['inflight'] == 0
+
+    @pytest.mark.unit
+    def test_no_result_kept_after_completion(self):
+        """测试计算完成后不缓存结果"""
+        flight = SingleFlight()
+        counter = iter(range(10))
+
+        first, _ = flight.do('k', lambda: next(counter))
+        second, shared = flight.do('k', lambda: next(counter))
+
+        assert (first, second, shared) == (0, 1, False)
+
+    @pytest.mark.unit
+    def test_error_propagates_to_waiters(self):
+        """测试计算异常传递给所有等待者"""
+        flight = SingleFlight()
+        release = threading.Event()
+        errors = []
+
+        def work():
+            release.wait(2)
+            raise ValueError("bad input")
+
+        def request():
+            try:
+                flight.do('k', work)
+            except ValueError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=request) for _ in range(3)]
+        for t in threads:
+            t.start()
+        deadline = time.time() + 2
+        while flight.shared < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+
+        assert errors == ["bad input"] * 3
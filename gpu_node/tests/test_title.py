@@ -129,7 +129,7 @@ class TestTitleGenerator:
             result = generator.generate("测试内容", 2)
             
             assert result == ["测试标题1", "测试标题2"]
-            mock_predict.assert_called_once_with("测试内容", 2)
+            mock_predict.assert_called_once_with("测试内容", 2, deadline=None, allow_partial=False)
     
     @pytest.mark.unit
     @patch('core.title.title.torch.cuda.is_available')